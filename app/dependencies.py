@@ -1,36 +1,228 @@
-from fastapi import Depends
-from app.services.gc_bank_data import GoCardlessBankDataClient
+from fastapi import Depends, HTTPException, Request
+from app.services.concurrency import MAX_CONCURRENCY
+from app.services.config_store import ConfigStore
+from app.services.gc_bank_data import GoCardlessBankDataClient, make_session
+from app.services.gc_bank_data_async import AsyncGoCardlessBankDataClient, make_http
+from app.services.institutions import InstitutionCatalogue
+from app.services.scheduler import SyncScheduler
+from app.services.sessions import SessionStore, load_secret
+from app.services.transaction_store import TransactionStore
+from app.services.user_pool import USER_POOL_SIZE, UserContext, UserPool
+from app.services.users import UserStore
+from typing import Optional
 import os
-import json
 
 # Path to the user configuration file
 CONFIG_DIR = os.path.join(os.getcwd(), "config")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "user_config.json")
 
-# Global client instance
-_client = None
+# Path to the local transaction store
+TRANSACTIONS_DB = os.path.join(CONFIG_DIR, "transactions.db")
 
+# Registered users, and a directory per user with their config and
+# transactions. CONFIG_FILE and TRANSACTIONS_DB belong to requests made
+# without logging in.
+USERS_DB = os.path.join(CONFIG_DIR, "users.db")
+USERS_DIR = os.path.join(CONFIG_DIR, "users")
 
-def get_bank_client() -> GoCardlessBankDataClient:
+# Sessions of the setup flow, shared by all worker processes, and the key
+# their cookies are signed with unless SESSION_SECRET is set
+SESSIONS_DB = os.path.join(CONFIG_DIR, "sessions.db")
+SESSION_SECRET_FILE = os.path.join(CONFIG_DIR, "session_secret")
+
+# Institutions of every supported country, shared by all users
+INSTITUTIONS_DB = os.path.join(CONFIG_DIR, "institutions.db")
+
+# Set AUTH_REQUIRED=1 to turn away requests that aren't logged in, instead
+# of serving them as the app's single user
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "0") == "1"
+
+# Cookie holding the login token, see app.routers.auth
+AUTH_COOKIE = "budget_session"
+
+# Connections shared by the clients of all users
+_session = None
+_http = None
+
+# The context of requests made without logging in
+_default_context = None
+
+# Contexts of logged in users
+_user_pool = None
+
+# Global user store instance
+_users = None
+
+# Global setup session store instance
+_sessions = None
+
+# Global institution catalogue instance
+_institutions = None
+
+
+def _shared_connections():
+    global _session, _http
+
+    if _session is None:
+        # Enough for every pooled user's concurrent per-account calls
+        _session = make_session(MAX_CONCURRENCY * 4)
+        _http = make_http(MAX_CONCURRENCY * 4)
+
+    return _session, _http
+
+
+def get_default_context() -> UserContext:
     """
-    Get the GoCardless bank client, loading saved tokens if available.
-    For the MVP, we use a single global instance.
+    Get the context of the app's single user, for requests made without
+    logging in and for the background sync started with the app.
     """
-    global _client
+    global _default_context
 
-    # Initialize if not already done
-    if _client is None:
-        _client = GoCardlessBankDataClient()
+    if _default_context is None:
+        session, http = _shared_connections()
+        _default_context = UserContext(
+            None, CONFIG_FILE, TRANSACTIONS_DB, session=session, http=http
+        )
 
-        # Try to load saved tokens if configuration exists
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, "r") as f:
-                    config = json.load(f)
-                    if "tokens" in config:
-                        _client.load_tokens_from_dict(config["tokens"])
-            except Exception:
-                # If we fail to load tokens, we'll just continue with a fresh client
-                pass
+    return _default_context
 
-    return _client
+
+def _build_user_context(user_id):
+    session, http = _shared_connections()
+    directory = os.path.join(USERS_DIR, user_id)
+    return UserContext(
+        user_id,
+        os.path.join(directory, "user_config.json"),
+        os.path.join(directory, "transactions.db"),
+        session=session,
+        http=http,
+    )
+
+
+def get_user_pool() -> UserPool:
+    """
+    Get the pool of logged in users' contexts.
+    """
+    global _user_pool
+
+    if _user_pool is None:
+        _user_pool = UserPool(_build_user_context, USER_POOL_SIZE)
+
+    return _user_pool
+
+
+def get_user_store() -> UserStore:
+    """
+    Get the registered users, creating the database on first use.
+    """
+    global _users
+
+    if _users is None:
+        _users = UserStore(USERS_DB)
+
+    return _users
+
+
+def get_setup_sessions() -> SessionStore:
+    """
+    Get the sessions of the setup flow, creating the database on first use.
+    """
+    global _sessions
+
+    if _sessions is None:
+        _sessions = SessionStore(SESSIONS_DB, load_secret(SESSION_SECRET_FILE))
+
+    return _sessions
+
+
+def get_institution_catalogue() -> InstitutionCatalogue:
+    """
+    Get the institution catalogue, creating the database on first use.
+    """
+    global _institutions
+
+    if _institutions is None:
+        _institutions = InstitutionCatalogue(INSTITUTIONS_DB)
+
+    return _institutions
+
+
+async def get_auth_token(request: Request) -> Optional[str]:
+    """
+    Get the login token sent as a Bearer token or in the session cookie.
+    """
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return request.cookies.get(AUTH_COOKIE)
+
+
+def get_current_user(token: Optional[str] = Depends(get_auth_token)) -> Optional[dict]:
+    """
+    Get the logged in user, or None for requests made without logging in.
+    """
+    if token:
+        user = get_user_store().user_for_token(token)
+        if user is None:
+            raise HTTPException(status_code=401, detail="Login expired or invalid")
+        return user
+
+    if AUTH_REQUIRED:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    return None
+
+
+def get_user_context(
+    user: Optional[dict] = Depends(get_current_user),
+) -> UserContext:
+    """
+    Get the config, clients, store and scheduler of the requesting user.
+    """
+    if user is None:
+        return get_default_context()
+    return get_user_pool().get(user["id"])
+
+
+def get_config_store(context: UserContext = Depends(get_user_context)) -> ConfigStore:
+    """
+    Get the user configuration, which is kept in memory and reloaded when the file changes.
+    """
+    return context.config
+
+
+def get_bank_client(
+    context: UserContext = Depends(get_user_context),
+) -> GoCardlessBankDataClient:
+    """
+    Get the user's GoCardless bank client, using their saved tokens if available.
+    """
+    return context.client
+
+
+async def get_async_bank_client(
+    context: UserContext = Depends(get_user_context),
+) -> AsyncGoCardlessBankDataClient:
+    """
+    Get the user's async GoCardless bank client for use in async routes,
+    using their saved tokens if available.
+    """
+    return context.async_client
+
+
+def get_transaction_store(
+    context: UserContext = Depends(get_user_context),
+) -> TransactionStore:
+    """
+    Get the user's local transaction store.
+    """
+    return context.store
+
+
+def get_sync_scheduler(
+    context: UserContext = Depends(get_user_context),
+) -> SyncScheduler:
+    """
+    Get the user's background sync scheduler. It only runs once started by the app.
+    """
+    return context.scheduler
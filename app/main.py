@@ -1,20 +1,69 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from app.routers import accounts, transactions, setup
-from app.services.gc_bank_data import GoCardlessBankDataClient
+from app.routers import accounts, auth, transactions, setup, categories, budgets
+from app.dependencies import (
+    get_default_context,
+    get_institution_catalogue,
+    get_user_pool,
+)
+from app.services.gc_bank_data import response_cache
+from app.services.metrics import MetricsMiddleware, registry
+from app.services.resilience import CircuitOpenError, circuit_breaker
+from app.services.structured_logging import configure_logging
+from app.services.warmup import Warmup
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Create a single client instance for dependency injection
-bank_client = GoCardlessBankDataClient()
+# Log as structured lines instead of printing
+configure_logging()
+
+# Set BACKGROUND_SYNC=0 to only sync accounts and refresh tokens when they
+# are requested
+BACKGROUND_SYNC = os.getenv("BACKGROUND_SYNC", "1") != "0"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up, then keep accounts synced and tokens fresh in the background while the app is running"""
+    # Nothing to warm up without background sync, see /ready
+    app.state.started = True
+    app.state.warmup = None
+    if not BACKGROUND_SYNC:
+        yield
+        return
+
+    # Build the clients and connections of requests made without logging in
+    # now, rather than on the first request. The scheduler starts once warm,
+    # as the warm-up does its first refresh.
+    context = get_default_context()
+    context.client.start_token_refresh()
+    warmup = Warmup(context, then=context.scheduler.start)
+    app.state.warmup = warmup
+    warmup.start()
+    # Logged in users' accounts are synced while they are in the pool
+    pool = get_user_pool()
+    pool.start_background_sync()
+    # The bank picker is served from the catalogue, refreshed once a day
+    institutions = get_institution_catalogue()
+    institutions.start(context.client)
+    yield
+    warmup.stop()
+    institutions.stop()
+    pool.close()
+    context.close()
+
 
 # Initialize the FastAPI app
-app = FastAPI(title="Budget App")
+app = FastAPI(title="Budget App", lifespan=lifespan)
+
+# Time every request, see /metrics and the Server-Timing response header
+app.add_middleware(MetricsMiddleware)
 
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -23,9 +72,22 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 # Include routers
+app.include_router(auth.router)
 app.include_router(accounts.router)
 app.include_router(transactions.router)
 app.include_router(setup.router)
+app.include_router(categories.router)
+app.include_router(budgets.router)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Fail fast while the bank API keeps failing, telling clients when to retry"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)},
+    )
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -34,3 +96,36 @@ def read_root(request: Request):
     return templates.TemplateResponse(
         "index.html", {"request": request, "title": "Budget App - Home"}
     )
+
+
+@app.get("/ready")
+def ready():
+    """Report whether the app is warm, for load balancers to hold traffic until it is"""
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is None:
+        # Not ready before the lifespan ran. Without background sync there
+        # is nothing to warm, so it is ready as soon as it has.
+        ready = getattr(app.state, "started", False)
+        return JSONResponse(status_code=200 if ready else 503, content={"ready": ready})
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/api/cache")
+def cache_stats():
+    """Report response cache hits and misses, i.e. upstream API calls saved"""
+    return response_cache.stats()
+
+
+@app.get("/api/bank-status")
+def bank_status():
+    """Report institutions whose bank API calls are failing"""
+    return circuit_breaker.status()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Request, GoCardless call and span timings in the Prometheus text format"""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,6 +1,8 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import date
+import json
+import sys
 
 
 class Transaction(BaseModel):
@@ -12,3 +14,128 @@ class Transaction(BaseModel):
     booking_date: date
     value_date: Optional[date] = None
     category: Optional[str] = None
+    status: str = "booked"
+    labels: List[str] = []
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class TransactionRecord:
+    """Compact in-memory transaction, for holding long histories.
+
+    Dates are day numbers since 1970-01-01 and amounts integer minor units
+    (cents). Account IDs, currencies and categories repeat across
+    transactions, so they are interned and every record shares one copy.
+    With __slots__ this takes a fraction of the memory of a dict or a
+    pydantic model; convert with to_dict() only when building a response."""
+
+    __slots__ = (
+        "id",
+        "account_id",
+        "amount_minor",
+        "currency",
+        "description",
+        "booking_day",
+        "value_day",
+        "category",
+        "status",
+        "labels",
+    )
+
+    def __init__(
+        self,
+        id,
+        account_id,
+        amount_minor,
+        currency,
+        description,
+        booking_day,
+        value_day=None,
+        category=None,
+        status="booked",
+        labels=(),
+    ):
+        self.id = id
+        self.account_id = sys.intern(account_id)
+        self.amount_minor = amount_minor
+        self.currency = sys.intern(currency)
+        self.description = description
+        self.booking_day = booking_day
+        self.value_day = value_day
+        self.category = sys.intern(category) if category is not None else None
+        self.status = sys.intern(status)
+        self.labels = tuple(labels)
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Build a record from a transactions table row.
+
+        Args:
+            row (tuple): (id, account_id, amount, currency, description,
+                booking_date, value_date, category, status, labels) as
+                stored, labels being a JSON array
+
+        Returns:
+            TransactionRecord: The record
+        """
+        (
+            id,
+            account_id,
+            amount,
+            currency,
+            description,
+            booking,
+            value,
+            category,
+            status,
+            labels,
+        ) = row
+        return cls(
+            id,
+            account_id,
+            round(amount * 100),
+            currency,
+            description,
+            _day(booking),
+            _day(value) if value else None,
+            category,
+            status,
+            # Most transactions have no labels, so skip decoding those
+            json.loads(labels) if labels != "[]" else (),
+        )
+
+    @property
+    def amount(self):
+        return self.amount_minor / 100
+
+    @property
+    def booking_date(self):
+        return date.fromordinal(self.booking_day + EPOCH_ORDINAL)
+
+    @property
+    def value_date(self):
+        if self.value_day is None:
+            return None
+        return date.fromordinal(self.value_day + EPOCH_ORDINAL)
+
+    def to_dict(self):
+        """Fields of the Transaction model, for building responses."""
+        return {
+            "id": self.id,
+            "account_id": self.account_id,
+            "amount": self.amount,
+            "currency": self.currency,
+            "description": self.description,
+            "booking_date": self.booking_date,
+            "value_date": self.value_date,
+            "category": self.category,
+            "status": self.status,
+            "labels": list(self.labels),
+        }
+
+
+def _day(iso_date):
+    # Day number since 1970-01-01 of a YYYY-MM-DD date
+    return date.fromisoformat(iso_date).toordinal() - EPOCH_ORDINAL
@@ -1,18 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.models.account import Account
-from app.dependencies import get_bank_client
-from app.services.gc_bank_data import GoCardlessBankDataClient
-import os
-import json
+from app.dependencies import (
+    get_async_bank_client,
+    get_config_store,
+    get_sync_scheduler,
+    get_transaction_store,
+)
+from app.services.gc_bank_data import CACHE_TTLS
+from app.services.gc_bank_data_async import AsyncGoCardlessBankDataClient
+from app.services.concurrency import MAX_CONCURRENCY, gather_concurrently
+from app.services.config_store import ConfigStore
+from app.services.metrics import span
+from app.services.resilience import CircuitOpenError
+from app.services.serialization import FAST_JSON, fast_json_response
+from app.services.scheduler import SyncScheduler
+from app.services.transaction_store import TransactionStore
+import asyncio
+import logging
+import time
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 
-# Path to the user configuration file
-CONFIG_DIR = os.path.join(os.getcwd(), "config")
-CONFIG_FILE = os.path.join(CONFIG_DIR, "user_config.json")
-
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
+logger = logging.getLogger(__name__)
+
 
 class AccountResponse(BaseModel):
     id: str
@@ -20,62 +33,150 @@ class AccountResponse(BaseModel):
     iban: Optional[str] = None
     balance: float
     currency: str
+    synced_at: Optional[float] = None
+    snapshot_age_seconds: Optional[float] = None
+
+
+class EndpointSyncStatus(BaseModel):
+    synced_at: Optional[float] = None
+    age_seconds: Optional[float] = None
+    next_sync_at: Optional[float] = None
+    quota_remaining: Optional[int] = None
+    quota_reset_at: Optional[float] = None
+
+
+class AccountSyncStatus(BaseModel):
+    account_id: str
+    transactions: EndpointSyncStatus
+    balances: EndpointSyncStatus
+
+
+async def _fetch_account(
+    client: AsyncGoCardlessBankDataClient,
+    store: TransactionStore,
+    account_id: str,
+    slots: asyncio.Semaphore,
+):
+    """Fetch details and current balance of an account from the bank and keep a snapshot"""
+
+    async def call(method):
+        # Each call to the bank takes a slot of its own
+        async with slots:
+            return await method(account_id)
+
+    details, balances = await asyncio.gather(
+        call(client.get_account_details), call(client.get_account_balances)
+    )
+    await run_in_threadpool(store.save_account_snapshot, account_id, details, balances)
+    return _account_response(account_id, details, balances)
+
+
+def _account_response(account_id: str, details, balances, synced_at=None):
+    """Build the account response from details and balances responses"""
+    # Get account name and current balance
+    account_name = details.get("account", {}).get("name", "Account")
+
+    balance_amount = "0"
+    currency = ""
+    for balance in balances.get("balances", []):
+        if balance.get("balanceType") == "interimAvailable":
+            balance_amount = balance.get("balanceAmount", {}).get("amount", "0")
+            currency = balance.get("balanceAmount", {}).get("currency", "")
+            break
+
+    return AccountResponse(
+        id=account_id,
+        name=account_name,
+        iban=details.get("account", {}).get("iban", ""),
+        balance=float(balance_amount),
+        currency=currency,
+        synced_at=synced_at,
+        snapshot_age_seconds=time.time() - synced_at if synced_at else None,
+    )
+
+
+async def _load_accounts(
+    client: AsyncGoCardlessBankDataClient,
+    store: TransactionStore,
+    scheduler: SyncScheduler,
+    account_ids: List[str],
+):
+    """
+    Get accounts from their snapshots, kept fresh by the background sync.
+    Accounts without a snapshot are fetched from the bank, and so are stale
+    ones while the background sync isn't running.
+
+    Returns:
+        list: (account_id, AccountResponse, error) tuples in the order of account_ids
+    """
+    snapshots = await run_in_threadpool(store.get_account_snapshots, account_ids)
+    # Without the scheduler nothing else refreshes the snapshots
+    max_age = None if scheduler.running else CACHE_TTLS["account_balances"]
+    # Bank calls made at once, counted per call rather than per account
+    slots = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def load(acc_id):
+        snapshot = snapshots.get(acc_id)
+        if snapshot is None:
+            return await _fetch_account(client, store, acc_id, slots)
+        if max_age is not None and time.time() - snapshot["synced_at"] > max_age:
+            try:
+                return await _fetch_account(client, store, acc_id, slots)
+            except Exception as e:
+                # Log the error but serve the stale snapshot
+                logger.warning(
+                    "Error refreshing account",
+                    extra={"account_id": acc_id, "error": str(e)},
+                )
+        return _account_response(
+            acc_id, snapshot["details"], snapshot["balances"], snapshot["synced_at"]
+        )
+
+    # Accounts served from their snapshot need no slot
+    return await gather_concurrently(load, account_ids, len(account_ids))
 
 
 @router.get("/", response_model=List[AccountResponse])
-def list_accounts(client: GoCardlessBankDataClient = Depends(get_bank_client)):
+async def list_accounts(
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
+):
     """List all connected bank accounts"""
     # Check if setup has been completed
-    if not os.path.exists(CONFIG_FILE):
+    config = config_store.load()
+    if config is None:
         raise HTTPException(
             status_code=400,
             detail="Bank setup not completed. Please visit /setup first.",
         )
 
     try:
-        # Load the configuration file
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
-
         # Get the selected accounts from the config
         account_ids = config.get("selected_accounts", [])
         if not account_ids:
             return []
 
-        # Fetch details for each account
+        # Load all accounts at the same time
         accounts = []
-        for account_id in account_ids:
-            try:
-                details = client.get_account_details(account_id)
-                balances = client.get_account_balances(account_id)
-
-                # Get account name and current balance
-                account_name = details.get("account", {}).get("name", "Account")
-
-                balance_amount = "0"
-                currency = ""
-                for balance in balances.get("balances", []):
-                    if balance.get("balanceType") == "interimAvailable":
-                        balance_amount = balance.get("balanceAmount", {}).get(
-                            "amount", "0"
-                        )
-                        currency = balance.get("balanceAmount", {}).get("currency", "")
-                        break
-
-                # Create account response
-                accounts.append(
-                    AccountResponse(
-                        id=account_id,
-                        name=account_name,
-                        iban=details.get("account", {}).get("iban", ""),
-                        balance=float(balance_amount),
-                        currency=currency,
-                    )
-                )
-            except Exception as e:
+        results = await _load_accounts(client, store, scheduler, account_ids)
+        for acc_id, account, error in results:
+            if error is not None:
                 # Log the error but continue with other accounts
-                print(f"Error fetching account {account_id}: {str(e)}")
-
+                logger.warning(
+                    "Error fetching account",
+                    extra={"account_id": acc_id, "error": str(error)},
+                )
+                continue
+            accounts.append(account)
+
+        if FAST_JSON:
+            # Accounts were built as AccountResponse models already
+            with span("serialize"):
+                return fast_json_response(
+                    [account.model_dump() for account in accounts]
+                )
         return accounts
     except Exception as e:
         raise HTTPException(
@@ -83,34 +184,38 @@ def list_accounts(client: GoCardlessBankDataClient = Depends(get_bank_client)):
         )
 
 
+@router.get("/sync-status", response_model=List[AccountSyncStatus])
+def sync_status(scheduler: SyncScheduler = Depends(get_sync_scheduler)):
+    """Show how fresh each account's data is and how much bank quota is left"""
+    return [
+        AccountSyncStatus(account_id=acc_id, **scheduler.status(acc_id))
+        for acc_id in scheduler.get_account_ids()
+    ]
+
+
 @router.get("/{account_id}", response_model=AccountResponse)
-def get_account(
-    account_id: str, client: GoCardlessBankDataClient = Depends(get_bank_client)
+async def get_account(
+    account_id: str,
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
 ):
     """Get details for a specific account"""
+    # Only the user's own accounts, the bank would serve any account ID
+    if account_id not in config_store.get("selected_accounts", []):
+        raise HTTPException(status_code=404, detail="Account not found")
+
     try:
-        # Fetch the account details
-        details = client.get_account_details(account_id)
-        balances = client.get_account_balances(account_id)
-
-        # Get account name and current balance
-        account_name = details.get("account", {}).get("name", "Account")
-
-        balance_amount = "0"
-        currency = ""
-        for balance in balances.get("balances", []):
-            if balance.get("balanceType") == "interimAvailable":
-                balance_amount = balance.get("balanceAmount", {}).get("amount", "0")
-                currency = balance.get("balanceAmount", {}).get("currency", "")
-                break
-
-        return AccountResponse(
-            id=account_id,
-            name=account_name,
-            iban=details.get("account", {}).get("iban", ""),
-            balance=float(balance_amount),
-            currency=currency,
+        [(_, account, error)] = await _load_accounts(
+            client, store, scheduler, [account_id]
         )
+        if error is not None:
+            raise error
+        return account
+    except CircuitOpenError:
+        # Answered with a 503 and Retry-After by the app's exception handler
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to retrieve account: {str(e)}"
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.dependencies import (
+    AUTH_COOKIE,
+    get_auth_token,
+    get_current_user,
+    get_user_store,
+)
+from app.services.users import UserStore
+from typing import Optional
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+# Shortest password accepted when registering
+MIN_PASSWORD_LENGTH = 8
+
+
+class Credentials(BaseModel):
+    email: str
+    password: str
+
+
+class UserResponse(BaseModel):
+    id: str
+    email: str
+    created_at: float
+
+
+class LoginResponse(BaseModel):
+    token: str
+    user: UserResponse
+
+
+def _validate_credentials(credentials: Credentials):
+    """Reject email addresses that can't be real and passwords that are too short"""
+    email = credentials.email.strip()
+    if "@" not in email or email.startswith("@") or email.endswith("@"):
+        raise HTTPException(status_code=400, detail="Invalid email address")
+    if len(credentials.password) < MIN_PASSWORD_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Password must be at least {MIN_PASSWORD_LENGTH} characters",
+        )
+
+
+def _log_in(response: Response, users: UserStore, user: dict) -> LoginResponse:
+    """Hand out a login token, in a cookie for browsers and in the body for API clients"""
+    token = users.create_token(user["id"])
+    response.set_cookie(
+        AUTH_COOKIE,
+        token,
+        max_age=users.token_ttl,
+        httponly=True,
+        samesite="lax",
+    )
+    return LoginResponse(token=token, user=UserResponse(**user))
+
+
+@router.post("/register", response_model=LoginResponse, status_code=201)
+def register(
+    credentials: Credentials,
+    response: Response,
+    users: UserStore = Depends(get_user_store),
+):
+    """Create a user with their own bank setup and transactions, and log them in"""
+    _validate_credentials(credentials)
+    user = users.create_user(credentials.email, credentials.password)
+    if user is None:
+        raise HTTPException(status_code=409, detail="Email address already registered")
+    return _log_in(response, users, user)
+
+
+@router.post("/login", response_model=LoginResponse)
+def login(
+    credentials: Credentials,
+    response: Response,
+    users: UserStore = Depends(get_user_store),
+):
+    """Log in with an email address and password"""
+    user = users.authenticate(credentials.email, credentials.password)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Wrong email address or password")
+    return _log_in(response, users, user)
+
+
+@router.post("/logout")
+def logout(
+    response: Response,
+    token: Optional[str] = Depends(get_auth_token),
+    users: UserStore = Depends(get_user_store),
+):
+    """End the current login"""
+    if token:
+        users.revoke_token(token)
+    response.delete_cookie(AUTH_COOKIE)
+    return {"logged_out": True}
+
+
+@router.get("/me", response_model=UserResponse)
+def current_user(user: Optional[dict] = Depends(get_current_user)):
+    """Get the logged in user"""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    return user
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.dependencies import get_transaction_store
+from app.services.transaction_store import TransactionStore
+from typing import List, Literal, Optional
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/budgets", tags=["budgets"])
+
+
+class BudgetRequest(BaseModel):
+    name: str
+    category: Optional[str] = None
+    period: Literal["week", "month", "year"] = "month"
+    limit: float
+    currency: str
+    account_id: Optional[str] = None
+    warn_at: float = 0.8
+
+
+class BudgetResponse(BudgetRequest):
+    id: int
+    period_start: str
+    period_end: str
+    spent: float
+    remaining: float
+    state: Literal["ok", "warning", "exceeded"]
+
+
+class BudgetEvent(BaseModel):
+    id: int
+    budget_id: int
+    name: str
+    period_start: str
+    kind: Literal["warning", "exceeded"]
+    spent: float
+    limit: float
+    created_at: float
+
+
+def _validate_budget(budget: BudgetRequest):
+    """Reject budgets that could never be within their limit or never warn"""
+    if not budget.name.strip():
+        raise HTTPException(status_code=400, detail="Name must not be empty")
+    if budget.limit <= 0:
+        raise HTTPException(status_code=400, detail="Limit must be positive")
+    if not 0 < budget.warn_at <= 1:
+        raise HTTPException(
+            status_code=400, detail="warn_at must be between 0 and 1 (exclusive of 0)"
+        )
+    if len(budget.currency) != 3:
+        raise HTTPException(status_code=400, detail="Currency must be an ISO code")
+
+
+def _stored_values(budget: BudgetRequest):
+    values = budget.model_dump(exclude={"limit"})
+    values["limit_cents"] = round(budget.limit * 100)
+    values["currency"] = budget.currency.upper()
+    return values
+
+
+@router.get("/", response_model=List[BudgetResponse])
+def list_budgets(store: TransactionStore = Depends(get_transaction_store)):
+    """List budgets with their spending in the current week, month or year"""
+    return store.list_budgets()
+
+
+@router.post("/", response_model=BudgetResponse)
+def create_budget(
+    budget: BudgetRequest,
+    store: TransactionStore = Depends(get_transaction_store),
+):
+    """Add a spending limit for a category, or all spending, per period"""
+    _validate_budget(budget)
+    return store.add_budget(_stored_values(budget))
+
+
+@router.get("/events", response_model=List[BudgetEvent])
+def list_events(
+    after: int = Query(0, ge=0, description="Only events after this ID"),
+    limit: int = Query(100, ge=1, le=1000),
+    store: TransactionStore = Depends(get_transaction_store),
+):
+    """List the warnings and exceeded limits recorded as transactions were synced"""
+    return store.budget_events(after_id=after, limit=limit)
+
+
+@router.put("/{budget_id}", response_model=BudgetResponse)
+def update_budget(
+    budget_id: int,
+    budget: BudgetRequest,
+    store: TransactionStore = Depends(get_transaction_store),
+):
+    """Change a budget, which starts its running totals over"""
+    _validate_budget(budget)
+    stored = store.update_budget(budget_id, _stored_values(budget))
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return stored
+
+
+@router.delete("/{budget_id}")
+def delete_budget(
+    budget_id: int, store: TransactionStore = Depends(get_transaction_store)
+):
+    """Delete a budget and its recorded events"""
+    if not store.delete_budget(budget_id):
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return {"deleted": budget_id}
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.dependencies import get_transaction_store
+from app.services.transaction_store import TransactionStore
+import re
+from typing import List, Literal, Optional
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/categories", tags=["categories"])
+
+
+class CategoryRuleRequest(BaseModel):
+    category: str
+    kind: Literal["substring", "regex", "counterparty", "amount"]
+    pattern: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    priority: int = 100
+
+
+class CategoryRuleResponse(CategoryRuleRequest):
+    id: int
+    recategorized: int = 0
+
+
+def _validate_rule(rule: CategoryRuleRequest):
+    """Reject rules that could never match or would match everything"""
+    if not rule.category.strip():
+        raise HTTPException(status_code=400, detail="Category must not be empty")
+
+    if rule.kind == "amount":
+        if rule.min_amount is None and rule.max_amount is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Amount rules need a min_amount or max_amount",
+            )
+    elif not rule.pattern:
+        raise HTTPException(status_code=400, detail=f"{rule.kind} rules need a pattern")
+
+    if rule.kind == "regex":
+        try:
+            re.compile(rule.pattern)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regex: {str(e)}")
+
+    if (
+        rule.min_amount is not None
+        and rule.max_amount is not None
+        and rule.min_amount > rule.max_amount
+    ):
+        raise HTTPException(
+            status_code=400, detail="min_amount must not exceed max_amount"
+        )
+
+
+@router.get("/rules", response_model=List[CategoryRuleResponse])
+def list_rules(store: TransactionStore = Depends(get_transaction_store)):
+    """List categorisation rules in the order they are applied"""
+    return store.list_rules()
+
+
+@router.post("/rules", response_model=CategoryRuleResponse)
+def create_rule(
+    rule: CategoryRuleRequest,
+    store: TransactionStore = Depends(get_transaction_store),
+):
+    """Add a categorisation rule and apply it to stored transactions"""
+    _validate_rule(rule)
+    stored, changed = store.add_rule(rule.model_dump())
+    return CategoryRuleResponse(**stored, recategorized=changed)
+
+
+@router.put("/rules/{rule_id}", response_model=CategoryRuleResponse)
+def update_rule(
+    rule_id: int,
+    rule: CategoryRuleRequest,
+    store: TransactionStore = Depends(get_transaction_store),
+):
+    """Change a categorisation rule and reapply it to stored transactions"""
+    _validate_rule(rule)
+    stored, changed = store.update_rule(rule_id, rule.model_dump())
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return CategoryRuleResponse(**stored, recategorized=changed)
+
+
+@router.delete("/rules/{rule_id}")
+def delete_rule(rule_id: int, store: TransactionStore = Depends(get_transaction_store)):
+    """Delete a categorisation rule and recategorise the transactions it matched"""
+    changed = store.delete_rule(rule_id)
+    if changed is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return {"recategorized": changed}
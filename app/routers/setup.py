@@ -1,33 +1,70 @@
 from datetime import datetime
+import logging
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from app.services.gc_bank_data import GoCardlessBankDataClient
-from app.dependencies import get_bank_client
-import os
-import json
+from app.services.gc_bank_data_async import AsyncGoCardlessBankDataClient
+from app.services.concurrency import gather_concurrently
+from app.dependencies import (
+    get_async_bank_client,
+    get_config_store,
+    get_institution_catalogue,
+    get_setup_sessions,
+    get_transaction_store,
+    get_user_context,
+)
+from app.services.config_store import ConfigStore
+from app.services.institutions import COUNTRIES, COUNTRY_CODES, InstitutionCatalogue
+from app.services.sessions import SessionStore
+from app.services.transaction_store import TransactionStore
+from app.services.user_pool import UserContext
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/setup", tags=["setup"])
 
-# Simple file storage for our MVP (single user)
-CONFIG_DIR = os.path.join(os.getcwd(), "config")
-CONFIG_FILE = os.path.join(CONFIG_DIR, "user_config.json")
+logger = logging.getLogger(__name__)
 
 # Set up templates
 templates = Jinja2Templates(directory="app/templates")
 
-# In-memory storage for setup process
-# In a real app, this would use proper session management
-setup_data = {}
+# Cookie holding the signed ID of the browser's setup session
+SETUP_COOKIE = "setup_session"
+
+# Banks shown per page of the bank picker, and the most a request may ask for
+INSTITUTIONS_PAGE_SIZE = 30
+MAX_INSTITUTIONS_PAGE_SIZE = 100
+
+
+async def _load_setup(
+    request: Request, sessions: SessionStore, context: UserContext
+) -> tuple:
+    """
+    Get the requesting browser's setup session.
+
+    Returns:
+        tuple: (session ID, session data), or (None, None) without a valid
+            session of this user
+    """
+    cookie = request.cookies.get(SETUP_COOKIE)
+    session_id = sessions.session_id(cookie) if cookie else None
+    if session_id is None:
+        return None, None
+
+    data = await run_in_threadpool(sessions.get, session_id)
+    # A session only continues the setup of the user who started it
+    if data is None or data.get("user_id") != context.user_id:
+        return None, None
+    return session_id, data
 
 
 class Institution(BaseModel):
     id: str
     name: str
     logo: str = ""
+    bic: str = ""
     countries: List[str] = []
 
 
@@ -54,23 +91,15 @@ async def check_setup_status(request: Request):
 
 
 @router.get("/api/status")
-async def get_setup_status(request: Request):
+async def get_setup_status(
+    request: Request, config_store: ConfigStore = Depends(get_config_store)
+):
     """API endpoint to check if the initial setup has been completed"""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            # Load the configuration
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-
-            # Return the status template with "configured" status
-            return templates.TemplateResponse(
-                "setup/status.html", {"request": request, "status": "configured"}
-            )
-        except Exception:
-            # If we can't read the config, consider it not configured
-            return templates.TemplateResponse(
-                "setup/status.html", {"request": request, "status": "not_configured"}
-            )
+    if config_store.exists:
+        # Return the status template with "configured" status
+        return templates.TemplateResponse(
+            "setup/status.html", {"request": request, "status": "configured"}
+        )
 
     # Return the status template with "not_configured" status
     return templates.TemplateResponse(
@@ -81,66 +110,107 @@ async def get_setup_status(request: Request):
 @router.get("/countries", response_model=None)
 async def get_countries(request: Request):
     """Get list of supported countries and render the country selection page"""
-    # Add flag emojis for better visual representation
-    countries = [
-        {"code": "GB", "name": "United Kingdom", "flag": "🇬🇧"},
-        {"code": "DE", "name": "Germany", "flag": "🇩🇪"},
-        {"code": "FR", "name": "France", "flag": "🇫🇷"},
-        {"code": "ES", "name": "Spain", "flag": "🇪🇸"},
-        {"code": "IT", "name": "Italy", "flag": "🇮🇹"},
-        {"code": "NL", "name": "Netherlands", "flag": "🇳🇱"},
-        {"code": "FI", "name": "Finland", "flag": "🇫🇮"},
-        {"code": "NO", "name": "Norway", "flag": "🇳🇴"},
-        {"code": "SE", "name": "Sweden", "flag": "🇸🇪"},
-        {"code": "DK", "name": "Denmark", "flag": "🇩🇰"},
-        {"code": "BE", "name": "Belgium", "flag": "🇧🇪"},
-        {"code": "AT", "name": "Austria", "flag": "🇦🇹"},
-    ]
-
     return templates.TemplateResponse(
-        "setup/countries.html", {"request": request, "countries": countries}
+        "setup/countries.html", {"request": request, "countries": COUNTRIES}
     )
 
 
+async def _search_institutions(
+    country_code: str,
+    query: str,
+    offset: int,
+    limit: int,
+    client: AsyncGoCardlessBankDataClient,
+    catalogue: InstitutionCatalogue,
+) -> dict:
+    """
+    Search a country's banks in the institution catalogue.
+
+    A country is only fetched from GoCardless if the catalogue doesn't have
+    it yet, e.g. right after the first start before its refresh ran.
+
+    Returns:
+        dict: Template context with the country, query, page of banks,
+            their total and the offset of the next page, if any
+    """
+    country = country_code.upper()
+    if country not in COUNTRY_CODES:
+        raise HTTPException(status_code=404, detail="Country not supported")
+
+    found = await run_in_threadpool(catalogue.search, country, query, offset, limit)
+    if found is None:
+        institutions = await client.get_institutions(country)
+        await run_in_threadpool(catalogue.save, country, institutions)
+        found = await run_in_threadpool(catalogue.search, country, query, offset, limit)
+
+    total, institutions = found
+    return {
+        "country_code": country,
+        "query": query,
+        "institutions": institutions,
+        "total": total,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None,
+    }
+
+
 @router.get("/institutions/{country_code}")
 async def get_institutions(
     request: Request,
     country_code: str,
-    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    catalogue: InstitutionCatalogue = Depends(get_institution_catalogue),
 ):
-    """Get banks available for the selected country and render the institution selection page"""
+    """Render the institution selection page with the first page of the country's banks"""
     try:
-        # Get institutions from GoCardless
-        institutions_data = client.get_institutions(country_code)
-
-        # Format the response for better usability
-        institutions = []
-        for institution in institutions_data:
-            institutions.append(
-                {
-                    "id": institution.get("id", ""),
-                    "name": institution.get("name", ""),
-                    "logo": institution.get("logo", ""),
-                    "countries": institution.get("countries", []),
-                }
-            )
-
+        context = await _search_institutions(
+            country_code, "", 0, INSTITUTIONS_PAGE_SIZE, client, catalogue
+        )
         return templates.TemplateResponse(
-            "setup/institutions.html",
-            {"request": request, "institutions": institutions},
+            "setup/institutions.html", {"request": request, **context}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=400, detail=f"Failed to get institutions: {str(e)}"
         )
 
 
+@router.get("/institutions/{country_code}/search")
+async def search_institutions(
+    request: Request,
+    country_code: str,
+    q: str = Query(""),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(INSTITUTIONS_PAGE_SIZE, ge=1, le=MAX_INSTITUTIONS_PAGE_SIZE),
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    catalogue: InstitutionCatalogue = Depends(get_institution_catalogue),
+):
+    """Search banks by name or BIC as the user types, one page at a time"""
+    try:
+        context = await _search_institutions(
+            country_code, q, offset, limit, client, catalogue
+        )
+        return templates.TemplateResponse(
+            "setup/institution_results.html", {"request": request, **context}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"Failed to search institutions: {str(e)}"
+        )
+
+
 @router.post("/start-bank-link/{institution_id}")
 async def start_bank_link(
     request: Request,
     institution_id: str,
     redirect_url: Optional[str] = Query(None),
-    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    sessions: SessionStore = Depends(get_setup_sessions),
+    context: UserContext = Depends(get_user_context),
 ):
     """Start the bank linking process - creates a requisition and returns link for authentication"""
     try:
@@ -148,17 +218,24 @@ async def start_bank_link(
         callback_url = redirect_url or "http://localhost:8000/setup/bank-callback"
 
         # Generate a requisition (bank connection request)
-        requisition = client.create_requisition(
+        requisition = await client.create_requisition(
             redirect_url=callback_url, institution_id=institution_id
         )
 
-        # Store requisition ID in memory (would use a session in a real app)
+        # Keep the requisition in a session, which the bank callback may
+        # reach on any worker, even after a restart
         requisition_id = requisition.get("id")
-        setup_data["requisition_id"] = requisition_id
-        setup_data["institution_id"] = institution_id
+        session_id = await run_in_threadpool(
+            sessions.create,
+            {
+                "user_id": context.user_id,
+                "requisition_id": requisition_id,
+                "institution_id": institution_id,
+            },
+        )
 
         # Return the template with the link
-        return templates.TemplateResponse(
+        response = templates.TemplateResponse(
             "setup/bank_link.html",
             {
                 "request": request,
@@ -166,6 +243,15 @@ async def start_bank_link(
                 "requisition_id": requisition_id,
             },
         )
+        # Lax, so the cookie comes along when the bank redirects back
+        response.set_cookie(
+            SETUP_COOKIE,
+            sessions.cookie_value(session_id),
+            max_age=sessions.ttl,
+            httponly=True,
+            samesite="lax",
+        )
+        return response
     except Exception as e:
         raise HTTPException(
             status_code=400, detail=f"Failed to create bank link: {str(e)}"
@@ -174,19 +260,23 @@ async def start_bank_link(
 
 @router.get("/bank-callback")
 async def bank_callback(
-    request: Request, client: GoCardlessBankDataClient = Depends(get_bank_client)
+    request: Request,
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    sessions: SessionStore = Depends(get_setup_sessions),
+    context: UserContext = Depends(get_user_context),
 ):
     """Handle callback after bank authentication"""
     try:
-        # Get the requisition ID from our in-memory storage
-        requisition_id = setup_data.get("requisition_id")
+        # Get the requisition ID from the setup session
+        session_id, progress = await _load_setup(request, sessions, context)
+        requisition_id = progress.get("requisition_id") if progress else None
         if not requisition_id:
             raise HTTPException(
                 status_code=400, detail="No active bank linking process found"
             )
 
         # Get the requisition to see if it was successful
-        requisition = client.get_requisition(requisition_id)
+        requisition = await client.get_requisition(requisition_id)
 
         # Check if the requisition has accounts
         accounts = requisition.get("accounts", [])
@@ -197,21 +287,25 @@ async def bank_callback(
             )
 
         # Store the account IDs
-        setup_data["accounts"] = accounts
+        progress["accounts"] = accounts
+        await run_in_threadpool(sessions.save, session_id, progress)
 
-        # Get details for each account
+        # Get details for all accounts at the same time
         account_details = []
-        for account_id in accounts:
-            try:
-                details = client.get_account_details(account_id)
+        results = await gather_concurrently(client.get_account_details, accounts)
+        for account_id, details, error in results:
+            if error is not None:
+                # Log the error but continue with other accounts
+                logger.warning(
+                    "Error fetching account",
+                    extra={"account_id": account_id, "error": str(error)},
+                )
+                continue
 
-                # Get account name
-                account_name = details.get("name", "<unnamed account>")
+            # Get account name
+            account_name = details.get("name", "<unnamed account>")
 
-                account_details.append({"id": account_id, "name": account_name})
-            except Exception as e:
-                # Log the error but continue with other accounts
-                print(f"Error fetching account {account_id}: {str(e)}")
+            account_details.append({"id": account_id, "name": account_name})
 
         # Return the account selection template
         return templates.TemplateResponse(
@@ -225,7 +319,11 @@ async def bank_callback(
 
 @router.post("/complete-setup")
 async def complete_setup(
-    request: Request, client: GoCardlessBankDataClient = Depends(get_bank_client)
+    request: Request,
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    config_store: ConfigStore = Depends(get_config_store),
+    sessions: SessionStore = Depends(get_setup_sessions),
+    context: UserContext = Depends(get_user_context),
 ):
     """Complete the setup by saving the selected accounts"""
     try:
@@ -240,37 +338,52 @@ async def complete_setup(
             raise HTTPException(status_code=400, detail="No accounts selected")
 
         # Check if we have requisition data
-        requisition_id = setup_data.get("requisition_id")
+        session_id, progress = await _load_setup(request, sessions, context)
+        requisition_id = progress.get("requisition_id") if progress else None
         if not requisition_id:
             raise HTTPException(
                 status_code=400, detail="No active bank linking process found"
             )
 
+        # Only accounts the user's own requisition gave access to. All users
+        # share one GoCardless login, which can read any account.
+        linked = set(progress.get("accounts", []))
+        if any(account_id not in linked for account_id in account_ids_raw):
+            raise HTTPException(
+                status_code=400, detail="Selected account is not part of this bank link"
+            )
+
         # Get GoCardless tokens for future API calls
         token_data = client.save_tokens_to_dict()
 
-        # Create config directory if it doesn't exist
-        os.makedirs("config", exist_ok=True)
-
         # Create the config object
         config = {
             "tokens": token_data,
             "requisition_id": requisition_id,
-            "institution_id": setup_data.get("institution_id", ""),
+            "institution_id": progress.get("institution_id", ""),
             "selected_accounts": account_ids_raw,
             "setup_complete": True,
             "setup_date": datetime.now().isoformat(),
         }
 
         # Save the config to file
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f, indent=2)
+        await run_in_threadpool(config_store.save, config)
+
+        # End the setup session
+        await run_in_threadpool(sessions.delete, session_id)
 
-        # Clear setup data
-        setup_data.clear()
+        # Account data cached during the bank link may be outdated. The
+        # cache is shared by all users, so only drop the selected accounts.
+        for account_id in account_ids_raw:
+            client.cache.invalidate("account_details", account_id)
+            client.cache.invalidate("account_balances", account_id)
 
         # Return the completion template
-        return templates.TemplateResponse("setup/complete.html", {"request": request})
+        response = templates.TemplateResponse(
+            "setup/complete.html", {"request": request}
+        )
+        response.delete_cookie(SETUP_COOKIE)
+        return response
     except Exception as e:
         raise HTTPException(
             status_code=400, detail=f"Failed to complete setup: {str(e)}"
@@ -278,18 +391,34 @@ async def complete_setup(
 
 
 @router.delete("/reset")
-async def reset_setup(request: Request):
+async def reset_setup(
+    request: Request,
+    store: TransactionStore = Depends(get_transaction_store),
+    client: AsyncGoCardlessBankDataClient = Depends(get_async_bank_client),
+    config_store: ConfigStore = Depends(get_config_store),
+    sessions: SessionStore = Depends(get_setup_sessions),
+    context: UserContext = Depends(get_user_context),
+):
     """Reset the setup process by deleting the config file"""
     try:
-        # Clear in-memory setup data
-        setup_data.clear()
+        # End a setup in progress
+        session_id, _ = await _load_setup(request, sessions, context)
+        if session_id is not None:
+            await run_in_threadpool(sessions.delete, session_id)
+
+        # Forget transactions and responses cached for the old accounts
+        await run_in_threadpool(store.clear)
+        for account_id in config_store.get("selected_accounts", []):
+            client.cache.invalidate("account_details", account_id)
+            client.cache.invalidate("account_balances", account_id)
 
         # Remove the config file if it exists
-        if os.path.exists(CONFIG_FILE):
-            os.remove(CONFIG_FILE)
+        await run_in_threadpool(config_store.delete)
 
         # Return the reset template
-        return templates.TemplateResponse("setup/reset.html", {"request": request})
+        response = templates.TemplateResponse("setup/reset.html", {"request": request})
+        response.delete_cookie(SETUP_COOKIE)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to reset setup: {str(e)}")
 
@@ -1,19 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from app.models.transaction import Transaction
-from app.dependencies import get_bank_client
+from app.dependencies import (
+    get_bank_client,
+    get_config_store,
+    get_sync_scheduler,
+    get_transaction_store,
+)
+from app.services.config_store import ConfigStore
+from app.services.scheduler import SyncScheduler
 from app.services.gc_bank_data import GoCardlessBankDataClient
+from app.services.transaction_store import TransactionStore
+from app.services.concurrency import run_concurrently
+from app.services.analytics import get_frame, summarize
+from app.services.metrics import span
+from app.services.serialization import FAST_JSON, fast_json_response
+import base64
+import binascii
+import csv
+import io
+import logging
 import os
 import json
+import time
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 from datetime import date, datetime, timedelta
 
-# Path to the user configuration file
-CONFIG_DIR = os.path.join(os.getcwd(), "config")
-CONFIG_FILE = os.path.join(CONFIG_DIR, "user_config.json")
+# Stored transactions older than this (in seconds) are refreshed from the bank
+SYNC_MAX_AGE = int(os.getenv("TRANSACTIONS_SYNC_MAX_AGE", 6 * 60 * 60))
+
+# Columns of the CSV export, in order
+EXPORT_FIELDS = [
+    "id",
+    "account_id",
+    "booking_date",
+    "value_date",
+    "amount",
+    "currency",
+    "description",
+    "category",
+]
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
+logger = logging.getLogger(__name__)
+
 
 class TransactionResponse(BaseModel):
     id: str
@@ -24,37 +56,151 @@ class TransactionResponse(BaseModel):
     booking_date: date
     value_date: Optional[date] = None
     category: Optional[str] = None
+    status: str = "booked"
+    labels: List[str] = []
+
+
+class LabelsRequest(BaseModel):
+    labels: List[str]
+
+
+class GroupTotals(BaseModel):
+    income: float
+    expenses: float
+    net: float
+    count: int
+
+
+class CategoryTotals(GroupTotals):
+    category: Optional[str] = None
+
+
+class MonthTotals(GroupTotals):
+    month: str
+
+
+class BalancePoint(BaseModel):
+    date: date
+    balance: float
+
+
+class MonthlyRollup(GroupTotals):
+    account_id: str
+    month: str
+    category: Optional[str] = None
+    currency: str
+
+
+class CurrencySummary(GroupTotals):
+    by_category: List[CategoryTotals]
+    by_month: List[MonthTotals]
+    running_balance: List[BalancePoint]
+
+
+def _selected_accounts(
+    config_store: ConfigStore, account_id: Optional[str] = None
+) -> List[str]:
+    """Get the selected account IDs from the config, or just the requested one"""
+    # Check if setup has been completed
+    config = config_store.load()
+    if config is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Bank setup not completed. Please visit /setup first.",
+        )
+
+    selected = config.get("selected_accounts", [])
+    if account_id:
+        # Specific account requested, which has to be one of the user's
+        if account_id not in selected:
+            raise HTTPException(status_code=404, detail="Account not found")
+        return [account_id]
+
+    # All selected accounts
+    return selected
+
+
+def _encode_cursor(record) -> str:
+    """Opaque cursor pointing just after a transaction in list order"""
+    key = [record.booking_date.isoformat(), record.id, record.account_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """Get the (booking_date, id, account_id) a cursor points after"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        booking_date, tx_id, account_id = key
+        date.fromisoformat(booking_date)
+        if not isinstance(tx_id, str) or not isinstance(account_id, str):
+            raise ValueError("Invalid cursor")
+        return booking_date, tx_id, account_id
+    except (binascii.Error, TypeError, ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _sync_stale_accounts(
+    client: GoCardlessBankDataClient,
+    store: TransactionStore,
+    scheduler: SyncScheduler,
+    account_ids: List[str],
+):
+    """Sync accounts that were never synced or are stale, logging failures"""
+    # Only go to the bank for accounts that were never synced or are stale,
+    # everything else is served straight from the local store. While the
+    # background scheduler runs it keeps synced accounts fresh, so requests
+    # don't spend the bank's rate limit on them.
+    max_age = None if scheduler.running else SYNC_MAX_AGE
+    stale = [acc_id for acc_id in account_ids if store.needs_sync(acc_id, max_age)]
+    if not stale:
+        return
+
+    # Requests finding the same account stale at once share its sync
+    with span("sync"):
+        results = run_concurrently(
+            lambda acc_id: store.sync_if_needed(client, acc_id, max_age), stale
+        )
+    for acc_id, _, error in results:
+        if error is not None:
+            # Log the error but serve whatever we have stored
+            logger.warning(
+                "Error syncing transactions",
+                extra={"account_id": acc_id, "error": str(error)},
+            )
 
 
 @router.get("/", response_model=List[TransactionResponse])
 def list_transactions(
+    response: Response,
     account_id: Optional[str] = None,
     from_date: Optional[date] = Query(None),
     to_date: Optional[date] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    q: Optional[str] = Query(
+        None,
+        min_length=1,
+        description="Words in the description, additional information or labels",
+    ),
+    category: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, pattern="^(booked|pending)$"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
     client: GoCardlessBankDataClient = Depends(get_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
 ):
-    """List transactions with optional filtering"""
-    # Check if setup has been completed
-    if not os.path.exists(CONFIG_FILE):
-        raise HTTPException(
-            status_code=400,
-            detail="Bank setup not completed. Please visit /setup first.",
-        )
+    """
+    List transactions with optional filtering, newest first.
 
-    try:
-        # Load the configuration file
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
-
-        # Get the account IDs to query
-        account_ids = []
-        if account_id:
-            # Specific account requested
-            account_ids = [account_id]
-        else:
-            # All selected accounts
-            account_ids = config.get("selected_accounts", [])
+    With a limit, the X-Next-Cursor header holds the cursor for the next
+    page, and is left out on the last page.
+    """
+    account_ids = _selected_accounts(config_store, account_id)
+    after = _decode_cursor(cursor) if cursor else None
 
+    try:
         if not account_ids:
             return []
 
@@ -64,73 +210,207 @@ def list_transactions(
         if not to_date:
             to_date = datetime.now().date()
 
-        # Convert to strings for the API
-        date_from = from_date.isoformat()
-        date_to = to_date.isoformat()
+        _sync_stale_accounts(client, store, scheduler, account_ids)
 
-        # Fetch transactions for each account
-        all_transactions = []
-        for acc_id in account_ids:
-            try:
-                # Get transactions for this account with date filtering
-                transactions = client.get_account_transactions_paginated(
-                    acc_id, date_from=date_from, date_to=date_to
+        # Seconds since the least recently synced account was refreshed
+        synced_at = [
+            state["last_synced_at"]
+            for state in map(store.get_sync_state, account_ids)
+            if state is not None
+        ]
+        headers = {}
+        if synced_at:
+            headers["X-Snapshot-Age"] = str(int(time.time() - min(synced_at)))
+
+        # Stored transactions come back sorted by booking date (newest first),
+        # as compact records that only become models for the response. One
+        # extra is read to know whether there is a next page.
+        with span("query"):
+            records = store.list_records(
+                account_ids,
+                from_date.isoformat(),
+                to_date.isoformat(),
+                min_amount=min_amount,
+                max_amount=max_amount,
+                text=q,
+                category=category,
+                status=status,
+                after=after,
+                limit=limit + 1 if limit else None,
+            )
+        if limit and len(records) > limit:
+            records = records[:limit]
+            headers["X-Next-Cursor"] = _encode_cursor(records[-1])
+
+        with span("serialize"):
+            if FAST_JSON:
+                # Records from the store already match TransactionResponse
+                return fast_json_response(
+                    [record.to_dict() for record in records], headers
                 )
 
-                # Process booked transactions (confirmed)
-                for tx in transactions.get("transactions", {}).get("booked", []):
-                    try:
-                        # Extract transaction details
-                        tx_id = tx.get("internalTransactionId", "")
-                        booking_date_str = tx.get("bookingDate", "")
-                        value_date_str = tx.get("valueDate", "")
-
-                        # Parse the amount and handle negative values
-                        amount_str = tx.get("transactionAmount", {}).get("amount", "0")
-                        currency = tx.get("transactionAmount", {}).get("currency", "")
-
-                        # Get transaction description
-                        description = tx.get("remittanceInformationUnstructured", "")
-                        if not description:
-                            description = tx.get("additionalInformation", "")
-
-                        # Create transaction response
-                        all_transactions.append(
-                            TransactionResponse(
-                                id=tx_id,
-                                account_id=acc_id,
-                                amount=float(amount_str),
-                                currency=currency,
-                                description=description,
-                                booking_date=(
-                                    datetime.strptime(
-                                        booking_date_str, "%Y-%m-%d"
-                                    ).date()
-                                    if booking_date_str
-                                    else None
-                                ),
-                                value_date=(
-                                    datetime.strptime(value_date_str, "%Y-%m-%d").date()
-                                    if value_date_str
-                                    else None
-                                ),
-                                category=None,  # We'll implement categorization later
-                            )
-                        )
-                    except Exception as e:
-                        # Log the error but continue with other transactions
-                        print(
-                            f"Error processing transaction in account {acc_id}: {str(e)}"
-                        )
-            except Exception as e:
-                # Log the error but continue with other accounts
-                print(f"Error fetching transactions for account {acc_id}: {str(e)}")
-
-        # Sort transactions by booking date (newest first)
-        all_transactions.sort(key=lambda x: x.booking_date, reverse=True)
-
-        return all_transactions
+            response.headers.update(headers)
+            return [TransactionResponse(**record.to_dict()) for record in records]
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to retrieve transactions: {str(e)}"
         )
+
+
+@router.get("/summary", response_model=Dict[str, CurrencySummary])
+def transactions_summary(
+    account_id: Optional[str] = None,
+    from_date: Optional[date] = Query(None),
+    to_date: Optional[date] = Query(None),
+    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
+):
+    """Overview of income, expenses and balance per currency, with category and month breakdowns"""
+    account_ids = _selected_accounts(config_store, account_id)
+    _sync_stale_accounts(client, store, scheduler, account_ids)
+
+    try:
+        return summarize(get_frame(store), set(account_ids), from_date, to_date)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to summarize transactions: {str(e)}"
+        )
+
+
+@router.get("/monthly", response_model=List[MonthlyRollup])
+def monthly_totals(
+    account_id: Optional[str] = None,
+    from_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    to_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
+):
+    """Precomputed income and expenses per account, category and month"""
+    account_ids = _selected_accounts(config_store, account_id)
+    _sync_stale_accounts(client, store, scheduler, account_ids)
+
+    return store.monthly_rollups(account_ids, from_month, to_month)
+
+
+@router.get("/search", response_model=List[TransactionResponse])
+def search_transactions(
+    q: str = Query(..., min_length=1, description="Words or word prefixes to find"),
+    account_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
+):
+    """Search descriptions, additional information and labels, best matches first"""
+    account_ids = _selected_accounts(config_store, account_id)
+    _sync_stale_accounts(client, store, scheduler, account_ids)
+
+    records = store.search(account_ids, q, limit)
+    if FAST_JSON:
+        return fast_json_response([record.to_dict() for record in records])
+    return [TransactionResponse(**record.to_dict()) for record in records]
+
+
+@router.put("/{account_id}/{transaction_id}/labels", response_model=List[str])
+def set_transaction_labels(
+    account_id: str,
+    transaction_id: str,
+    request: LabelsRequest,
+    store: TransactionStore = Depends(get_transaction_store),
+):
+    """Replace the custom labels of a transaction"""
+    labels = store.set_labels(account_id, transaction_id, request.labels)
+    if labels is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return labels
+
+
+@router.get("/export")
+def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    account_id: Optional[str] = None,
+    from_date: Optional[date] = Query(None),
+    to_date: Optional[date] = Query(None),
+    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
+):
+    """Stream all stored transactions as NDJSON or CSV, one account at a time"""
+    account_ids = _selected_accounts(config_store, account_id)
+    _sync_stale_accounts(client, store, scheduler, account_ids)
+
+    date_from = from_date.isoformat() if from_date else None
+    date_to = to_date.isoformat() if to_date else None
+
+    def batches():
+        # Walk accounts one by one and read each from the store in batches
+        for acc_id in account_ids:
+            yield from store.iter_transactions([acc_id], date_from, date_to)
+
+    if format == "csv":
+        content = _csv_lines(batches())
+        media_type = "text/csv"
+    else:
+        content = _ndjson_lines(batches())
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="transactions.{format}"'
+        },
+    )
+
+
+def _ndjson_lines(batches):
+    for rows in batches:
+        yield "".join(json.dumps(row) + "\n" for row in rows)
+
+
+def _csv_lines(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        # Reuse the buffer for the next batch
+        buffer.seek(0)
+        buffer.truncate()
+
+    # The header is all that's left when there are no transactions
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.post("/sync", response_model=Dict[str, int])
+def sync_transactions(
+    account_id: Optional[str] = None,
+    client: GoCardlessBankDataClient = Depends(get_bank_client),
+    store: TransactionStore = Depends(get_transaction_store),
+    config_store: ConfigStore = Depends(get_config_store),
+):
+    """Fetch new transactions from the bank into the local store"""
+    account_ids = _selected_accounts(config_store, account_id)
+
+    # Number of transactions received per account
+    synced = {}
+    results = run_concurrently(
+        lambda acc_id: store.sync_account(client, acc_id), account_ids
+    )
+    for acc_id, count, error in results:
+        if error is not None:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Failed to sync transactions for account {acc_id}: {str(error)}",
+            )
+        synced[acc_id] = count
+
+    return synced
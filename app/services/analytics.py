@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+from app.services.user_pool import USER_POOL_SIZE
+
+EPOCH = date(1970, 1, 1)
+
+
+class TransactionFrame:
+    """Columnar copy of the transaction store for fast aggregation.
+
+    Every column is a NumPy array with one entry per transaction. Strings
+    (accounts, currencies, categories) are stored as integer codes into the
+    matching lookup list, dates as day numbers since 1970-01-01 and amounts
+    as integer minor units (cents), so sums are exact."""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.size = len(rows)
+
+        account_ids, currencies, booking_dates, amounts, categories = (
+            zip(*rows) if rows else ((), (), (), (), ())
+        )
+
+        self.accounts, self.account = _encode(account_ids)
+        self.currencies, self.currency = _encode(currencies)
+        self.categories, self.category = _encode(categories)
+
+        self.day = (
+            np.array(booking_dates, dtype="datetime64[D]")
+            .astype(np.int64)
+            .astype(np.int32)
+        )
+        self.month = (
+            self.day.astype("datetime64[D]")
+            .astype("datetime64[M]")
+            .astype(np.int64)
+            .astype(np.int32)
+        )
+        self.amount = np.rint(np.array(amounts, dtype=np.float64) * 100).astype(
+            np.int64
+        )
+
+    def mask(self, account_ids=None, date_from=None, date_to=None):
+        """Boolean mask selecting transactions of the given accounts and date range."""
+        selected = np.ones(self.size, dtype=bool)
+        if account_ids is not None:
+            codes = [i for i, acc in enumerate(self.accounts) if acc in account_ids]
+            selected &= np.isin(self.account, codes)
+        if date_from is not None:
+            selected &= self.day >= (date_from - EPOCH).days
+        if date_to is not None:
+            selected &= self.day <= (date_to - EPOCH).days
+        return selected
+
+
+def _encode(values):
+    """Map values to integer codes, returning (lookup list, codes array)."""
+    lookup = {}
+    codes = np.fromiter(
+        (lookup.setdefault(value, len(lookup)) for value in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return list(lookup), codes
+
+
+def _totals(amounts):
+    income = int(amounts[amounts > 0].sum())
+    expenses = int(amounts[amounts < 0].sum())
+    return {
+        "income": income / 100,
+        "expenses": expenses / 100,
+        "net": (income + expenses) / 100,
+        "count": int(amounts.size),
+    }
+
+
+def _grouped_totals(keys, amounts, size):
+    """Income, expenses, net and count per integer key in one bincount pass each."""
+    income = np.bincount(
+        keys, weights=np.where(amounts > 0, amounts, 0), minlength=size
+    )
+    expenses = np.bincount(
+        keys, weights=np.where(amounts < 0, amounts, 0), minlength=size
+    )
+    counts = np.bincount(keys, minlength=size)
+    return income, expenses, counts
+
+
+def summarize(frame, account_ids=None, date_from=None, date_to=None):
+    """
+    Compute totals, per-category and per-month breakdowns and running balances.
+
+    Everything is computed per currency, since amounts in different
+    currencies can't be added up.
+
+    Args:
+        frame (TransactionFrame): Transactions to summarize
+        account_ids (list, optional): Only include these accounts
+        date_from (date, optional): Only include transactions booked on or after this date
+        date_to (date, optional): Only include transactions booked on or before this date
+
+    Returns:
+        dict: Summary per currency code
+    """
+    selected = frame.mask(account_ids, date_from, date_to)
+
+    summary = {}
+    for code, currency in enumerate(frame.currencies):
+        in_currency = selected & (frame.currency == code)
+        if not in_currency.any():
+            continue
+
+        amounts = frame.amount[in_currency]
+        categories = frame.category[in_currency]
+        days = frame.day[in_currency]
+        months = frame.month[in_currency]
+
+        # Per category, only for categories that occur
+        income, expenses, counts = _grouped_totals(
+            categories, amounts, len(frame.categories)
+        )
+        by_category = [
+            {
+                "category": frame.categories[i],
+                "income": income[i] / 100,
+                "expenses": expenses[i] / 100,
+                "net": (income[i] + expenses[i]) / 100,
+                "count": int(counts[i]),
+            }
+            for i in np.flatnonzero(counts)
+        ]
+
+        # Per month, shifted so the first month is key 0
+        first_month = int(months.min())
+        month_keys = months - first_month
+        income, expenses, counts = _grouped_totals(
+            month_keys, amounts, int(month_keys.max()) + 1
+        )
+        by_month = [
+            {
+                "month": str(np.datetime64(first_month + int(i), "M")),
+                "income": income[i] / 100,
+                "expenses": expenses[i] / 100,
+                "net": (income[i] + expenses[i]) / 100,
+                "count": int(counts[i]),
+            }
+            for i in np.flatnonzero(counts)
+        ]
+
+        # Running balance: cumulative net flow at the end of each day with transactions
+        unique_days, day_keys = np.unique(days, return_inverse=True)
+        balances = np.cumsum(np.bincount(day_keys, weights=amounts))
+        running_balance = [
+            {"date": EPOCH + timedelta(days=int(day)), "balance": balance / 100}
+            for day, balance in zip(unique_days, np.rint(balances))
+        ]
+
+        summary[currency] = {
+            **_totals(amounts),
+            "by_category": by_category,
+            "by_month": by_month,
+            "running_balance": running_balance,
+        }
+
+    return summary
+
+
+# Frames are rebuilt only when the store has changed since they were loaded.
+# They are kept for as many stores as the user pool holds, plus the one of
+# requests made without logging in, least recently used first out, so the
+# frames of users the pool has dropped don't stay in memory.
+FRAME_CACHE_SIZE = USER_POOL_SIZE + 1
+_frames = OrderedDict()  # store path -> (revision, TransactionFrame)
+_frames_lock = threading.Lock()
+
+
+def get_frame(store):
+    """
+    Get the columnar frame for a transaction store, reloading it after syncs.
+
+    Args:
+        store (TransactionStore): The store to load transactions from
+
+    Returns:
+        TransactionFrame: Frame matching the store's current revision
+    """
+    revision = store.get_revision()
+    with _frames_lock:
+        cached = _frames.get(store.path)
+        if cached is not None and cached[0] == revision:
+            _frames.move_to_end(store.path)
+            return cached[1]
+
+        frame = TransactionFrame(store.iter_columns())
+        _frames[store.path] = (revision, frame)
+        _frames.move_to_end(store.path)
+        while len(_frames) > FRAME_CACHE_SIZE:
+            _frames.popitem(last=False)
+        return frame
@@ -0,0 +1,146 @@
+from datetime import date, timedelta
+
+# Periods a budget can cover, each starting on the first day of the week
+# (Monday), month or year
+BUDGET_PERIODS = ("week", "month", "year")
+
+# Order of budget states, from fine to over the limit
+BUDGET_STATES = ("ok", "warning", "exceeded")
+
+
+def period_bounds(period, day):
+    """
+    Get the period of a budget that contains a day.
+
+    Args:
+        period (str): One of BUDGET_PERIODS
+        day (date): Any day in the period
+
+    Returns:
+        tuple: (first day, last day) as dates
+    """
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == "month":
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    if period == "year":
+        return date(day.year, 1, 1), date(day.year, 12, 31)
+    raise ValueError(f"Unknown budget period: {period}")
+
+
+def budget_state(budget, spent_cents):
+    """Whether spending is fine, past the warning threshold or over the limit."""
+    if spent_cents >= budget["limit_cents"]:
+        return "exceeded"
+    if spent_cents >= budget["warn_at"] * budget["limit_cents"]:
+        return "warning"
+    return "ok"
+
+
+def crossing(budget, before_cents, after_cents):
+    """
+    Get the threshold a change in spending crossed upwards, if any.
+
+    Only the highest one is reported, so jumping straight past the limit
+    gives a single "exceeded" event rather than a warning as well.
+
+    Returns:
+        str: "warning" or "exceeded", or None if no threshold was crossed
+    """
+    before = BUDGET_STATES.index(budget_state(budget, before_cents))
+    after = BUDGET_STATES.index(budget_state(budget, after_cents))
+    return BUDGET_STATES[after] if after > before else None
+
+
+# Stands for any category or account in BudgetIndex and spent_per_budget,
+# since None is also the category of uncategorised transactions
+_ANY = object()
+
+
+class BudgetIndex:
+    """Budgets compiled for finding the ones a change in transactions affects.
+
+    Budgets are grouped by category, so the work after a sync depends on
+    the categories and periods that changed, not on the number of budgets."""
+
+    def __init__(self, budgets):
+        self.budgets = {budget["id"]: budget for budget in budgets}
+        self.periods = {budget["period"] for budget in budgets}
+        # (period, category or _ANY for all spending) -> budgets
+        self._by_category = {}
+        for budget in budgets:
+            category = _ANY if budget["category"] is None else budget["category"]
+            key = (budget["period"], category)
+            self._by_category.setdefault(key, []).append(budget)
+
+    def changes(self, account_id, deltas):
+        """
+        Add up how much spending changed in each budget period.
+
+        Args:
+            account_id (str): Account whose transactions changed
+            deltas (iterable): (category, booking_date, currency, change of
+                expenses in cents) per changed transaction, e.g. negative for
+                the date a transaction moved away from
+
+        Returns:
+            dict: (budget ID, first day, last day) with ISO dates -> change
+                in cents, leaving out periods whose spending didn't change
+        """
+        # Sum the deltas per period first, so every budget is looked at once
+        # per period no matter how many transactions changed
+        bounds = {}  # (period, day) -> (first day, last day)
+        sums = {}  # (period, category, currency) -> {(first, last): cents}
+        for category, booking_date, currency, cents in deltas:
+            for period in self.periods:
+                key = (period, booking_date)
+                if key not in bounds:
+                    start, end = period_bounds(period, date.fromisoformat(booking_date))
+                    bounds[key] = (start.isoformat(), end.isoformat())
+                for tracked in (category, _ANY):
+                    period_sums = sums.setdefault((period, tracked, currency), {})
+                    period_sums[bounds[key]] = period_sums.get(bounds[key], 0) + cents
+
+        changes = {}
+        for (period, category, currency), period_sums in sums.items():
+            for budget in self._by_category.get((period, category), []):
+                other_account = budget["account_id"] not in (None, account_id)
+                if other_account or budget["currency"] != currency:
+                    continue
+                for (start, end), cents in period_sums.items():
+                    if cents:
+                        changes[(budget["id"], start, end)] = cents
+        return changes
+
+
+def spent_per_budget(budgets, groups):
+    """
+    Add up spending per budget from totals per category, account and currency.
+
+    Args:
+        budgets (iterable): Budgets covering the period the groups are for
+        groups (iterable): (category, account_id, currency, expenses in cents)
+
+    Returns:
+        dict: budget ID -> spent in cents
+    """
+    # Totals with and without the category and account, for O(1) lookups
+    totals = {}
+    for category, account_id, currency, cents in groups:
+        for key in (
+            (category, account_id, currency),
+            (category, _ANY, currency),
+            (_ANY, account_id, currency),
+            (_ANY, _ANY, currency),
+        ):
+            totals[key] = totals.get(key, 0) + cents
+
+    spent = {}
+    for budget in budgets:
+        category = _ANY if budget["category"] is None else budget["category"]
+        account_id = _ANY if budget["account_id"] is None else budget["account_id"]
+        spent[budget["id"]] = totals.get((category, account_id, budget["currency"]), 0)
+    return spent
@@ -0,0 +1,308 @@
+import re
+from collections import deque
+
+try:
+    # Python 3.11+
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+# Kinds of categorisation rules
+RULE_KINDS = ("substring", "regex", "counterparty", "amount")
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton that finds all patterns occurring in a text in one pass.
+
+    Patterns map to a list of values (rule IDs); search returns the values of
+    every pattern found."""
+
+    def __init__(self, patterns):
+        # Trie as parallel lists: goto transitions, failure links and outputs
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for pattern, values in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].extend(values)
+
+        # Breadth-first pass to set failure links, merging the outputs of the
+        # state we fall back to so search never has to follow them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._out[next_state] = (
+                    self._out[next_state] + self._out[self._fail[next_state]]
+                )
+
+    def _transition(self, state, char):
+        """Follow failure links for a missing transition and remember the result."""
+        origin = state
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        target = self._goto[state].get(char, 0)
+        # Turns the trie into a DFA on the characters actually seen
+        self._goto[origin][char] = target
+        return target
+
+    def search(self, text):
+        """Return the set of values of all patterns that occur in text."""
+        found = set()
+        goto, out = self._goto, self._out
+        state = 0
+        for char in text:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = self._transition(state, char)
+            state = next_state
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class Categorizer:
+    """Assigns categories to transactions using user-defined rules.
+
+    All rules are compiled into a few combined matchers, so categorising a
+    transaction costs one pass over its text whatever the number of rules:
+
+    - substring rules, plus a literal that every match of a regex rule must
+      contain, go into one Aho-Corasick automaton. Regex rules are only run
+      on texts where their literal was found.
+    - regex rules without such a literal are merged into a single regex.
+    - counterparty rules are a dict lookup.
+
+    When several rules match, the one with the lowest (priority, id) wins.
+    Any rule can also be limited to an amount range with min_amount and
+    max_amount; "amount" rules match on the range alone."""
+
+    def __init__(self, rules):
+        self.rules = {rule["id"]: rule for rule in rules}
+
+        literals = {}
+        merged = []
+        self._regexes = {}
+        self._counterparties = {}
+        self._amount_rules = []
+
+        for rule in sorted(rules, key=_precedence):
+            kind = rule["kind"]
+            pattern = rule.get("pattern") or ""
+            if kind == "substring":
+                literals.setdefault(pattern.lower(), []).append(rule["id"])
+            elif kind == "regex":
+                literal = required_literal(pattern)
+                if literal:
+                    literals.setdefault(literal, []).append(rule["id"])
+                    self._regexes[rule["id"]] = re.compile(pattern, re.IGNORECASE)
+                else:
+                    merged.append(rule)
+            elif kind == "counterparty":
+                self._counterparties.setdefault(pattern.lower(), []).append(rule["id"])
+            elif kind == "amount":
+                self._amount_rules.append(rule)
+
+        self._literals = AhoCorasick(literals) if literals else None
+        # Rules limited to an amount range are kept out of the merged regex,
+        # because a text match there would hide lower-priority rules when the
+        # amount is out of range
+        self._merged_regexes = _merge_regexes(
+            [rule for rule in merged if not _has_range(rule)]
+        )
+        self._ranged_regexes = [
+            (rule, re.compile(rule["pattern"], re.IGNORECASE))
+            for rule in merged
+            if _has_range(rule)
+        ]
+
+    def categorize(self, transaction):
+        """
+        Find the category for a single transaction.
+
+        Args:
+            transaction (dict): Transaction with description,
+                additional_information, counterparty and amount
+
+        Returns:
+            tuple: (category, rule_id), or (None, None) if no rule matches
+        """
+        amount = transaction.get("amount") or 0
+        text = " ".join(
+            filter(
+                None,
+                [
+                    transaction.get("description"),
+                    transaction.get("additional_information"),
+                ],
+            )
+        ).lower()
+
+        candidates = set()
+        if self._literals is not None:
+            for rule_id in self._literals.search(text):
+                regex = self._regexes.get(rule_id)
+                # A found literal is enough for substring rules, regex rules
+                # still have to match
+                if regex is None or regex.search(text):
+                    candidates.add(rule_id)
+        for regex in self._merged_regexes:
+            match = regex.match(text)
+            if match is not None:
+                candidates.add(int(match.lastgroup[1:]))
+        counterparty = (transaction.get("counterparty") or "").lower()
+        candidates.update(self._counterparties.get(counterparty, []))
+
+        # Only the best matching rule is needed, so these are checked in
+        # precedence order and stop at the first match
+        for rule in self._amount_rules:
+            if _in_range(rule, amount):
+                candidates.add(rule["id"])
+                break
+        for rule, regex in self._ranged_regexes:
+            if _in_range(rule, amount) and regex.search(text):
+                candidates.add(rule["id"])
+                break
+
+        best = None
+        for rule_id in candidates:
+            rule = self.rules[rule_id]
+            if not _in_range(rule, amount):
+                continue
+            if best is None or _precedence(rule) < _precedence(best):
+                best = rule
+
+        if best is None:
+            return None, None
+        return best["category"], best["id"]
+
+    def categorize_many(self, transactions):
+        """Categorise a batch of transactions, returning (category, rule_id) tuples in order."""
+        return [self.categorize(tx) for tx in transactions]
+
+
+def required_literal(pattern):
+    """
+    Find a lowercase literal that every match of a regex must contain.
+
+    Only runs of plain characters at the top level of the pattern are
+    considered, and the longest one is returned. Returns None when there is
+    no such literal, e.g. for "a|b" or ".*", or when the pattern uses inline
+    flags that could change how it matches.
+
+    Args:
+        pattern (str): Regular expression
+
+    Returns:
+        str: The literal, or None
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    if parsed.state.flags & (re.VERBOSE | re.ASCII | re.LOCALE):
+        return None
+
+    best = ""
+    run = ""
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run += chr(value)
+            continue
+        best = max(best, run, key=len)
+        run = ""
+    best = max(best, run, key=len).lower()
+    return best or None
+
+
+def _precedence(rule):
+    return (rule.get("priority", 100), rule["id"])
+
+
+def _has_range(rule):
+    return rule.get("min_amount") is not None or rule.get("max_amount") is not None
+
+
+def _in_range(rule, amount):
+    if rule.get("min_amount") is not None and amount < rule["min_amount"]:
+        return False
+    if rule.get("max_amount") is not None and amount > rule["max_amount"]:
+        return False
+    return True
+
+
+def _has_groups(pattern):
+    """Check if a regex has groups of its own, which merging would renumber."""
+    try:
+        return sre_parse.parse(pattern).state.groups > 1
+    except re.error:
+        return True
+
+
+def _merge_regexes(rules):
+    """
+    Merge regex rules into as few patterns as possible.
+
+    Every rule becomes a lookahead anchored at the start of the text,
+    followed by an empty group named after the rule. Alternatives are
+    tried in precedence order, so the first one that matches anywhere in
+    the text is the best matching rule. Rules with groups of their own are
+    checked one by one instead, since a backreference like \\1 would point
+    at another rule's group once merged.
+
+    Returns:
+        list: Objects whose match() returns the best matching rule of theirs,
+            with the rule's group name as lastgroup
+    """
+    grouped = [rule for rule in rules if _has_groups(rule["pattern"])]
+    plain = [rule for rule in rules if not _has_groups(rule["pattern"])]
+    matchers = [_SequentialRegex(grouped)] if grouped else []
+    if not plain:
+        return matchers
+
+    alternatives = [
+        f"(?=[\\s\\S]*?(?:{rule['pattern']}))(?P<r{rule['id']}>)" for rule in plain
+    ]
+    try:
+        matchers.append(re.compile("|".join(alternatives), re.IGNORECASE))
+    except re.error:
+        # E.g. inline flags that are only allowed at the start of a pattern
+        matchers.append(_SequentialRegex(plain))
+    return matchers
+
+
+class _SequentialRegex:
+    """Fallback with the same match() interface as the merged regex."""
+
+    def __init__(self, rules):
+        self._rules = [
+            (rule["id"], re.compile(rule["pattern"], re.IGNORECASE)) for rule in rules
+        ]
+
+    def match(self, text):
+        for rule_id, regex in self._rules:
+            if regex.search(text):
+                return _Match(f"r{rule_id}")
+        return None
+
+
+class _Match:
+    def __init__(self, lastgroup):
+        self.lastgroup = lastgroup
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import asyncio
+import os
+import threading
+
+# Maximum number of bank API calls made at the same time
+MAX_CONCURRENCY = int(os.getenv("BANK_MAX_CONCURRENCY", 4))
+
+# Threads shared by every run_concurrently call, enough for several requests
+# and the background sync to each run MAX_CONCURRENCY calls at once
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", MAX_CONCURRENCY * 4))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=EXECUTOR_WORKERS, thread_name_prefix="concurrently"
+            )
+        return _executor
+
+
+def run_concurrently(func, items, max_workers=None):
+    """
+    Call func for every item on a thread pool and collect the outcomes.
+
+    Errors are returned instead of raised, so one failing account does not
+    hide the results for the others. The pool is shared by all callers, so
+    at most max_workers of its threads work on one call's items, and the
+    calling thread works through them too. A call made from one of the
+    pool's threads therefore finishes even when every other thread is busy.
+
+    Args:
+        func (callable): Function taking a single item
+        items (iterable): Items to call func with, e.g. account IDs
+        max_workers (int, optional): Concurrency limit (default: MAX_CONCURRENCY)
+
+    Returns:
+        list: (item, result, error) tuples in the order of items, where
+            error is the raised exception or None
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = min(max_workers or MAX_CONCURRENCY, len(items))
+    if workers <= 1:
+        # Nothing to overlap, skip the pool
+        return [_call(func, item) for item in items]
+
+    results = [None] * len(items)
+    queue = iter(enumerate(items))
+    queue_lock = threading.Lock()
+
+    def work():
+        while True:
+            with queue_lock:
+                index, item = next(queue, (None, None))
+            if index is None:
+                return
+            results[index] = _call(func, item)
+
+    # Every helper runs in a copy of the caller's context, so what the caller
+    # keeps there (like the current request's timings) is seen by the workers
+    executor = _get_executor()
+    helpers = [executor.submit(copy_context().run, work) for _ in range(workers - 1)]
+    work()
+    for helper in helpers:
+        # Helpers that haven't started have nothing left to do
+        if not helper.cancel():
+            helper.result()
+    return results
+
+
+async def gather_concurrently(func, items, max_concurrency=None):
+    """
+    Async counterpart of run_concurrently for coroutine functions.
+
+    Args:
+        func (callable): Coroutine function taking a single item
+        items (iterable): Items to call func with, e.g. account IDs
+        max_concurrency (int, optional): Concurrency limit (default: MAX_CONCURRENCY)
+
+    Returns:
+        list: (item, result, error) tuples in the order of items
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or MAX_CONCURRENCY))
+
+    async def call(item):
+        async with semaphore:
+            try:
+                return item, await func(item), None
+            except Exception as e:
+                return item, None, e
+
+    return list(await asyncio.gather(*(call(item) for item in items)))
+
+
+def _call(func, item):
+    try:
+        return item, func(item), None
+    except Exception as e:
+        return item, None, e
@@ -0,0 +1,146 @@
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigStore:
+    """Keeps the user configuration file in memory.
+
+    The file is read once and served from memory afterwards. It is only
+    read again when its modification time or size changes, which is checked
+    at most once per check_interval seconds, so edits made by hand or by
+    another worker are still picked up. Writes go to a temporary file that
+    replaces the config in one rename, so readers never see a half-written
+    file."""
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+
+        self._config = None
+        self._signature = None  # (mtime_ns, size) of the file we loaded
+        self._checked_at = None
+        self._lock = threading.RLock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Reload the file if it changed since we last looked."""
+        now = time.monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < self.check_interval
+        ):
+            return
+        self._checked_at = now
+
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+
+        config = None
+        if signature is not None:
+            try:
+                with open(self.path, "r") as f:
+                    config = json.load(f)
+            except (OSError, ValueError) as e:
+                # Keep serving what we had, the next check will try again
+                logger.warning(
+                    "Error loading config", extra={"path": self.path, "error": str(e)}
+                )
+                return
+        self._config = config
+        self._signature = signature
+
+    def load(self):
+        """
+        Get the configuration.
+
+        Returns:
+            dict: A copy of the configuration, or None if setup was not completed
+        """
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._config)
+
+    def get(self, key, default=None):
+        """Get a single configuration value."""
+        with self._lock:
+            self._refresh()
+            if self._config is None:
+                return default
+            return copy.deepcopy(self._config.get(key, default))
+
+    @property
+    def exists(self):
+        """Whether a configuration has been saved, i.e. setup was completed."""
+        with self._lock:
+            self._refresh()
+            return self._config is not None
+
+    def save(self, config):
+        """
+        Replace the configuration, writing the file atomically.
+
+        Args:
+            config (dict): The new configuration
+        """
+        with self._lock:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix=".user_config.", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(config, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._config = copy.deepcopy(config)
+            self._signature = self._file_signature()
+            self._checked_at = time.monotonic()
+
+    def update(self, **changes):
+        """
+        Change some values of an existing configuration.
+
+        Returns:
+            bool: False if there is no configuration to update
+        """
+        with self._lock:
+            self._checked_at = None  # Don't write over a change made elsewhere
+            config = self.load()
+            if config is None:
+                return False
+            config.update(changes)
+            self.save(config)
+            return True
+
+    def delete(self):
+        """Remove the configuration file, e.g. when setup is reset."""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self._config = None
+            self._signature = None
+            self._checked_at = time.monotonic()
@@ -1,136 +1,691 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from uuid import uuid4
+import asyncio
+import logging
 import os
+import re
 import requests
+import threading
 import time
+from requests.adapters import HTTPAdapter
 from requests.auth import AuthBase
-
-BASE_URL = "https://bankaccountdata.gocardless.com/api/v2"
+from app.services.concurrency import MAX_CONCURRENCY
+from app.services.metrics import record_upstream
+from app.services.resilience import (
+    DEFAULT_TIMEOUT,
+    ENDPOINT_TIMEOUTS,
+    CircuitOpenError,
+    RetryPolicy,
+    circuit_breaker,
+)
+
+logger = logging.getLogger(__name__)
+
+# Can point at a stand-in server, e.g. the one in benchmarks.fake_gocardless
+BASE_URL = os.getenv(
+    "GOCARDLESS_BASE_URL", "https://bankaccountdata.gocardless.com/api/v2"
+).rstrip("/")
 SECRET_ID = os.getenv("NORDIGEN_SECRET_ID")
 SECRET_KEY = os.getenv("NORDIGEN_SECRET_KEY")
 
+# Seconds a cached response stays fresh, per endpoint. Institutions and account
+# details hardly ever change, balances only need to be a few minutes fresh.
+CACHE_TTLS = {
+    "institutions": int(os.getenv("CACHE_TTL_INSTITUTIONS", 24 * 60 * 60)),
+    "account_details": int(os.getenv("CACHE_TTL_ACCOUNT_DETAILS", 24 * 60 * 60)),
+    "account_balances": int(os.getenv("CACHE_TTL_ACCOUNT_BALANCES", 5 * 60)),
+}
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+
+
+class TTLCache:
+    """Thread-safe LRU cache of API responses with a TTL per entry.
+
+    Entries are keyed by (endpoint, key). Hits and misses are counted per
+    endpoint, so every hit is an upstream call saved from the API quota.
+    Cached values are shared between callers and must not be mutated."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self._entries = OrderedDict()  # (endpoint, key) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def get(self, endpoint, key):
+        """
+        Look up a cached response.
 
-class GoCardlessBankAuth(AuthBase):
-    """Custom auth handler for GoCardless Bank API token authentication.
-    This modifies the client request to include the Authorization header with the Bearer token.
-    It checks if the token is valid and refreshes it if necessary."""
+        Returns:
+            tuple: (found, value), found is False for missing or expired entries
+        """
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+            if entry is not None and entry[0] > time.monotonic():
+                # Mark as most recently used
+                self._entries.move_to_end((endpoint, key))
+                self.hits[endpoint] = self.hits.get(endpoint, 0) + 1
+                return True, entry[1]
+
+            # Expired entries are kept until evicted, as a fallback for when
+            # the API is unavailable
+            self.misses[endpoint] = self.misses.get(endpoint, 0) + 1
+            return False, None
+
+    def get_stale(self, endpoint, key):
+        """
+        Look up a cached response even if it has expired.
 
-    def __init__(self, client):
-        self.client = client
+        Returns:
+            tuple: (found, value)
+        """
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+            if entry is None:
+                return False, None
+            return True, entry[1]
+
+    def set(self, endpoint, key, value):
+        """Store a response for the endpoint's TTL, evicting the least recently used entries."""
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[(endpoint, key)] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end((endpoint, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_fetch(self, endpoint, key, fetch):
+        """
+        Return the cached response, or call fetch() and cache its result.
+        While the API is unavailable an expired response is returned instead.
+        """
+        found, value = self.get(endpoint, key)
+        if found:
+            return value
+
+        try:
+            value = fetch()
+        except CircuitOpenError:
+            found, value = self.get_stale(endpoint, key)
+            if not found:
+                raise
+            return value
+        self.set(endpoint, key, value)
+        return value
+
+    def invalidate(self, endpoint, key=None):
+        """Drop one cached response, or every response of an endpoint if key is None."""
+        with self._lock:
+            for entry_key in list(self._entries):
+                if entry_key[0] == endpoint and (key is None or entry_key[1] == key):
+                    del self._entries[entry_key]
+
+    def clear(self):
+        """Drop all cached responses. The hit and miss counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache usage counters.
 
-    def __call__(self, r):
-        # Check if token is valid, refresh if needed
-        self.client.ensure_valid_token()
-        # Add the authorization header to the request
-        r.headers["Authorization"] = f"Bearer {self.client.access_token}"
-        return r
+        Returns:
+            dict: Entry count, evictions and hits/misses per endpoint
+        """
+        with self._lock:
+            endpoints = sorted(set(self.ttls) | set(self.hits) | set(self.misses))
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "endpoints": {
+                    endpoint: {
+                        "ttl_seconds": self.ttls.get(endpoint, 0),
+                        "hits": self.hits.get(endpoint, 0),
+                        "misses": self.misses.get(endpoint, 0),
+                    }
+                    for endpoint in endpoints
+                },
+            }
+
+
+# Responses are cached per process and shared by the sync and async clients
+response_cache = TTLCache()
+
+# Per-account endpoints have their own daily quota in GoCardless, reported in
+# these headers on every response
+ACCOUNT_RATE_LIMIT_HEADERS = {
+    "limit": "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_LIMIT",
+    "remaining": "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_REMAINING",
+    "reset": "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET",
+}
+ACCOUNT_URL = re.compile(r"/accounts/([^/]+)/(?:(balances|details|transactions)/)?")
+
+
+class RateLimitTracker:
+    """Remembers the remaining GoCardless quota per account and endpoint.
+
+    Endpoints are "details" (the account itself and its details),
+    "balances" and "transactions", which GoCardless limits separately."""
+
+    def __init__(self):
+        self._limits = {}  # (account_id, endpoint) -> dict
+        self._lock = threading.Lock()
+
+    def record(self, url, status_code, headers):
+        """
+        Update the quota from the rate-limit headers of an account response.
+
+        Args:
+            url (str): Request URL
+            status_code (int): Response status, a 429 means nothing is left
+            headers (Mapping): Response headers
+        """
+        match = ACCOUNT_URL.search(str(url))
+        if match is None:
+            return
 
+        values = {}
+        for name, header in ACCOUNT_RATE_LIMIT_HEADERS.items():
+            try:
+                values[name] = int(headers[header])
+            except (KeyError, TypeError, ValueError):
+                pass
+        if status_code == 429:
+            values["remaining"] = 0
+        if not values:
+            return
+
+        key = (match.group(1), match.group(2) or "details")
+        with self._lock:
+            limit = self._limits.setdefault(key, {})
+            limit.update(
+                {
+                    "limit": values.get("limit", limit.get("limit")),
+                    "remaining": values.get("remaining", limit.get("remaining")),
+                    "updated_at": time.time(),
+                }
+            )
+            if "reset" in values:
+                limit["reset_at"] = time.time() + values["reset"]
+
+    def get(self, account_id, endpoint):
+        """
+        Get the last known quota for an account endpoint.
+
+        Returns:
+            dict: limit, remaining and reset_at (absolute timestamp), or None if unknown
+        """
+        with self._lock:
+            limit = self._limits.get((account_id, endpoint))
+            if limit is None:
+                return None
+            limit = dict(limit)
+
+        # The quota is back to full once the reset time has passed
+        if limit.get("reset_at") and time.time() >= limit["reset_at"]:
+            return None
+        return limit
+
+
+# Quota seen by any client in this process
+rate_limits = RateLimitTracker()
+
+
+# Refresh tokens in the background this many seconds before requests would
+# have to refresh them
+TOKEN_REFRESH_AHEAD = int(os.getenv("TOKEN_REFRESH_AHEAD", 5 * 60))
+
+
+class GoCardlessTokenManager:
+    """Owns the GoCardless access and refresh tokens for all clients.
+
+    Only one refresh runs at a time, whether it comes from a thread or a
+    coroutine: the others wait for it and then use its token. Every new
+    token is passed to on_update, so it can be persisted and reused after
+    a restart.
+
+    Token calls are made by the clients, which pass a post(url, payload)
+    function returning a requests or httpx response."""
 
-class GoCardlessBankDataClient:
     def __init__(
-        self, secret_id=SECRET_ID, secret_key=SECRET_KEY, token_refresh_buffer=60
+        self,
+        secret_id=SECRET_ID,
+        secret_key=SECRET_KEY,
+        refresh_buffer=60,
+        on_update=None,
     ):
         self.secret_id = secret_id
         self.secret_key = secret_key
+        self.refresh_buffer = refresh_buffer
+        self.on_update = on_update
+
         self.access_token = None
         self.refresh_token = None
         self.token_expires = 0  # Absolute timestamp
         self.refresh_expires = 0  # Absolute timestamp
-        self.token_refresh_buffer = token_refresh_buffer
 
-        # Create a session for connection pooling and persistence
-        self.session = requests.Session()
-        self.session.headers.update({"accept": "application/json"})
-        # Set our custom auth handler
-        self.session.auth = GoCardlessBankAuth(self)
+        self._lock = threading.Lock()
+        self._async_lock = None
+        self._stop = threading.Event()
+        self._thread = None
 
-    def ensure_valid_token(self) -> None:
-        """Ensure we have a valid access token, refreshing if necessary."""
+    def needs_refresh(self, ahead=0):
+        """Check if the access token is missing or expires within the buffer (plus ahead seconds)."""
         now = int(time.time())
-        # Check if token is missing or will expire soon
-        if not self.access_token or now >= (
-            self.token_expires - self.token_refresh_buffer
-        ):
-            # If we have a valid refresh token, use it
-            if self.refresh_token and now < self.refresh_expires:
-                self.refresh_access_token()
-            else:
-                # Otherwise get a completely new token
-                self.get_access_token()
+        return not self.access_token or now >= (
+            self.token_expires - self.refresh_buffer - ahead
+        )
 
-    def get_access_token(self) -> str:
-        url = f"{BASE_URL}/token/new/"
+    def to_dict(self):
+        return {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "token_expires": self.token_expires,
+            "refresh_expires": self.refresh_expires,
+        }
 
-        # Don't use self.session here to avoid auth loop
-        # Include proper headers for the API request
-        headers = {"Accept": "application/json", "Content-Type": "application/json"}
+    def load(self, token_data):
+        """Use tokens saved earlier, without notifying on_update."""
+        with self._lock:
+            self.access_token = token_data.get("access_token")
+            self.refresh_token = token_data.get("refresh_token")
+            self.token_expires = token_data.get("token_expires", 0)
+            self.refresh_expires = token_data.get("refresh_expires", 0)
+
+    def reset(self):
+        self.load({})
 
-        resp = requests.post(
-            url,
-            json={"secret_id": self.secret_id, "secret_key": self.secret_key},
-            headers=headers,
+    def _token_request(self, force_new=False):
+        """Pick the token call to make: a refresh while the refresh token is valid, else a new token."""
+        now = int(time.time())
+        if not force_new and self.refresh_token and now < self.refresh_expires:
+            return (
+                "refresh",
+                f"{BASE_URL}/token/refresh/",
+                {"refresh": self.refresh_token},
+            )
+        return (
+            "new",
+            f"{BASE_URL}/token/new/",
+            {
+                "secret_id": self.secret_id,
+                "secret_key": self.secret_key,
+            },
         )
 
-        # Print response details for debugging if there's an error
+    def _apply(self, kind, resp, requested_at):
+        """
+        Store the tokens from a token response.
+
+        Returns:
+            bool: False if the refresh token was rejected and a new token is needed
+        """
+        # Log response details for debugging if there's an error
         if resp.status_code != 200:
-            print(f"Token request failed: {resp.status_code} {resp.reason}")
-            print(f"Response: {resp.text}")
+            logger.warning(
+                "Token request failed",
+                extra={"kind": kind, "status": resp.status_code, "body": resp.text},
+            )
+
+        if kind == "refresh" and resp.status_code == 401:
+            # Refresh token expired or invalid, get a new one
+            return False
 
         resp.raise_for_status()
         data = resp.json()
 
-        # Store tokens
+        # Convert durations to absolute timestamps
         self.access_token = data["access"]
-        self.refresh_token = data["refresh"]
+        self.token_expires = requested_at + data.get("access_expires", 0)
+        if kind == "new":
+            self.refresh_token = data["refresh"]
+            self.refresh_expires = requested_at + data.get("refresh_expires", 0)
 
-        # Convert durations to absolute timestamps
-        now = int(time.time())
-        self.token_expires = now + data.get("access_expires", 0)
-        self.refresh_expires = now + data.get("refresh_expires", 0)
+        if self.on_update is not None:
+            try:
+                self.on_update(self.to_dict())
+            except Exception as e:
+                # The token still works, it just has to be fetched again after a restart
+                logger.warning("Error saving tokens", extra={"error": str(e)})
+        return True
 
+    def _refresh(self, post, force_new=False):
+        kind, url, payload = self._token_request(force_new)
+        requested_at = int(time.time())
+        if not self._apply(kind, post(url, payload), requested_at):
+            kind, url, payload = self._token_request(force_new=True)
+            requested_at = int(time.time())
+            self._apply(kind, post(url, payload), requested_at)
         return self.access_token
 
-    def refresh_access_token(self) -> str:
-        """Use the refresh token to get a new access token. If refresh token is expired, get a new one."""
-        if not self.refresh_token:
-            # No refresh token, get a new one
-            return self.get_access_token()
+    async def _refresh_async(self, post, force_new=False):
+        kind, url, payload = self._token_request(force_new)
+        requested_at = int(time.time())
+        if not self._apply(kind, await post(url, payload), requested_at):
+            kind, url, payload = self._token_request(force_new=True)
+            requested_at = int(time.time())
+            self._apply(kind, await post(url, payload), requested_at)
+        return self.access_token
+
+    def get_token(self, post, ahead=0, force=False, force_new=False):
+        """
+        Get a valid access token, refreshing it first if needed.
+
+        Args:
+            post (callable): post(url, payload) making the token call
+            ahead (int): Also refresh if the token expires within this many seconds
+            force (bool): Refresh even if the token is still valid
+            force_new (bool): Get a new token instead of using the refresh token
+
+        Returns:
+            str: The access token
+        """
+        if not (force or self.needs_refresh(ahead)):
+            return self.access_token
+
+        with self._lock:
+            # Another thread may have refreshed while we were waiting
+            if not (force or self.needs_refresh(ahead)):
+                return self.access_token
+            return self._refresh(post, force_new)
+
+    async def get_token_async(self, post, force=False, force_new=False):
+        """Async version of get_token, where post is a coroutine function."""
+        if not (force or self.needs_refresh()):
+            return self.access_token
+
+        # asyncio locks belong to one event loop, e.g. per test or app run
+        loop = asyncio.get_running_loop()
+        if self._async_lock is None or self._async_lock[0] is not loop:
+            self._async_lock = (loop, asyncio.Lock())
+
+        # Coroutines queue on the asyncio lock, so only one of them polls for
+        # the thread lock while a sync client is refreshing
+        async with self._async_lock[1]:
+            if not (force or self.needs_refresh()):
+                return self.access_token
+            while not self._lock.acquire(blocking=False):
+                await asyncio.sleep(0.05)
+            try:
+                if not (force or self.needs_refresh()):
+                    return self.access_token
+                return await self._refresh_async(post, force_new)
+            finally:
+                self._lock.release()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
 
+    def start(self, post, ahead=TOKEN_REFRESH_AHEAD):
+        """
+        Refresh the access token in a daemon thread before it expires, so
+        requests never have to wait for a token call.
+
+        Args:
+            post (callable): post(url, payload) making the token call
+            ahead (int): Seconds before the request-time refresh to refresh
+        """
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(post, ahead),
+            name="token-refresh",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, post, ahead):
+        while not self._stop.is_set():
+            delay = 60
+            if self.access_token:
+                # Only keep tokens fresh once a client has used them
+                try:
+                    self.get_token(post, ahead=ahead)
+                    delay = (
+                        self.token_expires
+                        - self.refresh_buffer
+                        - ahead
+                        - int(time.time())
+                    )
+                except Exception as e:
+                    logger.warning(
+                        "Background token refresh failed", extra={"error": str(e)}
+                    )
+            self._stop.wait(max(delay, 1))
+
+
+class GoCardlessBankAuth(AuthBase):
+    """Custom auth handler for GoCardless Bank API token authentication.
+    This modifies the client request to include the Authorization header with the Bearer token.
+    It checks if the token is valid and refreshes it if necessary."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __call__(self, r):
+        # Check if token is valid, refresh if needed
+        self.client.ensure_valid_token()
+        # Add the authorization header to the request
+        r.headers["Authorization"] = f"Bearer {self.client.access_token}"
+        return r
+
+
+class GoCardlessTokenState:
+    """Token bookkeeping shared by the sync and async GoCardless clients.
+    The tokens themselves live in a GoCardlessTokenManager, which several
+    clients can share."""
+
+    @property
+    def access_token(self):
+        return self.tokens.access_token
+
+    @property
+    def refresh_token(self):
+        return self.tokens.refresh_token
+
+    @property
+    def token_expires(self):
+        return self.tokens.token_expires
+
+    @property
+    def refresh_expires(self):
+        return self.tokens.refresh_expires
+
+    def get_token_status(self):
+        """
+        Get the current status of the access and refresh tokens.
+
+        Returns:
+            dict: Token status information including expiry timestamps and remaining time
+        """
         now = int(time.time())
-        if now >= self.refresh_expires:
-            # Refresh token expired, get a new one
-            return self.get_access_token()
+        access_remaining = max(0, self.token_expires - now)
+        refresh_remaining = max(0, self.refresh_expires - now)
+
+        return {
+            "has_access_token": self.access_token is not None,
+            "has_refresh_token": self.refresh_token is not None,
+            "access_expires_at": self.token_expires,
+            "refresh_expires_at": self.refresh_expires,
+            "access_expires_in_seconds": access_remaining,
+            "refresh_expires_in_seconds": refresh_remaining,
+            "current_time": now,
+            "is_access_valid": self.access_token is not None
+            and now < self.token_expires,
+            "is_refresh_valid": self.refresh_token is not None
+            and now < self.refresh_expires,
+        }
+
+    def save_tokens_to_dict(self):
+        """
+        Save token information to a dictionary for persistence.
 
-        url = f"{BASE_URL}/token/refresh/"
+        Returns:
+            dict: Token information for storage
+        """
+        return self.tokens.to_dict()
+
+
+def make_session(max_connections=MAX_CONCURRENCY):
+    """
+    Create a session for connection pooling, which several clients can share.
+
+    Args:
+        max_connections (int): Pooled connections to keep, enough for the
+            concurrent calls of all clients using the session
+
+    Returns:
+        requests.Session: Session tracking the per-account quota
+    """
+    session = requests.Session()
+    session.headers.update({"accept": "application/json"})
+    pool = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_connections))
+    session.mount("https://", pool)
+    session.mount("http://", pool)
+    # Track the per-account quota from the rate-limit headers
+    session.hooks["response"].append(
+        lambda resp, *args, **kwargs: rate_limits.record(
+            resp.url, resp.status_code, resp.headers
+        )
+    )
+    return session
+
+
+class GoCardlessBankDataClient(GoCardlessTokenState):
+    def __init__(
+        self,
+        secret_id=SECRET_ID,
+        secret_key=SECRET_KEY,
+        token_refresh_buffer=60,
+        max_connections=MAX_CONCURRENCY,
+        cache=response_cache,
+        tokens=None,
+        retry=None,
+        breaker=circuit_breaker,
+        session=None,
+    ):
+        self.cache = cache
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker
+        # Tokens may be shared with other clients
+        self.tokens = tokens or GoCardlessTokenManager(
+            secret_id, secret_key, token_refresh_buffer
+        )
 
-        # Don't use self.session here to avoid auth loop
-        # Include proper headers for the API request
+        # Clients of different users can share one session, and so its
+        # connection pool. Auth is passed with every request instead.
+        self._owns_session = session is None
+        self.session = session or make_session(max_connections)
+        self.auth = GoCardlessBankAuth(self)
+
+    def _post_token(self, url, payload):
+        # Token calls are made without our auth handler to avoid an auth
+        # loop, over the pooled session so they warm its connection
         headers = {"Accept": "application/json", "Content-Type": "application/json"}
+        start = time.perf_counter()
+        try:
+            resp = self.session.post(
+                url, json=payload, headers=headers, timeout=ENDPOINT_TIMEOUTS["token"]
+            )
+        except requests.RequestException as e:
+            record_upstream("token", type(e).__name__, time.perf_counter() - start)
+            raise
+        record_upstream("token", resp.status_code, time.perf_counter() - start)
+        return resp
+
+    def _request(
+        self, method, endpoint, url, account_id=None, institution_id=None, **kwargs
+    ):
+        """
+        Call the API with the endpoint's timeout, retrying temporary failures.
 
-        resp = requests.post(url, json={"refresh": self.refresh_token}, headers=headers)
+        Args:
+            method (str): HTTP method
+            endpoint (str): Endpoint name, see ENDPOINT_TIMEOUTS
+            url (str): Request URL
+            account_id (str, optional): Account the call is for, used to pick
+                the institution's circuit breaker
+            institution_id (str, optional): Institution the call is for
 
-        # Print response details for debugging if there's an error
-        if resp.status_code != 200:
-            print(f"Token refresh failed: {resp.status_code} {resp.reason}")
-            print(f"Response: {resp.text}")
+        Returns:
+            dict: The decoded JSON response
 
-        if resp.status_code == 401:
-            # Refresh token expired or invalid, get a new one
-            return self.get_access_token()
+        Raises:
+            CircuitOpenError: The institution is failing, the call was not made
+        """
+        key = self.breaker.key_for(account_id, institution_id)
+        timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+        attempt = 0
+        while True:
+            self.breaker.before_call(key)
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(
+                    method, url, timeout=timeout, auth=self.auth, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_upstream(endpoint, type(e).__name__, time.perf_counter() - start)
+                self.breaker.record_failure(key)
+                delay = self.retry.next_delay(method, attempt)
+                if delay is None:
+                    raise
+            else:
+                record_upstream(endpoint, resp.status_code, time.perf_counter() - start)
+                if resp.status_code >= 500:
+                    self.breaker.record_failure(key)
+                else:
+                    self.breaker.record_success(key)
+                delay = self.retry.next_delay(
+                    method, attempt, resp.status_code, resp.headers.get("Retry-After")
+                )
+                if delay is None:
+                    resp.raise_for_status()
+                    return resp.json()
+            time.sleep(delay)
+            attempt += 1
 
-        resp.raise_for_status()
-        data = resp.json()
-        self.access_token = data["access"]
+    def ensure_valid_token(self) -> None:
+        """Ensure we have a valid access token, refreshing if necessary."""
+        self.tokens.get_token(self._post_token)
+
+    def get_access_token(self) -> str:
+        """Get a completely new access and refresh token."""
+        return self.tokens.get_token(self._post_token, force=True, force_new=True)
 
-        # Convert duration to absolute timestamp
-        self.token_expires = now + data.get("access_expires", 0)
+    def refresh_access_token(self) -> str:
+        """Use the refresh token to get a new access token. If refresh token is expired, get a new one."""
+        return self.tokens.get_token(self._post_token, force=True)
 
-        return self.access_token
+    def start_token_refresh(self):
+        """Keep the tokens fresh in the background, see GoCardlessTokenManager.start."""
+        self.tokens.start(self._post_token)
 
     def get_institutions(self, country_code):
-        url = f"{BASE_URL}/institutions/?country={country_code.lower()}"
-        resp = self.session.get(url)
-        resp.raise_for_status()
-        return resp.json()
+        country = country_code.lower()
+
+        def fetch():
+            url = f"{BASE_URL}/institutions/?country={country}"
+            return self._request("GET", "institutions", url)
+
+        return self.cache.get_or_fetch("institutions", country, fetch)
 
     def create_agreement(
         self,
@@ -148,9 +703,9 @@ class GoCardlessBankDataClient:
             "access_valid_for_days": access_valid_for_days,
             "access_scope": access_scope,
         }
-        resp = self.session.post(url, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+        return self._request(
+            "POST", "agreements", url, institution_id=institution_id, json=payload
+        )
 
     def create_requisition(
         self,
@@ -169,33 +724,38 @@ class GoCardlessBankDataClient:
         }
         if agreement_id:
             payload["agreement"] = agreement_id
-        resp = self.session.post(url, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+        return self._request(
+            "POST", "requisitions", url, institution_id=institution_id, json=payload
+        )
 
     def get_requisition(self, requisition_id):
         url = f"{BASE_URL}/requisitions/{requisition_id}/"
-        resp = self.session.get(url)
-        resp.raise_for_status()
-        return resp.json()
+        requisition = self._request("GET", "requisitions", url)
+        for account_id in requisition.get("accounts", []):
+            self.breaker.assign(account_id, requisition.get("institution_id"))
+        return requisition
 
     def get_account_details(self, account_id):
-        url = f"{BASE_URL}/accounts/{account_id}/"
-        resp = self.session.get(url)
-        resp.raise_for_status()
-        return resp.json()
+        def fetch():
+            url = f"{BASE_URL}/accounts/{account_id}/"
+            details = self._request(
+                "GET", "account_details", url, account_id=account_id
+            )
+            self.breaker.assign(account_id, details.get("institution_id"))
+            return details
+
+        return self.cache.get_or_fetch("account_details", account_id, fetch)
 
     def get_account_balances(self, account_id):
-        url = f"{BASE_URL}/accounts/{account_id}/balances/"
-        resp = self.session.get(url)
-        resp.raise_for_status()
-        return resp.json()
+        def fetch():
+            url = f"{BASE_URL}/accounts/{account_id}/balances/"
+            return self._request("GET", "account_balances", url, account_id=account_id)
+
+        return self.cache.get_or_fetch("account_balances", account_id, fetch)
 
     def get_account_transactions(self, account_id):
         url = f"{BASE_URL}/accounts/{account_id}/transactions/"
-        resp = self.session.get(url)
-        resp.raise_for_status()
-        return resp.json()
+        return self._request("GET", "account_transactions", url, account_id=account_id)
 
     def get_account_transactions_paginated(
         self, account_id, date_from=None, date_to=None, limit=100, offset=0
@@ -221,9 +781,67 @@ class GoCardlessBankDataClient:
         if date_to:
             params["date_to"] = date_to
 
-        resp = self.session.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
+        return self._request(
+            "GET", "account_transactions", url, account_id=account_id, params=params
+        )
+
+    def iter_account_transaction_pages(
+        self, account_id, date_from=None, date_to=None, batch_size=100, prefetch=True
+    ):
+        """
+        Iterate over all pages of an account's transactions as they arrive.
+
+        When a full page comes back, the request for the next page is sent
+        before the current page is yielded, so the caller's processing
+        overlaps with the next round-trip. Only two pages are held at a time.
+
+        Args:
+            account_id (str): The account ID to get transactions for
+            date_from (str, optional): Filter transactions from this date (ISO format: YYYY-MM-DD)
+            date_to (str, optional): Filter transactions to this date (ISO format: YYYY-MM-DD)
+            batch_size (int, optional): Number of transactions to fetch per request (default: 100)
+            prefetch (bool, optional): Fetch the next page in the background (default: True)
+
+        Yields:
+            dict: The "transactions" part of each page, with "booked" and "pending" lists
+        """
+
+        def request_page(offset):
+            # Returns a callable that waits for the page
+            if executor is None:
+                return lambda: self.get_account_transactions_paginated(
+                    account_id, date_from, date_to, batch_size, offset
+                )
+            # In the caller's context, so the call counts towards its request
+            return executor.submit(
+                copy_context().run,
+                self.get_account_transactions_paginated,
+                account_id,
+                date_from,
+                date_to,
+                batch_size,
+                offset,
+            ).result
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            offset = 0
+            next_page = request_page(offset)
+            while next_page is not None:
+                transactions = next_page().get("transactions", {})
+                count = len(transactions.get("booked", [])) + len(
+                    transactions.get("pending", [])
+                )
+
+                # If we got fewer transactions than the batch size, we've reached the end
+                offset += batch_size
+                next_page = request_page(offset) if count >= batch_size else None
+
+                yield transactions
+        finally:
+            if executor is not None:
+                # Don't wait for a prefetched page nobody is going to read
+                executor.shutdown(wait=False, cancel_futures=True)
 
     def get_all_account_transactions(
         self, account_id, date_from=None, date_to=None, batch_size=100
@@ -241,69 +859,14 @@ class GoCardlessBankDataClient:
             list: All transactions for the account
         """
         all_transactions = []
-        offset = 0
-
-        while True:
-            result = self.get_account_transactions_paginated(
-                account_id, date_from, date_to, batch_size, offset
-            )
-
-            # Extract transactions from the response
-            transactions = result.get("transactions", {})
-            booked = transactions.get("booked", [])
-            pending = transactions.get("pending", [])
-
-            all_transactions.extend(booked)
-            all_transactions.extend(pending)
-
-            # If we got fewer transactions than the batch size, we've reached the end
-            if len(booked) + len(pending) < batch_size:
-                break
-
-            # Update offset for the next batch
-            offset += batch_size
+        for transactions in self.iter_account_transaction_pages(
+            account_id, date_from, date_to, batch_size
+        ):
+            all_transactions.extend(transactions.get("booked", []))
+            all_transactions.extend(transactions.get("pending", []))
 
         return all_transactions
 
-    def get_token_status(self):
-        """
-        Get the current status of the access and refresh tokens.
-
-        Returns:
-            dict: Token status information including expiry timestamps and remaining time
-        """
-        now = int(time.time())
-        access_remaining = max(0, self.token_expires - now)
-        refresh_remaining = max(0, self.refresh_expires - now)
-
-        return {
-            "has_access_token": self.access_token is not None,
-            "has_refresh_token": self.refresh_token is not None,
-            "access_expires_at": self.token_expires,
-            "refresh_expires_at": self.refresh_expires,
-            "access_expires_in_seconds": access_remaining,
-            "refresh_expires_in_seconds": refresh_remaining,
-            "current_time": now,
-            "is_access_valid": self.access_token is not None
-            and now < self.token_expires,
-            "is_refresh_valid": self.refresh_token is not None
-            and now < self.refresh_expires,
-        }
-
-    def save_tokens_to_dict(self):
-        """
-        Save token information to a dictionary for persistence.
-
-        Returns:
-            dict: Token information for storage
-        """
-        return {
-            "access_token": self.access_token,
-            "refresh_token": self.refresh_token,
-            "token_expires": self.token_expires,
-            "refresh_expires": self.refresh_expires,
-        }
-
     def load_tokens_from_dict(self, token_data):
         """
         Load token information from a dictionary.
@@ -317,30 +880,22 @@ class GoCardlessBankDataClient:
         if not token_data:
             return False
 
-        self.access_token = token_data.get("access_token")
-        self.refresh_token = token_data.get("refresh_token")
-        self.token_expires = token_data.get("token_expires", 0)
-        self.refresh_expires = token_data.get("refresh_expires", 0)
+        self.tokens.load(token_data)
 
         # Validate that tokens are still valid
-        now = int(time.time())
-        if not self.access_token or now >= (
-            self.token_expires - self.token_refresh_buffer
-        ):
+        if self.tokens.needs_refresh():
             # Try to refresh the token
             try:
                 self.ensure_valid_token()
                 return True
             except Exception:
                 # Reset tokens and return False
-                self.access_token = None
-                self.refresh_token = None
-                self.token_expires = 0
-                self.refresh_expires = 0
+                self.tokens.reset()
                 return False
 
         return True
 
     def close(self):
-        """Close the session when done to free resources."""
-        self.session.close()
+        """Close the session when done to free resources, unless it is shared."""
+        if self._owns_session:
+            self.session.close()
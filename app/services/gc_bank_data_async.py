@@ -0,0 +1,385 @@
+from uuid import uuid4
+import asyncio
+import time
+import httpx
+from app.services.concurrency import MAX_CONCURRENCY
+from app.services.metrics import record_upstream
+from app.services.resilience import (
+    CONNECT_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    ENDPOINT_TIMEOUTS,
+    REQUEST_TIMEOUT,
+    CircuitOpenError,
+    RetryPolicy,
+    circuit_breaker,
+)
+from app.services.gc_bank_data import (
+    BASE_URL,
+    SECRET_ID,
+    SECRET_KEY,
+    GoCardlessTokenManager,
+    GoCardlessTokenState,
+    rate_limits,
+    response_cache,
+)
+
+
+def _timeout(timeouts):
+    connect, read = timeouts
+    return httpx.Timeout(read, connect=connect)
+
+
+class AsyncGoCardlessBankAuth(httpx.Auth):
+    """Async counterpart of GoCardlessBankAuth.
+    Awaits a token refresh if needed and adds the Bearer token to the request."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def async_auth_flow(self, request):
+        # Check if token is valid, refresh if needed
+        await self.client.ensure_valid_token()
+        # Add the authorization header to the request
+        request.headers["Authorization"] = f"Bearer {self.client.access_token}"
+        yield request
+
+
+async def _record_rate_limit(response):
+    rate_limits.record(response.url, response.status_code, response.headers)
+
+
+def make_http(max_connections=MAX_CONCURRENCY, transport=None):
+    """
+    Create pooled connections with timeouts, which several clients can share.
+
+    Returns:
+        httpx.AsyncClient: Client tracking the per-account quota
+    """
+    return httpx.AsyncClient(
+        headers={"accept": "application/json"},
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(1, max_connections),
+        ),
+        transport=transport,
+        # Track the per-account quota from the rate-limit headers
+        event_hooks={"response": [_record_rate_limit]},
+    )
+
+
+class AsyncGoCardlessBankDataClient(GoCardlessTokenState):
+    """Non-blocking GoCardless client for use from async routes.
+    Mirrors the methods of GoCardlessBankDataClient, but every call is awaited."""
+
+    def __init__(
+        self,
+        secret_id=SECRET_ID,
+        secret_key=SECRET_KEY,
+        token_refresh_buffer=60,
+        max_connections=MAX_CONCURRENCY,
+        cache=response_cache,
+        transport=None,
+        tokens=None,
+        retry=None,
+        breaker=circuit_breaker,
+        http=None,
+    ):
+        self.cache = cache
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker
+        # Tokens may be shared with other clients, including sync ones
+        self.tokens = tokens or GoCardlessTokenManager(
+            secret_id, secret_key, token_refresh_buffer
+        )
+
+        # Pooled connections, which clients of different users can share
+        self._owns_http = http is None
+        self.http = http or make_http(max_connections, transport)
+        self.auth = AsyncGoCardlessBankAuth(self)
+
+    async def _post_token(self, url, payload):
+        # Token calls are made without our auth handler to avoid an auth loop
+        start = time.perf_counter()
+        try:
+            resp = await self.http.post(
+                url, json=payload, timeout=_timeout(ENDPOINT_TIMEOUTS["token"])
+            )
+        except httpx.HTTPError as e:
+            record_upstream("token", type(e).__name__, time.perf_counter() - start)
+            raise
+        record_upstream("token", resp.status_code, time.perf_counter() - start)
+        return resp
+
+    async def ensure_valid_token(self) -> None:
+        """Ensure we have a valid access token, refreshing if necessary."""
+        await self.tokens.get_token_async(self._post_token)
+
+    async def get_access_token(self) -> str:
+        """Get a completely new access and refresh token."""
+        return await self.tokens.get_token_async(
+            self._post_token, force=True, force_new=True
+        )
+
+    async def refresh_access_token(self) -> str:
+        """Use the refresh token to get a new access token. If refresh token is expired, get a new one."""
+        return await self.tokens.get_token_async(self._post_token, force=True)
+
+    async def _request(
+        self, method, endpoint, url, account_id=None, institution_id=None, **kwargs
+    ):
+        """
+        Call the API with the endpoint's timeout, retrying temporary failures.
+
+        See GoCardlessBankDataClient._request.
+        """
+        key = self.breaker.key_for(account_id, institution_id)
+        timeout = _timeout(ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        attempt = 0
+        while True:
+            self.breaker.before_call(key)
+            start = time.perf_counter()
+            try:
+                resp = await self.http.request(
+                    method, url, timeout=timeout, auth=self.auth, **kwargs
+                )
+            except httpx.TransportError as e:
+                record_upstream(endpoint, type(e).__name__, time.perf_counter() - start)
+                self.breaker.record_failure(key)
+                delay = self.retry.next_delay(method, attempt)
+                if delay is None:
+                    raise
+            else:
+                record_upstream(endpoint, resp.status_code, time.perf_counter() - start)
+                if resp.status_code >= 500:
+                    self.breaker.record_failure(key)
+                else:
+                    self.breaker.record_success(key)
+                delay = self.retry.next_delay(
+                    method, attempt, resp.status_code, resp.headers.get("Retry-After")
+                )
+                if delay is None:
+                    resp.raise_for_status()
+                    return resp.json()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get_cached(self, endpoint, key, url, account_id=None, params=None):
+        found, value = self.cache.get(endpoint, key)
+        if found:
+            return value
+
+        try:
+            value = await self._request(
+                "GET", endpoint, url, account_id=account_id, params=params
+            )
+        except CircuitOpenError:
+            # Serve an expired response while the API is unavailable
+            found, value = self.cache.get_stale(endpoint, key)
+            if not found:
+                raise
+            return value
+        self.cache.set(endpoint, key, value)
+        return value
+
+    async def get_institutions(self, country_code):
+        country = country_code.lower()
+        return await self._get_cached(
+            "institutions",
+            country,
+            f"{BASE_URL}/institutions/",
+            params={"country": country},
+        )
+
+    async def create_agreement(
+        self,
+        institution_id,
+        max_historical_days=90,
+        access_valid_for_days=90,
+        access_scope=None,
+    ):
+        if access_scope is None:
+            access_scope = ["balances", "details", "transactions"]
+        payload = {
+            "institution_id": institution_id,
+            "max_historical_days": max_historical_days,
+            "access_valid_for_days": access_valid_for_days,
+            "access_scope": access_scope,
+        }
+        return await self._request(
+            "POST",
+            "agreements",
+            f"{BASE_URL}/agreements/enduser/",
+            institution_id=institution_id,
+            json=payload,
+        )
+
+    async def create_requisition(
+        self,
+        redirect_url,
+        institution_id,
+        reference=None,
+        agreement_id=None,
+        user_language="EN",
+    ):
+        payload = {
+            "redirect": redirect_url,
+            "institution_id": institution_id,
+            "reference": reference or str(uuid4()),
+            "user_language": user_language,
+        }
+        if agreement_id:
+            payload["agreement"] = agreement_id
+        return await self._request(
+            "POST",
+            "requisitions",
+            f"{BASE_URL}/requisitions/",
+            institution_id=institution_id,
+            json=payload,
+        )
+
+    async def get_requisition(self, requisition_id):
+        requisition = await self._request(
+            "GET", "requisitions", f"{BASE_URL}/requisitions/{requisition_id}/"
+        )
+        for account_id in requisition.get("accounts", []):
+            self.breaker.assign(account_id, requisition.get("institution_id"))
+        return requisition
+
+    async def get_account_details(self, account_id):
+        details = await self._get_cached(
+            "account_details",
+            account_id,
+            f"{BASE_URL}/accounts/{account_id}/",
+            account_id=account_id,
+        )
+        self.breaker.assign(account_id, details.get("institution_id"))
+        return details
+
+    async def get_account_balances(self, account_id):
+        return await self._get_cached(
+            "account_balances",
+            account_id,
+            f"{BASE_URL}/accounts/{account_id}/balances/",
+            account_id=account_id,
+        )
+
+    async def get_account_transactions(self, account_id):
+        return await self._request(
+            "GET",
+            "account_transactions",
+            f"{BASE_URL}/accounts/{account_id}/transactions/",
+            account_id=account_id,
+        )
+
+    async def get_account_transactions_paginated(
+        self, account_id, date_from=None, date_to=None, limit=100, offset=0
+    ):
+        """
+        Get account transactions with pagination support.
+
+        See GoCardlessBankDataClient.get_account_transactions_paginated.
+        """
+        params = {"limit": limit, "offset": offset}
+
+        if date_from:
+            params["date_from"] = date_from
+        if date_to:
+            params["date_to"] = date_to
+
+        return await self._request(
+            "GET",
+            "account_transactions",
+            f"{BASE_URL}/accounts/{account_id}/transactions/",
+            account_id=account_id,
+            params=params,
+        )
+
+    async def iter_account_transaction_pages(
+        self, account_id, date_from=None, date_to=None, batch_size=100, prefetch=True
+    ):
+        """
+        Iterate over all pages of an account's transactions as they arrive.
+
+        See GoCardlessBankDataClient.iter_account_transaction_pages. The next
+        page is prefetched in an asyncio task.
+        """
+
+        def request_page(offset):
+            page = self.get_account_transactions_paginated(
+                account_id, date_from, date_to, batch_size, offset
+            )
+            return asyncio.ensure_future(page) if prefetch else page
+
+        offset = 0
+        next_page = request_page(offset)
+        try:
+            while next_page is not None:
+                transactions = (await next_page).get("transactions", {})
+                next_page = None
+                count = len(transactions.get("booked", [])) + len(
+                    transactions.get("pending", [])
+                )
+
+                # If we got fewer transactions than the batch size, we've reached the end
+                offset += batch_size
+                if count >= batch_size:
+                    next_page = request_page(offset)
+
+                yield transactions
+        finally:
+            if isinstance(next_page, asyncio.Future):
+                # Don't wait for a prefetched page nobody is going to read
+                next_page.cancel()
+            elif next_page is not None:
+                next_page.close()
+
+    async def get_all_account_transactions(
+        self, account_id, date_from=None, date_to=None, batch_size=100
+    ):
+        """
+        Get all transactions for an account by handling pagination automatically.
+
+        See GoCardlessBankDataClient.get_all_account_transactions.
+        """
+        all_transactions = []
+        async for transactions in self.iter_account_transaction_pages(
+            account_id, date_from, date_to, batch_size
+        ):
+            all_transactions.extend(transactions.get("booked", []))
+            all_transactions.extend(transactions.get("pending", []))
+
+        return all_transactions
+
+    async def load_tokens_from_dict(self, token_data):
+        """
+        Load token information from a dictionary.
+
+        Args:
+            token_data (dict): Token information retrieved from storage
+
+        Returns:
+            bool: True if tokens were loaded successfully, False otherwise
+        """
+        if not token_data:
+            return False
+
+        self.tokens.load(token_data)
+
+        # Validate that tokens are still valid
+        if self.tokens.needs_refresh():
+            # Try to refresh the token
+            try:
+                await self.ensure_valid_token()
+                return True
+            except Exception:
+                # Reset tokens and return False
+                self.tokens.reset()
+                return False
+
+        return True
+
+    async def close(self):
+        """Close the pooled connections when done to free resources, unless shared."""
+        if self._owns_http:
+            await self.http.aclose()
@@ -0,0 +1,343 @@
+import bisect
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from app.services.concurrency import run_concurrently
+from app.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Countries offered by the bank picker
+COUNTRIES = [
+    {"code": "GB", "name": "United Kingdom", "flag": "🇬🇧"},
+    {"code": "DE", "name": "Germany", "flag": "🇩🇪"},
+    {"code": "FR", "name": "France", "flag": "🇫🇷"},
+    {"code": "ES", "name": "Spain", "flag": "🇪🇸"},
+    {"code": "IT", "name": "Italy", "flag": "🇮🇹"},
+    {"code": "NL", "name": "Netherlands", "flag": "🇳🇱"},
+    {"code": "FI", "name": "Finland", "flag": "🇫🇮"},
+    {"code": "NO", "name": "Norway", "flag": "🇳🇴"},
+    {"code": "SE", "name": "Sweden", "flag": "🇸🇪"},
+    {"code": "DK", "name": "Denmark", "flag": "🇩🇰"},
+    {"code": "BE", "name": "Belgium", "flag": "🇧🇪"},
+    {"code": "AT", "name": "Austria", "flag": "🇦🇹"},
+]
+COUNTRY_CODES = [country["code"] for country in COUNTRIES]
+
+# Seconds between refreshes of each country's institutions
+INSTITUTIONS_REFRESH_INTERVAL = int(
+    os.getenv("INSTITUTIONS_REFRESH_SECONDS", 24 * 60 * 60)
+)
+# How often the refresher checks which countries are due, and how long it
+# waits before retrying a country that failed
+INSTITUTIONS_REFRESH_TICK = int(os.getenv("INSTITUTIONS_REFRESH_TICK_SECONDS", 15 * 60))
+
+# Similarity a misspelt search word needs to a word of a bank's name or BIC,
+# between 0 and 1, see difflib.get_close_matches
+FUZZY_CUTOFF = 0.75
+
+# Schema migrations of the InstitutionCatalogue, see SQLiteStore
+MIGRATIONS = [
+    """
+    CREATE TABLE institutions (
+        country TEXT NOT NULL,
+        id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        bic TEXT NOT NULL,
+        logo TEXT NOT NULL,
+        countries TEXT NOT NULL,
+        PRIMARY KEY (country, id)
+    );
+    CREATE TABLE institution_refreshes (
+        country TEXT PRIMARY KEY,
+        refreshed_at REAL NOT NULL
+    );
+    """,
+]
+
+
+def normalize(text):
+    """Lower case text without accents or punctuation, e.g. "Société Générale" -> "societe generale"."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w]+", " ", text.casefold()).split())
+
+
+class InstitutionIndex:
+    """Prefix and fuzzy search over one country's institutions.
+
+    Every word of a bank's name and its BIC go into a sorted word list, so
+    the banks with a word starting with a search term are found with a
+    binary search. A term that starts no word is matched against the words
+    closest to it instead, to forgive typos. Results rank banks whose name
+    starts with the query first, then prefix matches, then fuzzy ones."""
+
+    def __init__(self, institutions):
+        self.institutions = sorted(institutions, key=lambda i: normalize(i["name"]))
+        self._names = [normalize(i["name"]) for i in self.institutions]
+
+        postings = {}  # word -> positions of the institutions containing it
+        for position, institution in enumerate(self.institutions):
+            words = self._names[position].split()
+            if institution.get("bic"):
+                words.append(normalize(institution["bic"]))
+            for word in words:
+                postings.setdefault(word, set()).add(position)
+        self._postings = postings
+        self._words = sorted(postings)
+
+    def _prefixed(self, term):
+        """Positions of institutions with a word starting with term."""
+        found = set()
+        start = bisect.bisect_left(self._words, term)
+        for word in self._words[start:]:
+            if not word.startswith(term):
+                break
+            found |= self._postings[word]
+        return found
+
+    def _similar(self, term):
+        """Positions of institutions with a word close to term."""
+        found = set()
+        for word in difflib.get_close_matches(
+            term, self._words, n=5, cutoff=FUZZY_CUTOFF
+        ):
+            found |= self._postings[word]
+        return found
+
+    def search(self, query, offset=0, limit=20):
+        """
+        Find institutions whose name or BIC matches query.
+
+        Args:
+            query (str): Search text, every word of which has to match
+            offset (int): Number of results to skip
+            limit (int): Maximum number of results to return
+
+        Returns:
+            tuple: (total number of results, list of institutions)
+        """
+        query = normalize(query)
+        if not query:
+            return len(self.institutions), self.institutions[offset : offset + limit]
+
+        matched = None
+        fuzzy = set()
+        for term in query.split():
+            positions = self._prefixed(term)
+            if not positions:
+                positions = self._similar(term)
+                fuzzy |= positions
+            matched = positions if matched is None else matched & positions
+            if not matched:
+                return 0, []
+
+        def rank(position):
+            if self._names[position].startswith(query):
+                return 0
+            return 2 if position in fuzzy else 1
+
+        # Positions follow name order, so ties stay alphabetical
+        results = sorted(matched, key=lambda position: (rank(position), position))
+        return len(results), [
+            self.institutions[position] for position in results[offset : offset + limit]
+        ]
+
+
+class InstitutionCatalogue(SQLiteStore):
+    """The institutions of every supported country, kept in SQLite.
+
+    The bank picker is served from here instead of calling GoCardless each
+    time it opens. A daemon thread refreshes each country once per interval,
+    and the store is shared by all worker processes, so a country refreshed
+    by one worker is not fetched again by the others. Each worker keeps a
+    search index per country, rebuilt when the stored country changes,
+    which is checked at most once per check_interval seconds."""
+
+    MIGRATIONS = MIGRATIONS
+
+    def __init__(
+        self,
+        path,
+        countries=COUNTRY_CODES,
+        interval=INSTITUTIONS_REFRESH_INTERVAL,
+        tick=INSTITUTIONS_REFRESH_TICK,
+        check_interval=1.0,
+    ):
+        self.countries = countries
+        self.interval = interval
+        self.tick = tick
+        self.check_interval = check_interval
+
+        self._indexes = {}  # country -> (refreshed_at, InstitutionIndex)
+        self._checked_at = {}  # country -> when its refresh time was last read
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        super().__init__(path)
+
+    def refreshed_at(self, country):
+        """Time a country's institutions were last stored, or None if never."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT refreshed_at FROM institution_refreshes WHERE country = ?",
+                (country.upper(),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, country, institutions):
+        """
+        Replace a country's institutions.
+
+        Args:
+            country (str): Country code
+            institutions (list): Institutions as returned by GoCardless
+        """
+        country = country.upper()
+        rows = [
+            (
+                country,
+                institution["id"],
+                institution.get("name", ""),
+                institution.get("bic", ""),
+                institution.get("logo", ""),
+                json.dumps(institution.get("countries", [])),
+            )
+            for institution in institutions
+        ]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM institutions WHERE country = ?", (country,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO institutions"
+                " (country, id, name, bic, logo, countries) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO institution_refreshes (country, refreshed_at)"
+                " VALUES (?, ?)",
+                (country, time.time()),
+            )
+        with self._lock:
+            self._checked_at.pop(country, None)
+
+    def _load(self, country):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, name, bic, logo, countries FROM institutions"
+                " WHERE country = ?",
+                (country,),
+            ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "name": row[1],
+                "bic": row[2],
+                "logo": row[3],
+                "countries": json.loads(row[4]),
+            }
+            for row in rows
+        ]
+
+    def index(self, country):
+        """
+        Get the search index of a country's stored institutions.
+
+        Returns:
+            InstitutionIndex: The index, or None if the country was never stored
+        """
+        country = country.upper()
+        now = time.monotonic()
+        with self._lock:
+            cached = self._indexes.get(country)
+            checked_at = self._checked_at.get(country)
+            if cached and checked_at and now - checked_at < self.check_interval:
+                return cached[1]
+
+        refreshed_at = self.refreshed_at(country)
+        if refreshed_at is None:
+            return None
+        if cached is None or cached[0] != refreshed_at:
+            cached = (refreshed_at, InstitutionIndex(self._load(country)))
+        with self._lock:
+            self._indexes[country] = cached
+            self._checked_at[country] = now
+        return cached[1]
+
+    def search(self, country, query="", offset=0, limit=20):
+        """
+        Search a country's stored institutions, see InstitutionIndex.search.
+
+        Returns:
+            tuple: (total number of results, list of institutions), or None
+                if the country was never stored
+        """
+        index = self.index(country)
+        if index is None:
+            return None
+        return index.search(query, offset, limit)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, client):
+        """Start refreshing with a GoCardlessBankDataClient in a daemon thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(client,), name="institutions-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread, waiting for a refresh in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, client):
+        while not self._stop.is_set():
+            try:
+                self.refresh(client)
+            except Exception:
+                # Keep refreshing, the next tick will try again
+                logger.exception("Institution refresh failed")
+            self._stop.wait(self.tick)
+
+    def refresh(self, client, now=None):
+        """
+        Fetch the institutions of every country not refreshed for an interval.
+
+        Returns:
+            list: Codes of the countries that were refreshed
+        """
+        now = now or time.time()
+        due = [
+            country
+            for country in self.countries
+            if (self.refreshed_at(country) or 0) + self.interval <= now
+        ]
+
+        def fetch(country):
+            # Past the response cache, which may hold the list we replace
+            client.cache.invalidate("institutions", country.lower())
+            self.save(country, client.get_institutions(country))
+
+        refreshed = []
+        for country, _, error in run_concurrently(fetch, due):
+            if error is not None:
+                logger.warning(
+                    "Error refreshing institutions",
+                    extra={"country": country, "error": str(error)},
+                )
+            else:
+                refreshed.append(country)
+        return refreshed
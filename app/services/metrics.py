@@ -0,0 +1,274 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import re
+import threading
+import time
+from uuid import uuid4
+
+# Request IDs taken from an X-Request-ID header have to look like this
+REQUEST_ID = re.compile(r"[\w.-]{1,64}")
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic counter with labels, in the Prometheus sense."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", values, count) for values, count in self._values.items()]
+
+
+class Histogram:
+    """Distribution of observed values, e.g. durations, in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(series) for labels, series in self._values.items()}
+
+        samples = []
+        for label_values, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                samples.append(("_bucket", (*label_values, repr(bound)), cumulative))
+            samples.append(("_bucket", (*label_values, "+Inf"), series[-2]))
+            samples.append(("_count", label_values, series[-2]))
+            samples.append(("_sum", label_values, series[-1]))
+        return samples
+
+
+class Registry:
+    """Metrics exposed together at /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: One HELP and TYPE line per metric followed by its samples
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, label_values, value in metric.samples():
+                names = metric.labels + (("le",) if suffix == "_bucket" else ())
+                labels = ",".join(
+                    f'{name}="{_escape(value)}"'
+                    for name, value in zip(names, label_values)
+                )
+                labels = f"{{{labels}}}" if labels else ""
+                lines.append(f"{metric.name}{suffix}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "Requests handled", ("method", "route", "status")
+)
+http_duration = registry.histogram(
+    "http_request_duration_seconds", "Time to handle a request", ("method", "route")
+)
+upstream_requests = registry.counter(
+    "gocardless_requests_total",
+    "Calls to the GoCardless API, including retries",
+    ("endpoint", "status"),
+)
+upstream_duration = registry.histogram(
+    "gocardless_request_duration_seconds",
+    "Time waiting for the GoCardless API per call",
+    ("endpoint",),
+)
+span_duration = registry.histogram(
+    "span_duration_seconds",
+    "Time spent in a stage of request handling or syncing",
+    ("span",),
+)
+
+
+class RequestTimings:
+    """Time spent per span during one request, reported in Server-Timing."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self._spans = {}  # name -> [count, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self._spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def server_timing(self, total):
+        """
+        Format the spans as a Server-Timing header value, durations in milliseconds.
+
+        Spans can overlap, e.g. concurrent upstream calls, so they may add
+        up to more than the total.
+        """
+        with self._lock:
+            spans = sorted(self._spans.items())
+        entries = [
+            f'{name};dur={seconds * 1000:.1f};desc="{count}x"'
+            for name, (count, seconds) in spans
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+# Timings of the request being handled, if any. Worker threads started by
+# run_concurrently and tasks started by gather_concurrently inherit it.
+_timings: ContextVar = ContextVar("request_timings", default=None)
+
+
+def current_request_id():
+    """ID of the request being handled, or None outside of a request."""
+    timings = _timings.get()
+    return timings.request_id if timings else None
+
+
+def record_span(name, seconds):
+    """Record time spent in a span, for the metrics and the current request."""
+    span_duration.observe(seconds, name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    """Time a block of code as a span, see record_span."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def record_upstream(endpoint, status, seconds):
+    """
+    Record a call to the GoCardless API.
+
+    Args:
+        endpoint (str): Endpoint name, as in ENDPOINT_TIMEOUTS
+        status (int or str): Response status, or the error for failed calls
+        seconds (float): Time until the response or error
+    """
+    upstream_requests.inc(endpoint, str(status))
+    upstream_duration.observe(seconds, endpoint)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add("upstream", seconds)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request.
+
+    Each request gets a RequestTimings that spans recorded while handling
+    it add to. They are sent back in a Server-Timing header, and the
+    request's duration is recorded per route for /metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _header(scope, b"x-request-id")
+        if request_id is None or not REQUEST_ID.fullmatch(request_id):
+            request_id = uuid4().hex
+        timings = RequestTimings(request_id)
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (
+                        b"server-timing",
+                        timings.server_timing(time.perf_counter() - start).encode(),
+                    )
+                )
+                headers.append((b"x-request-id", request_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            # Label with the route template, not the path, to keep the
+            # number of series bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_requests.inc(scope["method"], path, str(status))
+            http_duration.observe(time.perf_counter() - start, scope["method"], path)
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
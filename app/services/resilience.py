@@ -0,0 +1,208 @@
+from email.utils import parsedate_to_datetime
+import os
+import random
+import threading
+import time
+
+# Seconds to wait for a GoCardless response before giving up
+REQUEST_TIMEOUT = float(os.getenv("BANK_REQUEST_TIMEOUT", 30))
+CONNECT_TIMEOUT = float(os.getenv("BANK_CONNECT_TIMEOUT", 10))
+
+# (connect, read) timeouts per endpoint. Transaction pages can take a while
+# for banks with long histories, everything else should answer quickly.
+ENDPOINT_TIMEOUTS = {
+    "token": (CONNECT_TIMEOUT, 15.0),
+    "institutions": (CONNECT_TIMEOUT, REQUEST_TIMEOUT),
+    "agreements": (CONNECT_TIMEOUT, 15.0),
+    "requisitions": (CONNECT_TIMEOUT, 15.0),
+    "account_details": (CONNECT_TIMEOUT, 15.0),
+    "account_balances": (CONNECT_TIMEOUT, 15.0),
+    "account_transactions": (
+        CONNECT_TIMEOUT,
+        float(os.getenv("BANK_TRANSACTIONS_TIMEOUT", 60)),
+    ),
+}
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, REQUEST_TIMEOUT)
+
+# Responses worth another try: rate limited or a temporary server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an institution that keeps failing."""
+
+    def __init__(self, key, retry_after):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(
+            f"Bank API unavailable for {key}, retry in {int(retry_after) + 1} seconds"
+        )
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Decides whether and when to retry a failed request.
+
+    Delays grow exponentially with full jitter, so concurrent requests that
+    failed together don't retry together. A Retry-After header is honoured,
+    but when it asks for longer than max_retry_after (e.g. a daily quota
+    that ran out) the request fails straight away instead of blocking a
+    worker. Only GET requests are retried after a timeout or server error,
+    since a POST may have been processed before it failed."""
+
+    def __init__(
+        self,
+        max_retries=int(os.getenv("BANK_MAX_RETRIES", 3)),
+        base_delay=float(os.getenv("BANK_RETRY_BASE_DELAY", 0.5)),
+        max_delay=float(os.getenv("BANK_RETRY_MAX_DELAY", 10)),
+        max_retry_after=float(os.getenv("BANK_MAX_RETRY_AFTER", 30)),
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def next_delay(self, method, attempt, status_code=None, retry_after=None):
+        """
+        Get the delay before retrying a request.
+
+        Args:
+            method (str): HTTP method of the request
+            attempt (int): Number of retries made so far
+            status_code (int, optional): Response status, None after a timeout
+                or connection error
+            retry_after (str, optional): Retry-After header of the response
+
+        Returns:
+            float: Seconds to wait before retrying, or None to give up
+        """
+        if attempt >= self.max_retries:
+            return None
+        if status_code is not None and status_code not in RETRY_STATUSES:
+            return None
+        if method != "GET" and status_code != 429:
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        wait = parse_retry_after(retry_after)
+        if wait is not None:
+            if wait > self.max_retry_after:
+                return None
+            delay = max(delay, wait)
+        return delay
+
+
+class CircuitBreaker:
+    """Stops calling an institution after repeated failures.
+
+    Calls are grouped per institution, since one bank being down shouldn't
+    block the others. After failure_threshold consecutive failures
+    (timeouts, connection errors and 5xx responses) the circuit opens and
+    calls fail at once with CircuitOpenError. After reset_timeout seconds a
+    single trial call is let through: it closes the circuit if it succeeds
+    and opens it again if it fails."""
+
+    def __init__(
+        self,
+        failure_threshold=int(os.getenv("BANK_CIRCUIT_FAILURES", 5)),
+        reset_timeout=float(os.getenv("BANK_CIRCUIT_RESET_TIMEOUT", 60)),
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._circuits = {}  # key -> {"failures", "opened_at", "trial_at"}
+        self._institutions = {}  # account_id -> institution_id
+        self._lock = threading.Lock()
+
+    def assign(self, account_id, institution_id):
+        """Remember which institution an account belongs to."""
+        if account_id and institution_id:
+            with self._lock:
+                self._institutions[account_id] = institution_id
+
+    def key_for(self, account_id=None, institution_id=None):
+        """Circuit key for a call: the institution if known, else the API as a whole."""
+        if institution_id:
+            return institution_id
+        with self._lock:
+            return self._institutions.get(account_id, "gocardless")
+
+    def before_call(self, key):
+        """Raise CircuitOpenError if calls for key are currently blocked."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit["opened_at"] is None:
+                return
+
+            now = time.monotonic()
+            wait = circuit["opened_at"] + self.reset_timeout - now
+            # A trial that never reported back (e.g. cancelled) is given up
+            # after another reset_timeout
+            trial_running = (
+                circuit["trial_at"] is not None
+                and now - circuit["trial_at"] < self.reset_timeout
+            )
+            if wait > 0 or trial_running:
+                raise CircuitOpenError(key, max(wait, 0))
+            # Half-open: let this call through as the trial
+            circuit["trial_at"] = now
+
+    def record_success(self, key):
+        with self._lock:
+            self._circuits.pop(key, None)
+
+    def record_failure(self, key):
+        with self._lock:
+            circuit = self._circuits.setdefault(
+                key, {"failures": 0, "opened_at": None, "trial_at": None}
+            )
+            circuit["failures"] += 1
+            if (
+                circuit["trial_at"] is not None
+                or circuit["failures"] >= self.failure_threshold
+            ):
+                circuit["opened_at"] = time.monotonic()
+                circuit["trial_at"] = None
+
+    def status(self):
+        """
+        Get the circuits that have recent failures.
+
+        Returns:
+            dict: key -> dict with failures, open and retry_in_seconds
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key: {
+                    "failures": circuit["failures"],
+                    "open": circuit["opened_at"] is not None,
+                    "retry_in_seconds": (
+                        max(0, circuit["opened_at"] + self.reset_timeout - now)
+                        if circuit["opened_at"] is not None
+                        else 0
+                    ),
+                }
+                for key, circuit in self._circuits.items()
+            }
+
+
+# Shared by the sync and async clients, so both see an institution as down
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+import time
+from app.services.concurrency import run_concurrently
+from app.services.gc_bank_data import rate_limits
+
+logger = logging.getLogger(__name__)
+
+# Target time between refreshes of each account, in seconds. GoCardless
+# allows as few as 4 calls per account endpoint per day.
+SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL_SECONDS", 6 * 60 * 60))
+# How often the scheduler checks which accounts are due
+SYNC_TICK = int(os.getenv("SYNC_TICK_SECONDS", 60))
+# Wait this long before retrying a failed refresh
+SYNC_RETRY_DELAY = int(os.getenv("SYNC_RETRY_DELAY_SECONDS", 15 * 60))
+# Calls per account endpoint left for manual syncs
+SYNC_QUOTA_RESERVE = int(os.getenv("SYNC_QUOTA_RESERVE", 1))
+
+# What gets refreshed for each account, named after the GoCardless endpoint
+# whose quota it spends
+SYNC_ENDPOINTS = ("transactions", "balances")
+
+
+class SyncScheduler:
+    """Refreshes every selected account in a background thread.
+
+    Transactions go into the transaction store and details and balances
+    into account snapshots, so requests are served from the last successful
+    refresh. Refreshes are spread out so each account endpoint stays within
+    the quota reported by GoCardless' rate-limit headers."""
+
+    def __init__(
+        self,
+        client,
+        store,
+        get_account_ids,
+        interval=SYNC_INTERVAL,
+        tick=SYNC_TICK,
+        retry_delay=SYNC_RETRY_DELAY,
+        quota_reserve=SYNC_QUOTA_RESERVE,
+        tracker=rate_limits,
+    ):
+        self.client = client
+        self.store = store
+        self.get_account_ids = get_account_ids
+        self.interval = interval
+        self.tick = tick
+        self.retry_delay = retry_delay
+        self.quota_reserve = quota_reserve
+        self.tracker = tracker
+
+        self._failures = {}  # (account_id, endpoint) -> time of last failed attempt
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start refreshing in a daemon thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sync-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread, waiting for a refresh in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Keep the scheduler alive, the next tick will try again
+                logger.exception("Background sync failed")
+            self._stop.wait(self.tick)
+
+    def run_once(self, now=None):
+        """
+        Refresh whatever is due for all selected accounts.
+
+        Returns:
+            list: (account_id, endpoint) pairs that were refreshed
+        """
+        now = now or time.time()
+        due = [
+            (account_id, endpoint)
+            for account_id in self.get_account_ids()
+            for endpoint in SYNC_ENDPOINTS
+            if self.next_run_at(account_id, endpoint, now) <= now
+        ]
+
+        refreshed = []
+        for job, _, error in run_concurrently(self._refresh, due):
+            if error is not None:
+                self._failures[job] = time.time()
+                logger.warning(
+                    "Error refreshing account",
+                    extra={
+                        "account_id": job[0],
+                        "endpoint": job[1],
+                        "error": str(error),
+                    },
+                )
+            else:
+                self._failures.pop(job, None)
+                refreshed.append(job)
+        return refreshed
+
+    def _refresh(self, job):
+        account_id, endpoint = job
+        if endpoint == "transactions":
+            self.store.sync_account(self.client, account_id)
+        else:
+            balances = self.client.get_account_balances(account_id)
+            details = self._account_details(account_id)
+            self.store.save_account_snapshot(account_id, details, balances)
+
+    def _account_details(self, account_id):
+        """
+        Get an account's details for its snapshot without overspending.
+
+        GoCardless limits details separately from balances, and they hardly
+        change. They come through the response cache, so at most one call is
+        made per cache TTL, and from the last snapshot while the details
+        quota has nothing to spare.
+        """
+        quota = self.tracker.get(account_id, "details")
+        if quota and quota.get("remaining") is not None:
+            if quota["remaining"] - self.quota_reserve <= 0:
+                snapshot = self.store.get_account_snapshots([account_id]).get(
+                    account_id
+                )
+                if snapshot is not None:
+                    return snapshot["details"]
+        return self.client.get_account_details(account_id)
+
+    def last_success(self, account_id, endpoint):
+        """Time of the last successful refresh, or None if there was none."""
+        if endpoint == "transactions":
+            state = self.store.get_sync_state(account_id)
+            return state["last_synced_at"] if state else None
+
+        snapshot = self.store.get_account_snapshots([account_id]).get(account_id)
+        return snapshot["synced_at"] if snapshot else None
+
+    def next_run_at(self, account_id, endpoint, now=None):
+        """
+        Work out when an account endpoint should next be refreshed.
+
+        Normally that is one interval after the last success. When the
+        remaining quota would run out before it resets at that pace, the
+        remaining calls are spread evenly over the time left instead.
+
+        Returns:
+            float: Timestamp of the next refresh
+        """
+        now = now or time.time()
+
+        last_success = self.last_success(account_id, endpoint)
+        if last_success is None:
+            next_run = now
+        else:
+            interval = self.interval
+            quota = self.tracker.get(account_id, endpoint)
+            if quota and quota.get("remaining") is not None:
+                usable = quota["remaining"] - self.quota_reserve
+                reset_in = max(0, quota.get("reset_at", now) - now)
+                if usable <= 0:
+                    # Nothing left to spend until the quota resets
+                    return now + reset_in
+                interval = max(interval, reset_in / usable)
+            next_run = last_success + interval
+
+        failed_at = self._failures.get((account_id, endpoint))
+        if failed_at is not None:
+            next_run = max(next_run, failed_at + self.retry_delay)
+        return next_run
+
+    def status(self, account_id):
+        """
+        Describe the refresh state of an account for the API.
+
+        Returns:
+            dict: Per endpoint, the last success, its age, the next refresh
+                and the last known remaining quota
+        """
+        now = time.time()
+        status = {}
+        for endpoint in SYNC_ENDPOINTS:
+            last_success = self.last_success(account_id, endpoint)
+            quota = self.tracker.get(account_id, endpoint) or {}
+            status[endpoint] = {
+                "synced_at": last_success,
+                "age_seconds": now - last_success if last_success else None,
+                "next_sync_at": (
+                    self.next_run_at(account_id, endpoint, now)
+                    if self.running
+                    else None
+                ),
+                "quota_remaining": quota.get("remaining"),
+                "quota_reset_at": quota.get("reset_at"),
+            }
+        return status
@@ -0,0 +1,30 @@
+import os
+from fastapi.responses import ORJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Large responses skip FastAPI's response_model validation and are encoded
+# with orjson, when it is installed. Set FAST_JSON=0 to turn this off.
+FAST_JSON = orjson is not None and os.getenv("FAST_JSON", "1") != "0"
+
+
+def fast_json_response(content, headers=None):
+    """
+    Encode data that is already valid for the route's response model.
+
+    FastAPI would validate every item against the response model again and
+    run it through jsonable_encoder before encoding, which for long lists
+    costs more than building them. orjson encodes dicts, dates and floats
+    directly.
+
+    Args:
+        content: Lists and dicts of JSON types, dates and datetimes
+        headers (dict, optional): Extra response headers
+
+    Returns:
+        ORJSONResponse: The encoded response
+    """
+    return ORJSONResponse(content, headers=headers)
@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+import time
+from app.services.sqlite_store import SQLiteStore
+
+# Seconds a setup session lives after it was last written. Linking a bank
+# means logging in to it, which can take a while.
+SETUP_SESSION_TTL = int(os.getenv("SETUP_SESSION_TTL_SECONDS", 60 * 60))
+
+# Schema migrations of the SessionStore, see SQLiteStore
+MIGRATIONS = [
+    """
+    CREATE TABLE sessions (
+        id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX idx_sessions_expires_at ON sessions (expires_at);
+    """,
+]
+
+
+def load_secret(path):
+    """
+    Get the key cookies are signed with.
+
+    SESSION_SECRET is used if set. Otherwise a random key is kept in a file,
+    which the first worker to start creates and every other worker reads,
+    so all of them accept each other's cookies.
+
+    Returns:
+        bytes: The key
+    """
+    secret = os.getenv("SESSION_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".session_secret.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        # Linking fails if another worker got there first, then use theirs
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def sign(value, secret):
+    """Append an HMAC to a value, e.g. a session ID sent in a cookie."""
+    mac = hmac.new(secret, value.encode("utf-8"), hashlib.sha256).digest()
+    return f"{value}.{base64.urlsafe_b64encode(mac).rstrip(b'=').decode('ascii')}"
+
+
+def unsign(signed, secret):
+    """
+    Check a value signed with sign.
+
+    Returns:
+        str: The value, or None if the signature doesn't match
+    """
+    value, _, _ = signed.rpartition(".")
+    if not value or not hmac.compare_digest(sign(value, secret), signed):
+        return None
+    return value
+
+
+class SessionStore(SQLiteStore):
+    """Short-lived state of a multi-step flow, such as linking a bank.
+
+    Sessions are kept in SQLite, so they survive restarts and every worker
+    process sees the same ones. Each session expires ttl seconds after it
+    was last saved, and expired sessions are removed as new ones are
+    created. Session IDs are handed out signed with secret, so a cookie
+    can't be made up or altered."""
+
+    MIGRATIONS = MIGRATIONS
+
+    def __init__(self, path, secret, ttl=SETUP_SESSION_TTL):
+        self.secret = secret
+        self.ttl = ttl
+
+        super().__init__(path)
+
+    def cookie_value(self, session_id):
+        """Sign a session ID for sending in a cookie."""
+        return sign(session_id, self.secret)
+
+    def session_id(self, cookie_value):
+        """Get the session ID from a cookie, or None if its signature is wrong."""
+        return unsign(cookie_value, self.secret)
+
+    def create(self, data):
+        """
+        Start a session.
+
+        Args:
+            data (dict): JSON-serialisable session data
+
+        Returns:
+            str: The new session's ID
+        """
+        session_id = secrets.token_urlsafe(24)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), now + self.ttl),
+            )
+        return session_id
+
+    def get(self, session_id):
+        """Get a session's data, or None if there is no such session or it expired."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, data):
+        """
+        Replace a session's data and extend its lifetime.
+
+        Returns:
+            bool: False if there is no such session or it expired
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE sessions SET data = ?, expires_at = ?"
+                " WHERE id = ? AND expires_at > ?",
+                (json.dumps(data), now + self.ttl, session_id, now),
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, session_id):
+        """End a session."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
@@ -0,0 +1,62 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+def _statements(script):
+    """Split a migration script into statements, keeping trigger bodies whole."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+
+
+class SQLiteStore:
+    """Base class of the stores kept in a SQLite database file.
+
+    The database is created on first use and migrated to the subclass's
+    MIGRATIONS, a list of SQL scripts applied in order. The number of
+    applied migrations is tracked with SQLite's PRAGMA user_version, so new
+    scripts go at the end. Several worker processes can open the same
+    database at once."""
+
+    MIGRATIONS = []
+
+    def __init__(self, path):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._migrate()
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection that commits on success and rolls back on error."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _migrate(self):
+        with self._connect() as conn:
+            # WAL lets readers keep serving requests while another connection
+            # is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Hold the write lock from reading the version until the last
+            # migration is committed, so when several workers open the store
+            # at once only one of them migrates. executescript would commit
+            # straight away, so statements are run one by one.
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            migrations = self.MIGRATIONS[version:]
+            for number, script in enumerate(migrations, start=version + 1):
+                for statement in _statements(script):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+import time
+from app.services.metrics import current_request_id
+
+# Log level and format ("json" for one JSON object per line, or "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Attributes every LogRecord has, anything else was passed in extra
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records with the fields passed in extra and the current request ID.
+
+    Messages stay constant (e.g. "Error syncing transactions") and the
+    details go in extra, so logs can be filtered and aggregated by field."""
+
+    def __init__(self, as_json=True):
+        super().__init__()
+        self.as_json = as_json
+
+    def fields(self, record):
+        fields = {
+            key: value
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        }
+        request_id = current_request_id()
+        if request_id is not None:
+            fields["request_id"] = request_id
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        return fields
+
+    def format(self, record):
+        fields = self.fields(record)
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+        timestamp += f".{int(record.msecs):03d}Z"
+
+        if self.as_json:
+            return json.dumps(
+                {
+                    "time": timestamp,
+                    "level": record.levelname,
+                    "logger": record.name,
+                    "message": record.getMessage(),
+                    **fields,
+                },
+                default=str,
+            )
+
+        exception = fields.pop("exception", None)
+        line = " ".join(
+            [
+                timestamp,
+                record.levelname,
+                record.name,
+                record.getMessage(),
+                *(f"{key}={value}" for key, value in fields.items()),
+            ]
+        )
+        return f"{line}\n{exception}" if exception else line
+
+
+def configure_logging(level=LOG_LEVEL, format=LOG_FORMAT):
+    """Send the app's logs to stderr as structured lines."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(as_json=format == "json"))
+
+    logger = logging.getLogger("app")
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    # Don't log everything twice when the server also configures the root logger
+    logger.propagate = False
@@ -0,0 +1,1585 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from app.models.transaction import TransactionRecord
+from app.services.budgets import (
+    BudgetIndex,
+    budget_state,
+    crossing,
+    period_bounds,
+    spent_per_budget,
+)
+from app.services.categorizer import Categorizer
+from app.services.metrics import span
+from app.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Aggregates transactions into monthly rollups. Amounts are summed as integer
+# cents so totals don't drift, and uncategorised transactions use ''.
+ROLLUP_SELECT = """
+    SELECT
+        account_id,
+        substr(booking_date, 1, 7) AS month,
+        COALESCE(category, '') AS category,
+        currency,
+        SUM(CASE WHEN amount > 0 THEN CAST(ROUND(amount * 100) AS INTEGER) ELSE 0 END),
+        SUM(CASE WHEN amount < 0 THEN CAST(ROUND(amount * 100) AS INTEGER) ELSE 0 END),
+        COUNT(*)
+    FROM transactions
+"""
+ROLLUP_GROUP_BY = " GROUP BY account_id, month, category, currency"
+
+# Schema migrations of the TransactionStore, see SQLiteStore. New entries go
+# at the end.
+MIGRATIONS = [
+    """
+    CREATE TABLE transactions (
+        id TEXT NOT NULL,
+        account_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        currency TEXT NOT NULL,
+        description TEXT NOT NULL,
+        booking_date TEXT NOT NULL,
+        value_date TEXT,
+        category TEXT,
+        raw TEXT NOT NULL,
+        PRIMARY KEY (account_id, id)
+    );
+    CREATE INDEX idx_transactions_account_date
+        ON transactions (account_id, booking_date);
+    CREATE TABLE sync_state (
+        account_id TEXT PRIMARY KEY,
+        last_booking_date TEXT,
+        last_synced_at REAL NOT NULL
+    );
+    """,
+    # Revision counter, bumped whenever transactions change, so derived
+    # data (like the analytics frame) knows when to reload
+    """
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT INTO meta (key, value) VALUES ('revision', 0);
+    """,
+    # Per-account, per-category, per-month totals, kept up to date on every
+    # sync and backfilled here from the transactions stored so far
+    f"""
+    CREATE TABLE monthly_rollups (
+        account_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        income_cents INTEGER NOT NULL,
+        expenses_cents INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (account_id, month, category, currency)
+    );
+    CREATE INDEX idx_monthly_rollups_month ON monthly_rollups (month, category);
+    INSERT INTO monthly_rollups {ROLLUP_SELECT} {ROLLUP_GROUP_BY};
+    """,
+    # User-defined categorisation rules. Each transaction remembers the rule
+    # that categorised it, so a rule change only revisits the transactions
+    # that rule can affect. Text fields used by the rules get their own
+    # columns, filled from the raw payload for existing transactions.
+    """
+    CREATE TABLE category_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        pattern TEXT,
+        min_amount REAL,
+        max_amount REAL,
+        priority INTEGER NOT NULL DEFAULT 100
+    );
+    ALTER TABLE transactions ADD COLUMN additional_information TEXT NOT NULL DEFAULT '';
+    ALTER TABLE transactions ADD COLUMN counterparty TEXT NOT NULL DEFAULT '';
+    ALTER TABLE transactions ADD COLUMN category_rule_id INTEGER;
+    UPDATE transactions SET
+        additional_information = COALESCE(json_extract(raw, '$.additionalInformation'), ''),
+        counterparty = COALESCE(
+            json_extract(raw, '$.creditorName'), json_extract(raw, '$.debtorName'), ''
+        );
+    CREATE INDEX idx_transactions_category_rule ON transactions (category_rule_id);
+    INSERT INTO meta (key, value) VALUES ('rules_revision', 0);
+    """,
+    # Last successfully fetched account details and balances, so account
+    # pages are served without spending the per-account API quota
+    """
+    CREATE TABLE account_snapshots (
+        account_id TEXT PRIMARY KEY,
+        details TEXT NOT NULL,
+        balances TEXT NOT NULL,
+        synced_at REAL NOT NULL
+    );
+    """,
+    # Booked or pending status, and indexes for paging through transactions
+    # in list order (newest first) and for the list filters
+    """
+    ALTER TABLE transactions ADD COLUMN status TEXT NOT NULL DEFAULT 'booked';
+    CREATE INDEX idx_transactions_order
+        ON transactions (booking_date, id, account_id);
+    CREATE INDEX idx_transactions_category
+        ON transactions (category, booking_date, id, account_id);
+    CREATE INDEX idx_transactions_amount ON transactions (amount);
+    """,
+    # Custom labels, and a full-text index over descriptions, additional
+    # information and labels. The index reads its text from the
+    # transactions table and triggers keep it in step with every change.
+    # It refers to transactions by their implicit rowid, so it has to be
+    # rebuilt after a VACUUM.
+    """
+    ALTER TABLE transactions ADD COLUMN labels TEXT NOT NULL DEFAULT '[]';
+    CREATE VIRTUAL TABLE transactions_fts USING fts5(
+        description,
+        additional_information,
+        labels,
+        content='transactions',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+    CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, description, additional_information, labels)
+        VALUES (new.rowid, new.description, new.additional_information, new.labels);
+    END;
+    CREATE TRIGGER transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (
+            transactions_fts, rowid, description, additional_information, labels
+        ) VALUES (
+            'delete', old.rowid, old.description, old.additional_information, old.labels
+        );
+    END;
+    CREATE TRIGGER transactions_fts_update
+    AFTER UPDATE OF description, additional_information, labels ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (
+            transactions_fts, rowid, description, additional_information, labels
+        ) VALUES (
+            'delete', old.rowid, old.description, old.additional_information, old.labels
+        );
+        INSERT INTO transactions_fts (rowid, description, additional_information, labels)
+        VALUES (new.rowid, new.description, new.additional_information, new.labels);
+    END;
+    INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild');
+    """,
+    # Content hash of each transaction, used to find the pending entry a
+    # newly booked transaction replaces. Only pending rows are looked up by
+    # it, and everything stored before this migration is booked, so
+    # existing rows get their hash the next time they change.
+    """
+    ALTER TABLE transactions ADD COLUMN content_hash TEXT NOT NULL DEFAULT '';
+    CREATE INDEX idx_transactions_content_hash
+        ON transactions (account_id, content_hash);
+    """,
+    # Spending limits, with running totals per period that syncs update as
+    # transactions arrive, and the limit crossings those updates caused
+    """
+    CREATE TABLE budgets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT,
+        period TEXT NOT NULL,
+        limit_cents INTEGER NOT NULL,
+        currency TEXT NOT NULL,
+        account_id TEXT,
+        warn_at REAL NOT NULL DEFAULT 0.8
+    );
+    CREATE TABLE budget_totals (
+        period_start TEXT NOT NULL,
+        budget_id INTEGER NOT NULL,
+        spent_cents INTEGER NOT NULL,
+        PRIMARY KEY (period_start, budget_id)
+    );
+    CREATE TABLE budget_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        budget_id INTEGER NOT NULL,
+        period_start TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        spent_cents INTEGER NOT NULL,
+        limit_cents INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    );
+    INSERT INTO meta (key, value) VALUES ('budgets_revision', 0);
+    """,
+]
+
+# A pending transaction is only replaced by a booked one with the same
+# content hash that was booked at most this many days after (or before) it
+PENDING_MATCH_DAYS = int(os.getenv("PENDING_MATCH_DAYS", 7))
+
+# Columns returned when listing transactions, in order
+LIST_COLUMNS = (
+    "id",
+    "account_id",
+    "amount",
+    "currency",
+    "description",
+    "booking_date",
+    "value_date",
+    "category",
+    "status",
+    "labels",
+)
+
+# Relative weight of the description, additional information and labels
+# when ranking search results
+SEARCH_WEIGHTS = (1.0, 0.5, 2.0)
+
+# Columns of a categorisation rule besides its id, with their defaults
+RULE_FIELDS = {
+    "category": None,
+    "kind": None,
+    "pattern": None,
+    "min_amount": None,
+    "max_amount": None,
+    "priority": 100,
+}
+
+# Columns of a budget besides its id, with their defaults
+BUDGET_FIELDS = {
+    "name": None,
+    "category": None,
+    "period": "month",
+    "limit_cents": None,
+    "currency": None,
+    "account_id": None,
+    "warn_at": 0.8,
+}
+
+# Expenses in cents per category, account and currency between two dates,
+# see spent_per_budget
+BUDGET_SPENT_SELECT = """
+    SELECT
+        category,
+        account_id,
+        currency,
+        SUM(-CAST(ROUND(amount * 100) AS INTEGER))
+    FROM transactions
+    WHERE status = 'booked' AND amount < 0 AND booking_date BETWEEN ? AND ?
+    GROUP BY category, account_id, currency
+"""
+
+
+def _row_dict(row):
+    # Transaction row as a dict, with its labels decoded
+    row = dict(row)
+    if "labels" in row:
+        row["labels"] = json.loads(row["labels"])
+    return row
+
+
+def _fts_query(text):
+    """Turn user input into an FTS5 query matching every word as a prefix."""
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words if word.strip('"'))
+
+
+def transaction_id(tx):
+    """
+    Get a stable identifier for a GoCardless transaction.
+
+    Not every bank fills in internalTransactionId, so fall back to
+    transactionId and finally to a hash of the fields that describe the
+    transaction.
+    """
+    tx_id = tx.get("internalTransactionId") or tx.get("transactionId")
+    if tx_id:
+        return tx_id
+
+    amount = tx.get("transactionAmount", {})
+    key = "|".join(
+        [
+            tx.get("bookingDate", ""),
+            tx.get("valueDate", ""),
+            amount.get("amount", ""),
+            amount.get("currency", ""),
+            tx.get("remittanceInformationUnstructured", ""),
+            tx.get("additionalInformation", ""),
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def content_hash(row):
+    """
+    Hash what a transaction is about, leaving out its dates and ids.
+
+    Banks often give a pending transaction a different id and date than the
+    booked transaction that later replaces it, but the amount and the
+    counterparty (or the description, when there is no counterparty) stay
+    the same.
+
+    Args:
+        row (dict): Transaction as returned by parse_transaction
+
+    Returns:
+        str: Hex digest, the same for a pending transaction and its booking
+    """
+    party = row["counterparty"] or row["description"]
+    key = "|".join(
+        [
+            str(round(row["amount"] * 100)),
+            row["currency"],
+            " ".join(party.lower().split()),
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _spending(row, sign):
+    """
+    A transaction's expenses as a change in spending, see BudgetIndex.changes.
+
+    Args:
+        row (dict): Transaction with category, booking_date, currency and amount
+        sign (int): 1 when the transaction is added, -1 when it is taken away
+
+    Returns:
+        tuple: (category, booking_date, currency, change in cents)
+    """
+    cents = -round(row["amount"] * 100) if row["amount"] < 0 else 0
+    return row["category"], row["booking_date"], row["currency"], sign * cents
+
+
+def parse_transaction(account_id, tx, status="booked"):
+    """
+    Convert a raw GoCardless transaction into a row for the transactions table.
+
+    Args:
+        account_id (str): The account the transaction belongs to
+        tx (dict): Transaction as returned by the GoCardless API
+        status (str, optional): "booked" or "pending"
+
+    Returns:
+        dict: Column values for the transactions table
+    """
+    # Get transaction description
+    description = tx.get("remittanceInformationUnstructured", "")
+    if not description:
+        description = tx.get("additionalInformation", "")
+
+    booking_date = tx.get("bookingDate") or tx.get("valueDate")
+    if not booking_date:
+        raise ValueError("Transaction has no booking date")
+
+    # Validate the dates up front so bad data never reaches the store
+    datetime.strptime(booking_date, "%Y-%m-%d")
+    value_date = tx.get("valueDate") or None
+    if value_date:
+        datetime.strptime(value_date, "%Y-%m-%d")
+
+    row = {
+        "id": transaction_id(tx),
+        "account_id": account_id,
+        "amount": float(tx.get("transactionAmount", {}).get("amount", "0")),
+        "currency": tx.get("transactionAmount", {}).get("currency", ""),
+        "description": description or "",
+        "additional_information": tx.get("additionalInformation") or "",
+        "counterparty": tx.get("creditorName") or tx.get("debtorName") or "",
+        "booking_date": booking_date,
+        "value_date": value_date,
+        "category": None,
+        "category_rule_id": None,
+        "status": status,
+        "raw": json.dumps(tx, separators=(",", ":")),
+    }
+    row["content_hash"] = content_hash(row)
+    return row
+
+
+class TransactionStore(SQLiteStore):
+    """Local SQLite store of bank transactions, filled by incremental syncs.
+
+    Requests are served from the store, so the GoCardless API is only called
+    when an account is synced."""
+
+    MIGRATIONS = MIGRATIONS
+
+    def __init__(self, path, batch_size=100):
+        self.batch_size = batch_size
+        # (rules revision, Categorizer) compiled from the stored rules
+        self._categorizer = None
+        # (budgets revision, BudgetIndex) of the stored budgets
+        self._budget_index = None
+        # account ID -> lock held while the account syncs
+        self._sync_locks = {}
+        self._sync_locks_lock = threading.Lock()
+
+        super().__init__(path)
+
+    def get_sync_state(self, account_id):
+        """
+        Get the sync bookkeeping for an account.
+
+        Returns:
+            dict: last_booking_date and last_synced_at, or None if never synced
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT last_booking_date, last_synced_at FROM sync_state"
+                " WHERE account_id = ?",
+                (account_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def needs_sync(self, account_id, max_age=None):
+        """Check if an account was never synced or its last sync is older than max_age seconds."""
+        state = self.get_sync_state(account_id)
+        if state is None:
+            return True
+        if max_age is None:
+            return False
+        return time.time() - state["last_synced_at"] >= max_age
+
+    def _sync_lock(self, account_id):
+        with self._sync_locks_lock:
+            return self._sync_locks.setdefault(account_id, threading.Lock())
+
+    def sync_if_needed(self, client, account_id, max_age=None):
+        """
+        Sync an account if it needs it, see needs_sync.
+
+        Requests that find the same account stale at once share one sync:
+        the first one syncs, and the others wait for it and then find the
+        account fresh, instead of each spending the bank's rate limit.
+
+        Returns:
+            int: Number of transactions received from the bank, or None if
+                the account didn't need a sync
+        """
+        with self._sync_lock(account_id):
+            if not self.needs_sync(account_id, max_age):
+                return None
+            return self._sync_account(client, account_id)
+
+    def sync_account(self, client, account_id):
+        """
+        Fetch transactions booked since the last sync and add them to the store.
+
+        The last synced booking date is requested again, because a bank can
+        book more transactions on that day after we last looked, and so is
+        everything since the oldest stored pending transaction, to learn what
+        became of it. Transactions we already have unchanged are skipped, a
+        newly booked transaction takes over the pending entry it replaces,
+        and pending entries the bank no longer lists are removed, so syncing
+        again is idempotent. Each page is written in a short transaction of
+        its own as it arrives, so the write lock is never held while waiting
+        for the bank and syncs of other accounts are not held up. The sync
+        state only advances once every page is written, so a sync that fails
+        part way starts from the same date next time, skipping the pages it
+        already wrote as unchanged.
+
+        Args:
+            client (GoCardlessBankDataClient): Client used to call the bank API
+            account_id (str): The account ID to sync
+
+        Returns:
+            int: Number of transactions received from the bank
+        """
+        # One sync of an account at a time
+        with self._sync_lock(account_id):
+            return self._sync_account(client, account_id)
+
+    def _sync_account(self, client, account_id):
+        state = self.get_sync_state(account_id)
+        date_from = state["last_booking_date"] if state else None
+
+        oldest_pending = self._oldest_pending_date(account_id)
+        if date_from and oldest_pending and oldest_pending < date_from:
+            date_from = oldest_pending
+
+        received = 0
+        seen_pending = set()
+        pages = client.iter_account_transaction_pages(
+            account_id, date_from=date_from, batch_size=self.batch_size
+        )
+        try:
+            while True:
+                # Time spent waiting for the bank, parsing and writing is
+                # recorded separately
+                with span("page_wait"):
+                    transactions = next(pages, None)
+                if transactions is None:
+                    break
+                with span("parse"):
+                    rows = self._parse_page(account_id, transactions)
+                seen_pending.update(
+                    row["id"] for row in rows if row["status"] == "pending"
+                )
+                with span("ingest"), self._connect() as conn:
+                    self._write_page(conn, account_id, rows, seen_pending)
+                received += len(rows)
+        finally:
+            pages.close()
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            dropped = self._drop_pending(conn, account_id, date_from, seen_pending)
+            self._update_sync_state(conn, account_id, changed=dropped > 0)
+
+        return received
+
+    def _write_page(self, conn, account_id, rows, keep_pending):
+        """Write one page of a sync along with the rollups and budgets it changes."""
+        # Take the write lock up front. Reading first and writing later would
+        # fail instead of waiting if another sync committed in between.
+        conn.execute("BEGIN IMMEDIATE")
+        written, months, deltas = self._ingest(conn, account_id, rows, keep_pending)
+        self._refresh_rollups(conn, account_id, months)
+        with span("budgets"):
+            self._refresh_budgets(conn, account_id, deltas)
+        if written:
+            # Derived data learns of the page now, in case a later page fails
+            self._bump_revision(conn)
+
+    def _oldest_pending_date(self, account_id):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT MIN(booking_date) FROM transactions"
+                " WHERE account_id = ? AND status = 'pending'",
+                (account_id,),
+            ).fetchone()[0]
+
+    def _parse_page(self, account_id, transactions):
+        rows = []
+        for status in ("booked", "pending"):
+            for tx in transactions.get(status, []):
+                try:
+                    rows.append(parse_transaction(account_id, tx, status))
+                except Exception as e:
+                    # Log the error but continue with other transactions
+                    logger.warning(
+                        "Error processing transaction",
+                        extra={"account_id": account_id, "error": str(e)},
+                    )
+        return rows
+
+    def _ingest(self, conn, account_id, rows, keep_pending=()):
+        """
+        Write parsed transactions, skipping the ones stored unchanged.
+
+        Args:
+            conn (sqlite3.Connection): Connection of the running sync
+            account_id (str): The account the rows belong to
+            rows (list): Rows from parse_transaction, booked and pending
+            keep_pending (set, optional): IDs of pending transactions the bank
+                still lists, which a booked transaction must not take over
+
+        Returns:
+            tuple: (number of rows written, months whose rollups they affect,
+                changes in spending for _refresh_budgets)
+        """
+        # One row per id, in a single pass. The bank can list a transaction
+        # twice when pages shift under us, and booked beats pending.
+        unique = {}
+        for row in rows:
+            if row["status"] == "booked" or row["id"] not in unique:
+                unique[row["id"]] = row
+        if not unique:
+            return 0, set(), []
+
+        placeholders = ", ".join("?" for _ in unique)
+        stored = {
+            row["id"]: row
+            for row in conn.execute(
+                "SELECT id, raw, status, amount, currency, category, booking_date"
+                f" FROM transactions WHERE account_id = ? AND id IN ({placeholders})",
+                [account_id, *unique],
+            )
+        }
+
+        changed = []
+        for row in unique.values():
+            old = stored.get(row["id"])
+            if old is None:
+                changed.append(row)
+            elif old["status"] == "booked" and row["status"] == "pending":
+                # Never turn a booked transaction back into a pending one
+                continue
+            elif (old["raw"], old["status"]) != (row["raw"], row["status"]):
+                changed.append(row)
+
+        new_booked = [
+            row
+            for row in changed
+            if row["status"] == "booked" and row["id"] not in stored
+        ]
+        self._claim_pending(conn, account_id, new_booked, keep_pending)
+        self._categorize(conn, changed)
+
+        # Only booked transactions count towards budgets, like the rollups
+        deltas = []
+        for row in changed:
+            old = stored.get(row["id"])
+            if old is not None and old["status"] == "booked":
+                deltas.append(_spending(old, -1))
+            if row["status"] == "booked":
+                deltas.append(_spending(row, 1))
+        return len(changed), self._upsert(conn, account_id, changed), deltas
+
+    def _claim_pending(self, conn, account_id, rows, keep_pending):
+        """
+        Give newly booked transactions the stored pending entry they replace.
+
+        The pending entry with the same content hash and the nearest date is
+        renamed to the booked transaction's id, so the upsert that follows
+        updates it in place and it keeps its labels.
+        """
+        if not rows:
+            return
+
+        hashes = {row["content_hash"] for row in rows}
+        placeholders = ", ".join("?" for _ in hashes)
+        candidates = {}
+        for pending in conn.execute(
+            "SELECT id, content_hash, booking_date FROM transactions"
+            " WHERE account_id = ? AND status = 'pending'"
+            f" AND content_hash IN ({placeholders})",
+            [account_id, *hashes],
+        ):
+            if pending["id"] not in keep_pending:
+                candidates.setdefault(pending["content_hash"], []).append(
+                    (pending["id"], date.fromisoformat(pending["booking_date"]))
+                )
+
+        renames = []
+        for row in rows:
+            options = candidates.get(row["content_hash"])
+            if not options:
+                continue
+            booked = date.fromisoformat(row["booking_date"])
+            nearest = min(options, key=lambda option: abs((option[1] - booked).days))
+            if abs((nearest[1] - booked).days) > PENDING_MATCH_DAYS:
+                continue
+            options.remove(nearest)
+            renames.append((row["id"], account_id, nearest[0]))
+
+        # Even an empty executemany opens the write transaction, and reading
+        # before writing in it would fail if another sync committed meanwhile
+        if renames:
+            conn.executemany(
+                "UPDATE transactions SET id = ? WHERE account_id = ? AND id = ?",
+                renames,
+            )
+
+    def _drop_pending(self, conn, account_id, date_from, seen_pending):
+        """
+        Remove pending transactions in the synced range the bank no longer lists.
+
+        They were either cancelled or booked with different details.
+
+        Returns:
+            int: Number of removed transactions
+        """
+        query = (
+            "SELECT id FROM transactions WHERE account_id = ? AND status = 'pending'"
+        )
+        params = [account_id]
+        if date_from:
+            query += " AND booking_date >= ?"
+            params.append(date_from)
+
+        gone = [
+            (account_id, row["id"])
+            for row in conn.execute(query, params)
+            if row["id"] not in seen_pending
+        ]
+        if gone:
+            conn.executemany(
+                "DELETE FROM transactions WHERE account_id = ? AND id = ?", gone
+            )
+        return len(gone)
+
+    def _categorize(self, conn, rows):
+        categorizer = self._get_categorizer(conn)
+        for row, (category, rule_id) in zip(rows, categorizer.categorize_many(rows)):
+            row["category"] = category
+            row["category_rule_id"] = rule_id
+
+    def add_transactions(self, account_id, rows):
+        """Insert or update parsed transactions and advance the account's sync state."""
+        with self._connect() as conn:
+            keep_pending = {row["id"] for row in rows if row["status"] == "pending"}
+            written, months, deltas = self._ingest(conn, account_id, rows, keep_pending)
+            self._refresh_rollups(conn, account_id, months)
+            self._refresh_budgets(conn, account_id, deltas)
+            self._update_sync_state(conn, account_id, changed=written > 0)
+
+    def _upsert(self, conn, account_id, rows):
+        """Write rows and return the months (YYYY-MM) whose rollups they affect."""
+        if not rows:
+            return set()
+
+        # An update may move a transaction to another month, so include the
+        # months the rows were in before as well as the months they're in now
+        months = {row["booking_date"][:7] for row in rows}
+        ids = [row["id"] for row in rows]
+        placeholders = ", ".join("?" for _ in ids)
+        months.update(
+            month
+            for (month,) in conn.execute(
+                "SELECT DISTINCT substr(booking_date, 1, 7) FROM transactions"
+                f" WHERE account_id = ? AND id IN ({placeholders})",
+                [account_id, *ids],
+            )
+        )
+
+        conn.executemany(
+            """
+            INSERT INTO transactions (
+                id, account_id, amount, currency, description,
+                additional_information, counterparty, booking_date,
+                value_date, category, category_rule_id, status, content_hash, raw
+            ) VALUES (
+                :id, :account_id, :amount, :currency, :description,
+                :additional_information, :counterparty, :booking_date,
+                :value_date, :category, :category_rule_id, :status, :content_hash,
+                :raw
+            )
+            ON CONFLICT (account_id, id) DO UPDATE SET
+                amount = excluded.amount,
+                currency = excluded.currency,
+                description = excluded.description,
+                additional_information = excluded.additional_information,
+                counterparty = excluded.counterparty,
+                booking_date = excluded.booking_date,
+                value_date = excluded.value_date,
+                category = excluded.category,
+                category_rule_id = excluded.category_rule_id,
+                status = excluded.status,
+                content_hash = excluded.content_hash,
+                raw = excluded.raw
+            """,
+            rows,
+        )
+        return months
+
+    def _refresh_rollups(self, conn, account_id, months):
+        """Recompute the monthly rollups of an account for the given months only."""
+        # Pending transactions can still change or disappear, so only booked
+        # ones count towards the totals
+        for month in months:
+            conn.execute(
+                "DELETE FROM monthly_rollups WHERE account_id = ? AND month = ?",
+                (account_id, month),
+            )
+            conn.execute(
+                f"INSERT INTO monthly_rollups {ROLLUP_SELECT}"
+                " WHERE account_id = ? AND status = 'booked'"
+                " AND booking_date BETWEEN ? AND ?"
+                f" {ROLLUP_GROUP_BY}",
+                (account_id, f"{month}-01", f"{month}-31"),
+            )
+
+    def monthly_rollups(self, account_ids, month_from=None, month_to=None):
+        """
+        Get the precomputed monthly totals per account and category.
+
+        Args:
+            account_ids (list): Account IDs to include
+            month_from (str, optional): First month to include (YYYY-MM)
+            month_to (str, optional): Last month to include (YYYY-MM)
+
+        Returns:
+            list: Rollups as dicts, oldest month first. Amounts are in major
+                units and category is None for uncategorised transactions.
+        """
+        if not account_ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in account_ids)
+        query = (
+            "SELECT account_id, month, category, currency, income_cents,"
+            " expenses_cents, count FROM monthly_rollups"
+            f" WHERE account_id IN ({placeholders})"
+        )
+        params = list(account_ids)
+        if month_from:
+            query += " AND month >= ?"
+            params.append(month_from)
+        if month_to:
+            query += " AND month <= ?"
+            params.append(month_to)
+        query += " ORDER BY month, account_id, category, currency"
+
+        with self._connect() as conn:
+            return [
+                {
+                    "account_id": row["account_id"],
+                    "month": row["month"],
+                    "category": row["category"] or None,
+                    "currency": row["currency"],
+                    "income": row["income_cents"] / 100,
+                    "expenses": row["expenses_cents"] / 100,
+                    "net": (row["income_cents"] + row["expenses_cents"]) / 100,
+                    "count": row["count"],
+                }
+                for row in conn.execute(query, params)
+            ]
+
+    def _get_categorizer(self, conn):
+        """Get the compiled rules, recompiling only after the rules have changed."""
+        revision = conn.execute(
+            "SELECT value FROM meta WHERE key = 'rules_revision'"
+        ).fetchone()[0]
+        cached = self._categorizer
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+
+        categorizer = Categorizer(self._load_rules(conn))
+        self._categorizer = (revision, categorizer)
+        return categorizer
+
+    def _load_rules(self, conn):
+        return [dict(row) for row in conn.execute("SELECT * FROM category_rules")]
+
+    def list_rules(self):
+        """Get all categorisation rules, in the order they are applied."""
+        with self._connect() as conn:
+            return [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT * FROM category_rules ORDER BY priority, id"
+                )
+            ]
+
+    def add_rule(self, rule):
+        """
+        Add a categorisation rule and apply it to the stored transactions.
+
+        Only transactions that are uncategorised or were categorised by a
+        rule with lower precedence are looked at again.
+
+        Args:
+            rule (dict): Values for RULE_FIELDS
+
+        Returns:
+            tuple: (stored rule as dict, number of recategorised transactions)
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO category_rules ({', '.join(RULE_FIELDS)})"
+                f" VALUES ({', '.join('?' for _ in RULE_FIELDS)})",
+                self._rule_values(rule),
+            )
+            stored = self._get_rule(conn, cursor.lastrowid)
+            changed = self._recategorize(conn, *self._claimable_by(stored))
+        return stored, changed
+
+    def update_rule(self, rule_id, rule):
+        """
+        Change a categorisation rule and reapply it.
+
+        Transactions the old rule categorised are revisited, as well as the
+        ones the changed rule could now claim.
+
+        Returns:
+            tuple: (stored rule as dict, number of recategorised transactions),
+                or (None, 0) if there is no such rule
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE category_rules SET {', '.join(f'{f} = ?' for f in RULE_FIELDS)}"
+                " WHERE id = ?",
+                [*self._rule_values(rule), rule_id],
+            )
+            if cursor.rowcount == 0:
+                return None, 0
+
+            stored = self._get_rule(conn, rule_id)
+            where, params = self._claimable_by(stored)
+            changed = self._recategorize(
+                conn, f"category_rule_id = ? OR {where}", [rule_id, *params]
+            )
+        return stored, changed
+
+    def delete_rule(self, rule_id):
+        """
+        Delete a categorisation rule and recategorise the transactions it matched.
+
+        Returns:
+            int: Number of recategorised transactions, or None if there is no such rule
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM category_rules WHERE id = ?", (rule_id,))
+            if cursor.rowcount == 0:
+                return None
+            return self._recategorize(conn, "category_rule_id = ?", [rule_id])
+
+    def _rule_values(self, rule):
+        return [rule.get(field, default) for field, default in RULE_FIELDS.items()]
+
+    def _get_rule(self, conn, rule_id):
+        row = conn.execute(
+            "SELECT * FROM category_rules WHERE id = ?", (rule_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _claimable_by(self, rule):
+        """SQL condition for transactions that rule could take over."""
+        return (
+            "category_rule_id IS NULL OR category_rule_id IN ("
+            " SELECT id FROM category_rules"
+            " WHERE priority > ? OR (priority = ? AND id > ?))",
+            [rule["priority"], rule["priority"], rule["id"]],
+        )
+
+    def _recategorize(self, conn, where, params):
+        """Run the current rules over the transactions matching where and store changes."""
+        # The rules changed, so make every worker recompile them. The cached
+        # categorizer is only replaced once this change has been committed.
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'rules_revision'")
+        self._categorizer = None
+        categorizer = Categorizer(self._load_rules(conn))
+
+        rows = [
+            dict(row)
+            for row in conn.execute(
+                "SELECT id, account_id, booking_date, amount, currency, description,"
+                " additional_information, counterparty, category, category_rule_id,"
+                f" status FROM transactions WHERE {where}",
+                params,
+            )
+        ]
+
+        updates = []
+        months = {}
+        deltas = {}  # account ID -> changes in spending per category
+        for row, (category, rule_id) in zip(rows, categorizer.categorize_many(rows)):
+            if (category, rule_id) == (row["category"], row["category_rule_id"]):
+                continue
+            updates.append((category, rule_id, row["account_id"], row["id"]))
+            months.setdefault(row["account_id"], set()).add(row["booking_date"][:7])
+            if row["status"] == "booked":
+                account_deltas = deltas.setdefault(row["account_id"], [])
+                account_deltas.append(_spending(row, -1))
+                account_deltas.append(_spending({**row, "category": category}, 1))
+
+        conn.executemany(
+            "UPDATE transactions SET category = ?, category_rule_id = ?"
+            " WHERE account_id = ? AND id = ?",
+            updates,
+        )
+        for account_id, account_months in months.items():
+            self._refresh_rollups(conn, account_id, account_months)
+        for account_id, account_deltas in deltas.items():
+            self._refresh_budgets(conn, account_id, account_deltas)
+        if updates:
+            self._bump_revision(conn)
+
+        return len(updates)
+
+    def _get_budget_index(self, conn):
+        """Get the indexed budgets, reloading only after the budgets have changed."""
+        revision = conn.execute(
+            "SELECT value FROM meta WHERE key = 'budgets_revision'"
+        ).fetchone()[0]
+        cached = self._budget_index
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+
+        index = BudgetIndex(self._load_budgets(conn))
+        self._budget_index = (revision, index)
+        return index
+
+    def _load_budgets(self, conn):
+        return [dict(row) for row in conn.execute("SELECT * FROM budgets ORDER BY id")]
+
+    def _refresh_budgets(self, conn, account_id, deltas):
+        """
+        Apply changes in spending to the running budget totals.
+
+        Stored totals are moved by the change instead of being added up
+        again, and every threshold a total crosses on the way up is recorded
+        in budget_events. A period without a stored total is added up from
+        its transactions once, and reports no crossing since there is
+        nothing to compare to.
+
+        Args:
+            conn (sqlite3.Connection): Connection the changes were written on
+            account_id (str): Account whose transactions changed
+            deltas (list): Changes in spending, see _spending
+        """
+        index = self._get_budget_index(conn)
+        if not index.budgets or not deltas:
+            return
+        changes = index.changes(account_id, deltas)
+        if not changes:
+            return
+
+        starts = {start for _, start, _ in changes}
+        placeholders = ", ".join("?" for _ in starts)
+        stored = {
+            (row["budget_id"], row["period_start"]): row["spent_cents"]
+            for row in conn.execute(
+                "SELECT budget_id, period_start, spent_cents FROM budget_totals"
+                f" WHERE period_start IN ({placeholders})",
+                list(starts),
+            )
+        }
+
+        totals = []
+        events = []
+        missing = {}  # (first day, last day) -> budgets without a stored total
+        now = time.time()
+        for (budget_id, start, end), cents in changes.items():
+            budget = index.budgets[budget_id]
+            before = stored.get((budget_id, start))
+            if before is None:
+                missing.setdefault((start, end), []).append(budget)
+                continue
+            after = before + cents
+            totals.append((start, budget_id, after))
+            kind = crossing(budget, before, after)
+            if kind is not None:
+                events.append(
+                    (budget_id, start, kind, after, budget["limit_cents"], now)
+                )
+                logger.info(
+                    "Budget threshold crossed",
+                    extra={
+                        "budget_id": budget_id,
+                        "period_start": start,
+                        "kind": kind,
+                        "spent_cents": after,
+                        "limit_cents": budget["limit_cents"],
+                    },
+                )
+
+        for (start, end), budgets in missing.items():
+            spent = self._spent(conn, budgets, start, end)
+            totals.extend(
+                (start, budget_id, cents) for budget_id, cents in spent.items()
+            )
+
+        conn.executemany(
+            """
+            INSERT INTO budget_totals (period_start, budget_id, spent_cents)
+            VALUES (?, ?, ?)
+            ON CONFLICT (period_start, budget_id) DO UPDATE SET
+                spent_cents = excluded.spent_cents
+            """,
+            totals,
+        )
+        if events:
+            conn.executemany(
+                "INSERT INTO budget_events (budget_id, period_start, kind,"
+                " spent_cents, limit_cents, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                events,
+            )
+
+    def _spent(self, conn, budgets, start, end):
+        """Add up the spending of budgets from their transactions, budget ID -> cents."""
+        groups = conn.execute(BUDGET_SPENT_SELECT, (start, end)).fetchall()
+        return spent_per_budget(budgets, groups)
+
+    def _current_spending(self, conn, budgets, today):
+        """
+        Get the spending of budgets in the periods containing today.
+
+        Returns:
+            dict: budget ID -> (first day, last day, spent in cents)
+        """
+        periods = {}  # (first day, last day) -> budgets
+        for budget in budgets:
+            start, end = period_bounds(budget["period"], today)
+            periods.setdefault((start.isoformat(), end.isoformat()), []).append(budget)
+
+        spending = {}
+        for (start, end), period_budgets in periods.items():
+            stored = dict(
+                conn.execute(
+                    "SELECT budget_id, spent_cents FROM budget_totals"
+                    " WHERE period_start = ?",
+                    (start,),
+                ).fetchall()
+            )
+            missing = [
+                budget for budget in period_budgets if budget["id"] not in stored
+            ]
+            spent = self._spent(conn, missing, start, end) if missing else {}
+            for budget in period_budgets:
+                cents = stored.get(budget["id"], spent.get(budget["id"]))
+                spending[budget["id"]] = (start, end, cents)
+        return spending
+
+    def _budget_status(self, budget, start, end, spent_cents):
+        return {
+            **budget,
+            "limit": budget["limit_cents"] / 100,
+            "period_start": start,
+            "period_end": end,
+            "spent": spent_cents / 100,
+            "remaining": (budget["limit_cents"] - spent_cents) / 100,
+            "state": budget_state(budget, spent_cents),
+        }
+
+    def list_budgets(self, today=None):
+        """
+        Get all budgets with their spending in the current period.
+
+        Args:
+            today (date, optional): Day whose periods to report, today by default
+
+        Returns:
+            list: Budgets as dicts, with limit, spent and remaining in major
+                units, the period's first and last day and its state
+        """
+        today = today or date.today()
+        with self._connect() as conn:
+            budgets = self._load_budgets(conn)
+            spending = self._current_spending(conn, budgets, today)
+        return [
+            self._budget_status(budget, *spending[budget["id"]]) for budget in budgets
+        ]
+
+    def get_budget(self, budget_id, today=None):
+        """Get a budget with its spending in the current period, or None."""
+        today = today or date.today()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM budgets WHERE id = ?", (budget_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            budget = dict(row)
+            spending = self._current_spending(conn, [budget], today)
+        return self._budget_status(budget, *spending[budget_id])
+
+    def add_budget(self, budget):
+        """
+        Add a budget and start its running total for the current period.
+
+        Spending already over a threshold when the budget is added doesn't
+        count as crossing it.
+
+        Args:
+            budget (dict): Values for BUDGET_FIELDS
+
+        Returns:
+            dict: The stored budget with its spending, see list_budgets
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO budgets ({', '.join(BUDGET_FIELDS)})"
+                f" VALUES ({', '.join('?' for _ in BUDGET_FIELDS)})",
+                self._budget_values(budget),
+            )
+            self._start_budget(conn, cursor.lastrowid)
+        return self.get_budget(cursor.lastrowid)
+
+    def update_budget(self, budget_id, budget):
+        """
+        Change a budget, starting its running totals over.
+
+        Returns:
+            dict: The stored budget with its spending, or None if there is no
+                such budget
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE budgets SET {', '.join(f'{f} = ?' for f in BUDGET_FIELDS)}"
+                " WHERE id = ?",
+                [*self._budget_values(budget), budget_id],
+            )
+            if cursor.rowcount == 0:
+                return None
+            conn.execute("DELETE FROM budget_totals WHERE budget_id = ?", (budget_id,))
+            self._start_budget(conn, budget_id)
+        return self.get_budget(budget_id)
+
+    def delete_budget(self, budget_id):
+        """
+        Delete a budget with its totals and events.
+
+        Returns:
+            bool: Whether there was such a budget
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM budgets WHERE id = ?", (budget_id,))
+            if cursor.rowcount == 0:
+                return False
+            conn.execute("DELETE FROM budget_totals WHERE budget_id = ?", (budget_id,))
+            conn.execute("DELETE FROM budget_events WHERE budget_id = ?", (budget_id,))
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'budgets_revision'"
+            )
+        return True
+
+    def _budget_values(self, budget):
+        return [budget.get(field, default) for field, default in BUDGET_FIELDS.items()]
+
+    def _start_budget(self, conn, budget_id):
+        """Store the current period's total of a new or changed budget."""
+        # Make every worker reload the budgets
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'budgets_revision'")
+        budget = dict(
+            conn.execute("SELECT * FROM budgets WHERE id = ?", (budget_id,)).fetchone()
+        )
+        start, end = period_bounds(budget["period"], date.today())
+        spent = self._spent(conn, [budget], start.isoformat(), end.isoformat())
+        conn.execute(
+            "INSERT INTO budget_totals (period_start, budget_id, spent_cents)"
+            " VALUES (?, ?, ?)",
+            (start.isoformat(), budget_id, spent[budget_id]),
+        )
+
+    def budget_events(self, after_id=0, limit=100):
+        """
+        Get the recorded threshold crossings, oldest first.
+
+        Args:
+            after_id (int, optional): Only return events after this one, so
+                a client can poll for new events
+            limit (int, optional): Maximum number of events to return
+
+        Returns:
+            list: Events as dicts with the budget's name, and spent and limit
+                in major units
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT budget_events.*, budgets.name FROM budget_events"
+                " JOIN budgets ON budgets.id = budget_events.budget_id"
+                " WHERE budget_events.id > ? ORDER BY budget_events.id LIMIT ?",
+                (after_id, limit),
+            ).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "budget_id": row["budget_id"],
+                "name": row["name"],
+                "period_start": row["period_start"],
+                "kind": row["kind"],
+                "spent": row["spent_cents"] / 100,
+                "limit": row["limit_cents"] / 100,
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+
+    def _bump_revision(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def get_revision(self):
+        """Get a counter that changes whenever stored transactions change."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT value FROM meta WHERE key = 'revision'"
+            ).fetchone()[0]
+
+    def _update_sync_state(self, conn, account_id, changed=True):
+        # Derived data learns of changes through the revision
+        if changed:
+            self._bump_revision(conn)
+        last_booking_date = conn.execute(
+            "SELECT MAX(booking_date) FROM transactions"
+            " WHERE account_id = ? AND status = 'booked'",
+            (account_id,),
+        ).fetchone()[0]
+        conn.execute(
+            """
+            INSERT INTO sync_state (account_id, last_booking_date, last_synced_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT (account_id) DO UPDATE SET
+                last_booking_date = excluded.last_booking_date,
+                last_synced_at = excluded.last_synced_at
+            """,
+            (account_id, last_booking_date, time.time()),
+        )
+
+    def _select_transactions(
+        self,
+        account_ids,
+        date_from=None,
+        date_to=None,
+        min_amount=None,
+        max_amount=None,
+        text=None,
+        category=None,
+        status=None,
+        after=None,
+        limit=None,
+    ):
+        """
+        Build the query listing transactions newest first, ordered by
+        (booking_date, id, account_id) descending.
+
+        after is the (booking_date, id, account_id) of the last transaction
+        of the previous page. A query with a limit walks an index in list
+        order, idx_transactions_category when filtering by category and
+        idx_transactions_order otherwise, and stops after limit rows, so a
+        later page costs the same as the first one. The index is forced,
+        as without ANALYZE statistics SQLite prefers the account index and
+        sorts every matching row to return the first few.
+
+        text matches words of the description, additional information and
+        labels through the full-text index, every word as a prefix.
+        """
+        if after is not None:
+            # Also bound booking_date by the cursor, which SQLite can use to
+            # start the index scan at the cursor
+            date_to = min(date_to, after[0]) if date_to else after[0]
+
+        index = ""
+        if limit is not None:
+            order_index = (
+                "idx_transactions_order"
+                if category is None
+                else "idx_transactions_category"
+            )
+            index = f" INDEXED BY {order_index}"
+
+        placeholders = ", ".join("?" for _ in account_ids)
+        query = (
+            f"SELECT {', '.join(LIST_COLUMNS)} FROM transactions{index}"
+            f" WHERE account_id IN ({placeholders})"
+        )
+        params = list(account_ids)
+        if date_from:
+            query += " AND booking_date >= ?"
+            params.append(date_from)
+        if date_to:
+            query += " AND booking_date <= ?"
+            params.append(date_to)
+        if min_amount is not None:
+            query += " AND amount >= ?"
+            params.append(min_amount)
+        if max_amount is not None:
+            query += " AND amount <= ?"
+            params.append(max_amount)
+        if text:
+            match = _fts_query(text)
+            if not match:
+                # Nothing but quotes, which no word matches
+                query += " AND 0"
+            else:
+                query += (
+                    " AND rowid IN"
+                    " (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)"
+                )
+                params.append(match)
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        if after is not None:
+            query += " AND (booking_date, id, account_id) < (?, ?, ?)"
+            params.extend(after)
+        query += " ORDER BY booking_date DESC, id DESC, account_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return query, params
+
+    def list_transactions(self, account_ids, date_from=None, date_to=None, **filters):
+        """
+        Get stored transactions for the given accounts, newest first.
+
+        Args:
+            account_ids (list): Account IDs to include
+            date_from (str, optional): Include transactions booked on or after this date (YYYY-MM-DD)
+            date_to (str, optional): Include transactions booked on or before this date (YYYY-MM-DD)
+            **filters: min_amount, max_amount, text, category, status, after
+                and limit, see list_records
+
+        Returns:
+            list: Transactions as dicts with the transactions table columns
+        """
+        if not account_ids:
+            return []
+
+        query, params = self._select_transactions(
+            account_ids, date_from, date_to, **filters
+        )
+        with self._connect() as conn:
+            return [_row_dict(row) for row in conn.execute(query, params)]
+
+    def list_records(self, account_ids, date_from=None, date_to=None, **filters):
+        """
+        Get stored transactions as compact records, newest first.
+
+        Rows are read as plain tuples and turned straight into
+        TransactionRecord objects, so large date ranges don't hold a dict
+        per transaction.
+
+        Args:
+            account_ids (list): Account IDs to include
+            date_from (str, optional): Include transactions booked on or after this date (YYYY-MM-DD)
+            date_to (str, optional): Include transactions booked on or before this date (YYYY-MM-DD)
+            min_amount (float, optional): Smallest amount to include
+            max_amount (float, optional): Largest amount to include
+            text (str, optional): Only include transactions with these words, see
+                _select_transactions
+            category (str, optional): Only include this category
+            status (str, optional): Only include "booked" or "pending" transactions
+            after (tuple, optional): Start after this (booking_date, id, account_id)
+            limit (int, optional): Return at most this many transactions
+
+        Returns:
+            list: TransactionRecord objects
+        """
+        if not account_ids:
+            return []
+
+        query, params = self._select_transactions(
+            account_ids, date_from, date_to, **filters
+        )
+        with self._connect() as conn:
+            conn.row_factory = None
+            return list(map(TransactionRecord.from_row, conn.execute(query, params)))
+
+    def iter_transactions(
+        self, account_ids, date_from=None, date_to=None, batch_size=1000
+    ):
+        """
+        Iterate over stored transactions in batches, newest first.
+
+        Same filters as list_transactions, but only batch_size rows are read
+        at a time, so memory stays constant however long the history is.
+        Each batch is read with a connection of its own, continuing after
+        the last transaction of the previous batch, so nothing is held open
+        between batches. A streaming response may read each batch on a
+        different thread, and a sync can write in between.
+
+        Yields:
+            list: Up to batch_size transactions as dicts
+        """
+        after = None
+        while account_ids:
+            rows = self.list_transactions(
+                account_ids, date_from, date_to, after=after, limit=batch_size
+            )
+            if not rows:
+                break
+            yield rows
+            if len(rows) < batch_size:
+                break
+            last = rows[-1]
+            after = (last["booking_date"], last["id"], last["account_id"])
+
+    def search(self, account_ids, query, limit=50):
+        """
+        Find transactions whose description, additional information or
+        labels contain all words of a query, best matches first.
+
+        Every word also matches as a prefix, so "coff sho" finds "Coffee
+        Shop". Results are ranked with BM25, counting labels more and
+        additional information less than the description.
+
+        Args:
+            account_ids (list): Account IDs to search
+            query (str): Words to look for
+            limit (int, optional): Return at most this many transactions
+
+        Returns:
+            list: TransactionRecord objects
+        """
+        match = _fts_query(query)
+        if not account_ids or not match:
+            return []
+
+        columns = ", ".join(f"t.{column}" for column in LIST_COLUMNS)
+        placeholders = ", ".join("?" for _ in account_ids)
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        with self._connect() as conn:
+            conn.row_factory = None
+            rows = conn.execute(
+                f"SELECT {columns} FROM transactions_fts"
+                " JOIN transactions t ON t.rowid = transactions_fts.rowid"
+                f" WHERE transactions_fts MATCH ? AND t.account_id IN ({placeholders})"
+                f" ORDER BY bm25(transactions_fts, {weights}), t.booking_date DESC"
+                " LIMIT ?",
+                [match, *account_ids, limit],
+            )
+            return list(map(TransactionRecord.from_row, rows))
+
+    def set_labels(self, account_id, tx_id, labels):
+        """
+        Replace the custom labels of a transaction. Labels are kept across
+        syncs and included in the search index.
+
+        Returns:
+            list: The labels as stored, or None if the transaction doesn't exist
+        """
+        # Keep the first occurrence of each label, in order
+        labels = list(dict.fromkeys(label.strip() for label in labels if label.strip()))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE transactions SET labels = ? WHERE account_id = ? AND id = ?",
+                (json.dumps(labels), account_id, tx_id),
+            )
+            return labels if cursor.rowcount else None
+
+    def iter_columns(self):
+        """
+        Iterate over the columns needed for aggregation, for all booked transactions.
+
+        Yields:
+            tuple: (account_id, currency, booking_date, amount, category)
+        """
+        with self._connect() as conn:
+            conn.row_factory = None
+            yield from conn.execute(
+                "SELECT account_id, currency, booking_date, amount, category"
+                " FROM transactions WHERE status = 'booked'"
+            )
+
+    def save_account_snapshot(self, account_id, details, balances):
+        """Store the latest account details and balances responses."""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO account_snapshots (account_id, details, balances, synced_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (account_id) DO UPDATE SET
+                    details = excluded.details,
+                    balances = excluded.balances,
+                    synced_at = excluded.synced_at
+                """,
+                (account_id, json.dumps(details), json.dumps(balances), time.time()),
+            )
+
+    def get_account_snapshots(self, account_ids):
+        """
+        Get the stored account snapshots.
+
+        Returns:
+            dict: account_id -> dict with details, balances and synced_at,
+                for the accounts that have a snapshot
+        """
+        if not account_ids:
+            return {}
+
+        placeholders = ", ".join("?" for _ in account_ids)
+        with self._connect() as conn:
+            return {
+                row["account_id"]: {
+                    "details": json.loads(row["details"]),
+                    "balances": json.loads(row["balances"]),
+                    "synced_at": row["synced_at"],
+                }
+                for row in conn.execute(
+                    "SELECT * FROM account_snapshots"
+                    f" WHERE account_id IN ({placeholders})",
+                    list(account_ids),
+                )
+            }
+
+    def clear(self):
+        """Remove all stored transactions and sync state, e.g. after a setup reset."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM transactions")
+            conn.execute("DELETE FROM sync_state")
+            conn.execute("DELETE FROM monthly_rollups")
+            conn.execute("DELETE FROM account_snapshots")
+            conn.execute("DELETE FROM budget_totals")
+            conn.execute("DELETE FROM budget_events")
+            self._bump_revision(conn)
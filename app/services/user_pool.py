@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from app.services.config_store import ConfigStore
+from app.services.gc_bank_data import GoCardlessBankDataClient, GoCardlessTokenManager
+from app.services.gc_bank_data_async import AsyncGoCardlessBankDataClient
+from app.services.scheduler import SyncScheduler
+from app.services.transaction_store import TransactionStore
+
+logger = logging.getLogger(__name__)
+
+# Users whose clients, stores and background sync are kept in memory. The
+# least recently active user beyond this is closed and rebuilt on their
+# next request.
+USER_POOL_SIZE = int(os.getenv("USER_POOL_SIZE", 64))
+
+
+class UserContext:
+    """Everything the app keeps for one user.
+
+    The user's config holds their requisition, selected accounts and
+    GoCardless tokens, and their transactions have a database of their
+    own. The clients share the HTTP connection pools passed in, so a new
+    user costs no new connections.
+
+    Args:
+        user_id (str): The user's ID, or None for the single user of an app
+            without logins
+        config_path (str): The user's config file
+        db_path (str): The user's transaction database
+        session (requests.Session, optional): Shared by the sync clients
+        http (httpx.AsyncClient, optional): Shared by the async clients
+    """
+
+    def __init__(self, user_id, config_path, db_path, session=None, http=None):
+        self.user_id = user_id
+        self.config = ConfigStore(config_path)
+
+        # Start from the saved tokens, so a restart doesn't need a new token.
+        # Refreshed tokens are saved back to the config.
+        self.tokens = GoCardlessTokenManager(on_update=self._save_tokens)
+        tokens = self.config.get("tokens")
+        if tokens:
+            self.tokens.load(tokens)
+
+        self.client = GoCardlessBankDataClient(tokens=self.tokens, session=session)
+        self.async_client = AsyncGoCardlessBankDataClient(tokens=self.tokens, http=http)
+        self.store = TransactionStore(db_path)
+        self.scheduler = SyncScheduler(
+            self.client, self.store, self.selected_account_ids
+        )
+
+    def _save_tokens(self, tokens):
+        # Tokens are only kept once setup has created the config
+        self.config.update(tokens=tokens)
+
+    def selected_account_ids(self):
+        """Get the IDs of the accounts selected during setup, or an empty list."""
+        return self.config.get("selected_accounts", [])
+
+    def close(self, timeout=None):
+        """Stop the user's background threads. Shared connections stay open."""
+        self.scheduler.stop(timeout)
+        self.tokens.stop(timeout)
+
+
+class UserPool:
+    """Least recently used cache of UserContexts, keyed by user ID.
+
+    Building a context opens the user's files, so it is done once per user
+    rather than per request, and the pool's size bounds the memory and
+    background threads used however many users there are. When background
+    sync is on, every context's scheduler runs while it is in the pool."""
+
+    def __init__(self, factory, max_size=USER_POOL_SIZE):
+        self.factory = factory
+        self.max_size = max_size
+        self.background_sync = False
+
+        self._contexts = OrderedDict()  # user ID -> UserContext
+        self._building = {}  # user ID -> lock held while their context is built
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pooled(self, user_id):
+        # Call with self._lock held
+        context = self._contexts.get(user_id)
+        if context is not None:
+            self._contexts.move_to_end(user_id)
+            self.hits += 1
+        return context
+
+    def get(self, user_id):
+        """Get a user's context, building it on first use."""
+        with self._lock:
+            context = self._pooled(user_id)
+            if context is not None:
+                return context
+            building = self._building.setdefault(user_id, threading.Lock())
+
+        # Built outside the pool's lock, so other users' requests don't wait
+        # for it. Concurrent first requests of a user wait for the first one
+        # and share its context.
+        with building:
+            with self._lock:
+                context = self._pooled(user_id)
+            if context is not None:
+                return context
+
+            try:
+                context = self.factory(user_id)
+            except Exception:
+                with self._lock:
+                    self._building.pop(user_id, None)
+                raise
+
+            with self._lock:
+                self._building.pop(user_id, None)
+                self.misses += 1
+                if self.background_sync:
+                    context.scheduler.start()
+                self._contexts[user_id] = context
+                evicted = []
+                while len(self._contexts) > self.max_size:
+                    evicted.append(self._contexts.popitem(last=False)[1])
+                    self.evictions += 1
+
+        for old in evicted:
+            logger.debug("Closing user context", extra={"user_id": old.user_id})
+            # Don't keep this request waiting for a sync in progress, the
+            # scheduler stops once it's done
+            old.close(timeout=0)
+        return context
+
+    def start_background_sync(self):
+        """Run the scheduler of every pooled user, now and as users are added."""
+        with self._lock:
+            self.background_sync = True
+            contexts = list(self._contexts.values())
+        for context in contexts:
+            context.scheduler.start()
+
+    def close(self):
+        """Close every pooled context, e.g. when the app shuts down."""
+        with self._lock:
+            self.background_sync = False
+            contexts = list(self._contexts.values())
+            self._contexts.clear()
+        for context in contexts:
+            context.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._contexts),
+                "max_users": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
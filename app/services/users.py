@@ -0,0 +1,167 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import time
+from uuid import uuid4
+from app.services.sqlite_store import SQLiteStore
+
+# PBKDF2 iterations for new password hashes. Stored hashes keep the count
+# they were made with, so this can be raised later.
+PASSWORD_ITERATIONS = int(os.getenv("PASSWORD_ITERATIONS", 260000))
+
+# Seconds a login stays valid
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", 30 * 24 * 60 * 60))
+
+# Schema migrations of the UserStore, see SQLiteStore
+MIGRATIONS = [
+    """
+    CREATE TABLE users (
+        id TEXT PRIMARY KEY,
+        email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        password_hash TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    -- Only a hash of each login token is stored, so the database alone
+    -- can't be used to log in
+    CREATE TABLE auth_tokens (
+        token_hash TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX idx_auth_tokens_user ON auth_tokens (user_id);
+    """,
+]
+
+
+def hash_password(password, iterations=PASSWORD_ITERATIONS):
+    """
+    Hash a password with a random salt.
+
+    Returns:
+        str: "pbkdf2_sha256$<iterations>$<salt>$<hash>", salt and hash in hex
+    """
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, password_hash):
+    """Check a password against a hash made by hash_password."""
+    try:
+        algorithm, iterations, salt, expected = password_hash.split("$")
+        if algorithm != "pbkdf2_sha256":
+            return False
+        digest = hashlib.pbkdf2_hmac(
+            "sha256", password.encode("utf-8"), bytes.fromhex(salt), int(iterations)
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class UserStore(SQLiteStore):
+    """Users who can log in with an email address and password.
+
+    Each user's bank setup and transactions are kept apart, see
+    app.services.user_pool. A login hands out a random token, which
+    requests send back in a cookie or an Authorization header."""
+
+    MIGRATIONS = MIGRATIONS
+
+    def __init__(self, path, iterations=PASSWORD_ITERATIONS, token_ttl=AUTH_TOKEN_TTL):
+        self.iterations = iterations
+        self.token_ttl = token_ttl
+
+        super().__init__(path)
+
+    def create_user(self, email, password):
+        """
+        Register a user.
+
+        Returns:
+            dict: The user's id, email and created_at, or None if the email
+                address is taken
+        """
+        user = {"id": uuid4().hex, "email": email.strip(), "created_at": time.time()}
+        password_hash = hash_password(password, self.iterations)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (id, email, password_hash, created_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (user["id"], user["email"], password_hash, user["created_at"]),
+                )
+        except sqlite3.IntegrityError:
+            return None
+        return user
+
+    def get_user(self, user_id):
+        """Get a user by ID, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, email, created_at FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def authenticate(self, email, password):
+        """
+        Check an email address and password.
+
+        Returns:
+            dict: The user, or None if the credentials are wrong
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM users WHERE email = ?", (email.strip(),)
+            ).fetchone()
+        if row is None:
+            # Take as long as for a wrong password, so response times don't
+            # reveal which email addresses are registered
+            verify_password(password, hash_password("", self.iterations))
+            return None
+        if not verify_password(password, row["password_hash"]):
+            return None
+        return {"id": row["id"], "email": row["email"], "created_at": row["created_at"]}
+
+    def create_token(self, user_id):
+        """
+        Log a user in.
+
+        Returns:
+            str: A token identifying the user until it expires or is revoked
+        """
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        with self._connect() as conn:
+            # Forget expired logins while we're here
+            conn.execute("DELETE FROM auth_tokens WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT INTO auth_tokens (token_hash, user_id, expires_at)"
+                " VALUES (?, ?, ?)",
+                (_token_hash(token), user_id, now + self.token_ttl),
+            )
+        return token
+
+    def user_for_token(self, token):
+        """Get the user a token was handed out to, or None if it is unknown or expired."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT users.id, users.email, users.created_at FROM auth_tokens"
+                " JOIN users ON users.id = auth_tokens.user_id"
+                " WHERE token_hash = ? AND expires_at > ?",
+                (_token_hash(token), time.time()),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def revoke_token(self, token):
+        """Log out the session a token belongs to."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM auth_tokens WHERE token_hash = ?", (_token_hash(token),)
+            )
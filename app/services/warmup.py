@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from app.services.analytics import get_frame
+from app.services.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Steps of a warm-up, in order
+WARMUP_STEPS = ("tokens", "accounts", "analytics")
+
+
+class Warmup:
+    """Gets a UserContext ready to serve requests in a background thread.
+
+    A fresh process would otherwise make its first requests wait for a
+    token call, new connections to the bank and the accounts' first sync.
+    The warm-up validates the tokens, which opens the pooled connection to
+    GoCardless, refreshes whatever is due for the selected accounts, and
+    loads the analytics frame the summary is computed from. A step that
+    fails is logged and skipped, as requests can still be served from what
+    is stored.
+
+    Args:
+        context (UserContext): The context to warm up
+        then (callable, optional): Called once warm, e.g. to start the
+            background sync, which would otherwise repeat the first refresh
+    """
+
+    def __init__(self, context, then=None):
+        self.context = context
+        self.then = then
+
+        self.started_at = None
+        self.finished_at = None
+        self.durations = {}  # step -> seconds
+        self.errors = {}  # step -> error message
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        """Start warming up in a daemon thread."""
+        if self._thread is not None:
+            return
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Skip the steps not started yet and wait for the current one."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait(self, timeout=None):
+        """Wait until warm. Returns False if timeout ran out first."""
+        return self._ready.wait(timeout)
+
+    def run(self):
+        """Run every step, call then and report ready."""
+        if self.started_at is None:
+            self.started_at = time.time()
+        for step in WARMUP_STEPS:
+            if self._stop.is_set():
+                return
+            start = time.perf_counter()
+            try:
+                with span(f"warmup_{step}"):
+                    getattr(self, f"_{step}")()
+            except Exception as e:
+                self.errors[step] = str(e)
+                logger.warning(
+                    "Warm-up step failed", extra={"step": step, "error": str(e)}
+                )
+            self.durations[step] = time.perf_counter() - start
+
+        if self.then is not None:
+            self.then()
+        self.finished_at = time.time()
+        self._ready.set()
+        logger.info(
+            "Warm-up finished",
+            extra={
+                "duration_ms": round((self.finished_at - self.started_at) * 1000),
+                "errors": len(self.errors),
+            },
+        )
+
+    def _tokens(self):
+        # Also opens the session's connection to GoCardless
+        self.context.client.ensure_valid_token()
+
+    def _accounts(self):
+        # Fills the account snapshots, the response cache and the store for
+        # accounts that were never synced or are due
+        self.context.scheduler.run_once()
+
+    def _analytics(self):
+        # Kept until the next sync changes the store
+        get_frame(self.context.store)
+
+    def status(self):
+        """
+        Describe the warm-up for the readiness endpoint.
+
+        Returns:
+            dict: Whether it is ready, per-step durations in milliseconds and
+                errors of failed steps
+        """
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": {
+                step: round(seconds * 1000, 1)
+                for step, seconds in self.durations.items()
+            },
+            "errors": dict(self.errors),
+        }
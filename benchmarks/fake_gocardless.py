@@ -0,0 +1,361 @@
+"""Local stand-in for the GoCardless Bank Account Data API.
+
+Serves tokens, institutions, requisitions, account details, balances and
+paginated transactions for a configurable number of accounts, with added
+latency and optional 429 responses, so the app can be load tested without
+touching the real API or its daily quotas. Point the app at it with
+GOCARDLESS_BASE_URL=http://127.0.0.1:<port>/api/v2.
+
+Usage:
+    python -m benchmarks.fake_gocardless [--port 8001] [--accounts 3]
+        [--transactions 500] [--page-size 100] [--latency-ms 20]
+        [--throttle-rate 0.05]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
+
+API_PREFIX = "/api/v2"
+
+
+class FakeGoCardless:
+    """Fake GoCardless API served from a background thread.
+
+    Args:
+        accounts (int): Number of accounts every requisition links to
+        transactions (int): Booked transactions per account, one or more a day
+            going back from today
+        pending (int): Pending transactions per account
+        page_size (int): Transactions per page when the client doesn't ask
+            for a limit
+        latency_ms (float): Delay added to every response
+        jitter_ms (float): Up to this much extra random delay
+        throttle_rate (float): Share of API calls (tokens excluded) answered
+            with 429 Too Many Requests
+        retry_after (float): Retry-After sent with a 429
+        institutions (int): Number of institutions per country
+    """
+
+    def __init__(
+        self,
+        accounts=3,
+        transactions=500,
+        pending=2,
+        page_size=100,
+        latency_ms=20.0,
+        jitter_ms=5.0,
+        throttle_rate=0.0,
+        retry_after=0.0,
+        institutions=200,
+        seed=0,
+    ):
+        self.account_ids = [f"fake-account-{i}" for i in range(accounts)]
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.institutions = [
+            {
+                "id": f"FAKE_BANK_{i}",
+                "name": f"Fake Bank {i}",
+                "bic": f"FAKE{i:04d}",
+                "logo": "",
+                "countries": ["GB"],
+            }
+            for i in range(institutions)
+        ]
+        self.transactions = {
+            account_id: _make_transactions(account_id, transactions, pending)
+            for account_id in self.account_ids
+        }
+        self.requisitions = {}
+
+        self.calls = Counter()  # endpoint -> number of requests
+        self.throttled = Counter()  # endpoint -> number of 429 responses
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self, host="127.0.0.1", port=0):
+        """Start serving in a daemon thread, on a free port by default."""
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-gocardless", daemon=True
+        )
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self):
+        """Requests and 429 responses per endpoint since the last reset."""
+        with self._lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled)}
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms)
+        return (self.latency_ms + jitter) / 1000
+
+    def _throttle(self, endpoint):
+        """Count a call, and decide whether to answer it with a 429."""
+        with self._lock:
+            self.calls[endpoint] += 1
+            if endpoint == "token" or self._random.random() >= self.throttle_rate:
+                return False
+            self.throttled[endpoint] += 1
+            return True
+
+    def handle(self, method, path, query, body):
+        """
+        Answer an API call.
+
+        Returns:
+            tuple: (endpoint name, status code, JSON payload)
+        """
+        parts = [part for part in path[len(API_PREFIX) :].split("/") if part]
+        if parts[:1] == ["token"] and method == "POST":
+            if parts[1:] == ["new"]:
+                return (
+                    "token",
+                    200,
+                    {
+                        "access": uuid4().hex,
+                        "access_expires": 86400,
+                        "refresh": uuid4().hex,
+                        "refresh_expires": 2592000,
+                    },
+                )
+            return "token", 200, {"access": uuid4().hex, "access_expires": 86400}
+
+        if parts == ["institutions"]:
+            return "institutions", 200, self.institutions
+        if parts == ["agreements", "enduser"] and method == "POST":
+            return "agreements", 201, {"id": str(uuid4()), **body}
+        if parts == ["requisitions"] and method == "POST":
+            requisition = {
+                "id": str(uuid4()),
+                "status": "LN",
+                "institution_id": body.get("institution_id", ""),
+                "link": "https://ob.gocardless.com/psd2/start/fake",
+                "accounts": list(self.account_ids),
+            }
+            with self._lock:
+                self.requisitions[requisition["id"]] = requisition
+            return "requisitions", 201, requisition
+        if parts[:1] == ["requisitions"] and len(parts) == 2:
+            requisition = self.requisitions.get(parts[1])
+            if requisition is None:
+                return "requisitions", 404, {"detail": "Not found."}
+            return "requisitions", 200, requisition
+
+        if parts[:1] != ["accounts"] or len(parts) < 2:
+            return "unknown", 404, {"detail": "Not found."}
+        account_id = parts[1]
+        if account_id not in self.transactions:
+            return "account_details", 404, {"detail": "Account not found."}
+
+        if len(parts) == 2:
+            number = self.account_ids.index(account_id)
+            return (
+                "account_details",
+                200,
+                {
+                    "id": account_id,
+                    "institution_id": "FAKE_BANK_0",
+                    "name": f"Fake account {number}",
+                    "account": {
+                        "name": f"Fake account {number}",
+                        "iban": f"GB00FAKE{number:014d}",
+                    },
+                },
+            )
+        if parts[2] == "balances":
+            return (
+                "account_balances",
+                200,
+                {
+                    "balances": [
+                        {
+                            "balanceType": "interimAvailable",
+                            "balanceAmount": {"amount": "1234.56", "currency": "EUR"},
+                        }
+                    ]
+                },
+            )
+        if parts[2] == "transactions":
+            return (
+                "account_transactions",
+                200,
+                self._transactions_page(account_id, query),
+            )
+        return "unknown", 404, {"detail": "Not found."}
+
+    def _transactions_page(self, account_id, query):
+        booked, pending = self.transactions[account_id]
+        date_from = query.get("date_from", [""])[0]
+        date_to = query.get("date_to", ["9999-12-31"])[0]
+        limit = int(query.get("limit", [self.page_size])[0])
+        offset = int(query.get("offset", [0])[0])
+
+        in_range = [tx for tx in booked if date_from <= tx["bookingDate"] <= date_to]
+        return {
+            "transactions": {
+                "booked": in_range[offset : offset + limit],
+                # Pending transactions come with the first page only
+                "pending": pending if offset == 0 else [],
+            }
+        }
+
+
+def _make_transactions(account_id, count, pending_count):
+    """Booked (newest first) and pending transactions for an account."""
+    today = date.today()
+    booked = []
+    for i in range(count):
+        day = today - timedelta(days=i // 3)
+        amount = f"{-(i % 97 + 1) * 1.37:.2f}" if i % 10 else "2500.00"
+        booked.append(
+            {
+                "internalTransactionId": f"{account_id}-{i}",
+                "bookingDate": day.isoformat(),
+                "valueDate": day.isoformat(),
+                "transactionAmount": {"amount": amount, "currency": "EUR"},
+                "creditorName": f"Merchant {i % 50}",
+                "remittanceInformationUnstructured": f"Card payment to Merchant {i % 50}",
+            }
+        )
+    pending = [
+        {
+            "valueDate": today.isoformat(),
+            "transactionAmount": {"amount": f"-{i + 1}.99", "currency": "EUR"},
+            "creditorName": f"Pending merchant {i}",
+            "remittanceInformationUnstructured": f"Pending card payment {i}",
+        }
+        for i in range(pending_count)
+    ]
+    return booked, pending
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_fake = None  # FakeGoCardless, set on the subclass made by start()
+    protocol_version = "HTTP/1.1"  # Keep connections alive like the real API
+
+    def do_GET(self):
+        self._answer("GET")
+
+    def do_POST(self):
+        self._answer("POST")
+
+    def _answer(self, method):
+        fake = self.server_fake
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        time.sleep(fake._delay())
+        endpoint, status, payload = fake.handle(
+            method, url.path, parse_qs(url.query), body
+        )
+        headers = {}
+        if fake._throttle(endpoint):
+            status = 429
+            payload = {
+                "summary": "Rate limit exceeded",
+                "detail": "Fake rate limit, retry later.",
+                "status_code": 429,
+            }
+            headers["Retry-After"] = str(fake.retry_after)
+        if endpoint.startswith("account_"):
+            # Plenty of quota left, so the app's scheduler isn't slowed down
+            headers["HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_LIMIT"] = "1000"
+            headers["HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_REMAINING"] = "999"
+            headers["HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET"] = "86400"
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+
+def add_arguments(parser):
+    """Add the options of FakeGoCardless to an argument parser."""
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--pending", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+
+
+def from_arguments(args):
+    return FakeGoCardless(
+        accounts=args.accounts,
+        transactions=args.transactions,
+        pending=args.pending,
+        page_size=args.page_size,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = from_arguments(args)
+    print(f"Fake GoCardless API at {fake.start(args.host, args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Load test the app against a local fake of the GoCardless API.
+
+Starts benchmarks.fake_gocardless, then drives the setup flow, /accounts/
+and /transactions/ with concurrent clients and reports p50/p90/p99
+latency, throughput, errors and the upstream calls each scenario caused,
+as JSON. With --baseline the results are compared to an earlier run and
+the exit status is 1 when p99 latency or throughput got worse by more
+than --tolerance, so a regression can fail a pipeline.
+
+By default the app runs in-process, on a single event loop like one
+server worker. With --app-url a running app is tested instead; start it
+with GOCARDLESS_BASE_URL pointing at the fake (see --fake-port).
+
+Usage:
+    python -m benchmarks.load [--concurrency 8] [--requests 200]
+        [--latency-ms 20] [--throttle-rate 0.05] [--output results.json]
+        [--baseline previous.json --tolerance 0.2]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from benchmarks.fake_gocardless import add_arguments, from_arguments
+
+SCENARIOS = ("setup", "accounts", "transactions")
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(
+        0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+def setup_flow(client, institution_id, account_ids):
+    """Link a bank and select its accounts, like a user going through /setup."""
+    responses = [
+        client.get("/setup/institutions/GB"),
+        client.post(f"/setup/start-bank-link/{institution_id}"),
+    ]
+    # Flows run concurrently on one client, so send each flow's own setup
+    # session rather than whichever the client's cookie jar saw last
+    session = responses[-1].cookies.get("setup_session")
+    headers = {"Cookie": f"setup_session={session}"} if session else {}
+    responses += [
+        client.get("/setup/bank-callback", headers=headers),
+        client.post(
+            "/setup/complete-setup",
+            data={"account_ids": account_ids},
+            headers=headers,
+        ),
+    ]
+    for response in responses:
+        if response.status_code >= 400:
+            return response
+    return responses[-1]
+
+
+def run_scenario(name, call, requests, concurrency, fake):
+    """
+    Make requests calls spread over concurrency threads.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, throughput and errors
+    """
+    fake.reset_stats()
+
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            status = call().status_code
+        except Exception as e:
+            status = type(e).__name__
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds * 1000 for seconds, _ in results)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(
+        count
+        for status, count in statuses.items()
+        if not status.isdigit() or int(status) >= 400
+    )
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p90": round(percentile(latencies, 0.90), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "max": round(latencies[-1], 2),
+        },
+        "statuses": statuses,
+        "errors": errors,
+        "upstream": fake.stats(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Find scenarios that got slower than in a baseline run.
+
+    Returns:
+        list: Descriptions of the regressions, empty if there are none
+    """
+    previous = {result["scenario"]: result for result in baseline["scenarios"]}
+    regressions = []
+    for result in results["scenarios"]:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        p99, p99_before = result["latency_ms"]["p99"], before["latency_ms"]["p99"]
+        if p99 > p99_before * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p99 {p99_before} ms -> {p99} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{result['scenario']}: throughput {before['throughput']}"
+                f" -> {result['throughput']} requests/s"
+            )
+        if result["errors"] > before["errors"]:
+            regressions.append(
+                f"{result['scenario']}: errors {before['errors']} -> {result['errors']}"
+            )
+    return regressions
+
+
+def in_process_app(base_url, config_dir):
+    """Import the app wired to the fake API and a throwaway config directory."""
+    os.environ["GOCARDLESS_BASE_URL"] = base_url
+    os.environ.setdefault("NORDIGEN_SECRET_ID", "benchmark")
+    os.environ.setdefault("NORDIGEN_SECRET_KEY", "benchmark")
+    # Only measure work caused by the requests themselves
+    os.environ["BACKGROUND_SYNC"] = "0"
+
+    from app import dependencies
+    from app.main import app
+
+    dependencies.CONFIG_DIR = config_dir
+    dependencies.CONFIG_FILE = os.path.join(config_dir, "user_config.json")
+    dependencies.TRANSACTIONS_DB = os.path.join(config_dir, "transactions.db")
+    dependencies.USERS_DB = os.path.join(config_dir, "users.db")
+    dependencies.USERS_DIR = os.path.join(config_dir, "users")
+    dependencies.SESSIONS_DB = os.path.join(config_dir, "sessions.db")
+    dependencies.SESSION_SECRET_FILE = os.path.join(config_dir, "session_secret")
+    dependencies.INSTITUTIONS_DB = os.path.join(config_dir, "institutions.db")
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--setup-requests", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--app-url", help="Test a running app instead")
+    parser.add_argument("--fake-port", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = from_arguments(args)
+    base_url = fake.start(port=args.fake_port)
+    account_ids = fake.account_ids
+    from_date = (date.today() - timedelta(days=365)).isoformat()
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        if args.app_url:
+            import httpx
+
+            client = httpx.Client(base_url=args.app_url, timeout=120)
+        else:
+            from fastapi.testclient import TestClient
+
+            # Entering the client runs the lifespan and keeps one event loop
+            # that every request thread shares
+            client = TestClient(in_process_app(base_url, config_dir))
+            client.__enter__()
+
+        try:
+            # Accounts and transactions need a completed setup
+            response = setup_flow(client, "FAKE_BANK_0", account_ids)
+            response.raise_for_status()
+
+            calls = {
+                "setup": lambda: setup_flow(client, "FAKE_BANK_0", account_ids),
+                "accounts": lambda: client.get("/accounts/"),
+                "transactions": lambda: client.get(
+                    "/transactions/", params={"from_date": from_date}
+                ),
+            }
+            scenarios = [
+                run_scenario(
+                    name,
+                    calls[name],
+                    args.setup_requests if name == "setup" else args.requests,
+                    args.concurrency,
+                    fake,
+                )
+                for name in args.scenarios
+            ]
+        finally:
+            if args.app_url:
+                client.close()
+            else:
+                client.__exit__(None, None, None)
+            fake.stop()
+
+    results = {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        "scenarios": scenarios,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare FastAPI's default response path with the orjson fast path.
+
+Serves the same transaction records through two routes, one returning
+TransactionResponse models through response_model (validated again and
+encoded by FastAPI) and one returning fast_json_response, and reports
+requests per second and transactions per second for each as JSON.
+
+Usage:
+    python -m benchmarks.serialization [--sizes 10000 100000] [--repeat 5]
+"""
+
+import argparse
+import json
+import time
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.models.transaction import TransactionRecord
+from app.routers.transactions import TransactionResponse
+from app.services.serialization import fast_json_response
+
+CATEGORIES = ["Groceries", "Rent", "Transport", None]
+
+
+def make_records(count):
+    return [
+        TransactionRecord(
+            f"tx-{i}",
+            f"account-{i % 3}",
+            -(i % 10000) - 1,
+            "EUR",
+            f"Card payment to merchant {i % 500}",
+            19000 + i % 1000,
+            19000 + i % 1000,
+            CATEGORIES[i % len(CATEGORIES)],
+        )
+        for i in range(count)
+    ]
+
+
+def make_app(records):
+    app = FastAPI()
+
+    @app.get("/default", response_model=List[TransactionResponse])
+    def default():
+        return [TransactionResponse(**record.to_dict()) for record in records]
+
+    @app.get("/fast", response_model=List[TransactionResponse])
+    def fast():
+        return fast_json_response([record.to_dict() for record in records])
+
+    return app
+
+
+def measure(client, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return min(timings), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        client = TestClient(make_app(make_records(size)))
+        default_time, default_response = measure(client, "/default", args.repeat)
+        fast_time, fast_response = measure(client, "/fast", args.repeat)
+        assert default_response.json() == fast_response.json()
+
+        for path, seconds, response in [
+            ("default", default_time, default_response),
+            ("fast", fast_time, fast_response),
+        ]:
+            results.append(
+                {
+                    "path": path,
+                    "transactions": size,
+                    "seconds": round(seconds, 4),
+                    "requests_per_second": round(1 / seconds, 2),
+                    "transactions_per_second": round(size / seconds),
+                    "bytes": len(response.content),
+                }
+            )
+        results[-1]["speedup"] = round(default_time / fast_time, 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from app import dependencies
+from app.main import app
+from app.routers import accounts
+from app.services import gc_bank_data, gc_bank_data_async
+from app.services.transaction_store import TransactionStore
+from app.services.user_pool import UserContext
+from benchmarks.fake_gocardless import FakeGoCardless
+
+OLD_BALANCES = {
+    "balances": [
+        {
+            "balanceType": "interimAvailable",
+            "balanceAmount": {"amount": "10.00", "currency": "EUR"},
+        }
+    ]
+}
+
+
+def test_stale_snapshots_are_refreshed_without_the_scheduler(tmp_path, monkeypatch):
+    fake = FakeGoCardless(accounts=2, transactions=0, latency_ms=0, jitter_ms=0)
+    base_url = fake.start()
+    monkeypatch.setattr(gc_bank_data, "BASE_URL", base_url)
+    monkeypatch.setattr(gc_bank_data_async, "BASE_URL", base_url)
+    context = UserContext(
+        None, str(tmp_path / "user_config.json"), str(tmp_path / "transactions.db")
+    )
+    context.config.save({"selected_accounts": fake.account_ids})
+    stale, fresh = fake.account_ids
+    for account_id in fake.account_ids:
+        context.store.save_account_snapshot(account_id, {}, OLD_BALANCES)
+    with context.store._connect() as conn:
+        conn.execute(
+            "UPDATE account_snapshots SET synced_at = ? WHERE account_id = ?",
+            (time.time() - 3600, stale),
+        )
+    monkeypatch.setattr(dependencies, "_default_context", context)
+
+    try:
+        assert not context.scheduler.running
+        response = TestClient(app).get("/accounts/")
+    finally:
+        context.close()
+        fake.stop()
+
+    assert response.status_code == 200
+    accounts = {account["id"]: account for account in response.json()}
+    assert accounts[stale]["balance"] == 1234.56
+    # Fresh snapshots are served as stored
+    assert accounts[fresh]["balance"] == 10.0
+    assert fake.calls["account_balances"] == 1
+
+    snapshot = context.store.get_account_snapshots([stale])[stale]
+    assert snapshot["balances"]["balances"][0]["balanceAmount"]["amount"] == "1234.56"
+
+
+class CountingClient:
+    """Async bank client that counts how many calls run at the same time"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def _call(self, response):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return response
+
+    async def get_account_details(self, account_id):
+        return await self._call({"account": {"name": account_id}})
+
+    async def get_account_balances(self, account_id):
+        return await self._call(OLD_BALANCES)
+
+
+class StoppedScheduler:
+    running = False
+
+
+def test_every_bank_call_counts_against_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(accounts, "MAX_CONCURRENCY", 4)
+    client = CountingClient()
+    store = TransactionStore(str(tmp_path / "transactions.db"))
+    account_ids = [f"acc-{i}" for i in range(8)]
+
+    results = asyncio.run(
+        accounts._load_accounts(client, store, StoppedScheduler(), account_ids)
+    )
+
+    assert [account.name for _, account, _ in results] == account_ids
+    # Details and balances of 2 accounts at a time, not of 4
+    assert client.peak == 4
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from datetime import date
+from app.services import analytics
+from app.services.analytics import TransactionFrame, summarize
+from app.services.transaction_store import TransactionStore
+
+
+def test_summarize_totals_categories_months_and_balance():
+    frame = TransactionFrame(
+        [
+            ("acc", "EUR", "2024-01-01", 1000.0, "Salary"),
+            ("acc", "EUR", "2024-01-02", -12.34, "Groceries"),
+            ("acc", "EUR", "2024-02-01", -0.66, "Groceries"),
+            ("other", "EUR", "2024-02-01", -50.0, None),
+            ("acc", "GBP", "2024-02-03", -5.0, None),
+        ]
+    )
+
+    summary = summarize(frame, account_ids={"acc"})
+
+    eur = summary["EUR"]
+    assert (eur["income"], eur["expenses"], eur["net"], eur["count"]) == (
+        1000.0,
+        -13.0,
+        987.0,
+        3,
+    )
+    assert {c["category"]: c["net"] for c in eur["by_category"]} == {
+        "Salary": 1000.0,
+        "Groceries": -13.0,
+    }
+    assert [(m["month"], m["net"]) for m in eur["by_month"]] == [
+        ("2024-01", 987.66),
+        ("2024-02", -0.66),
+    ]
+    assert [p["balance"] for p in eur["running_balance"]] == [1000.0, 987.66, 987.0]
+    assert summary["GBP"]["expenses"] == -5.0
+
+
+def test_summarize_date_range():
+    frame = TransactionFrame(
+        [
+            ("acc", "EUR", "2024-01-01", -1.0, None),
+            ("acc", "EUR", "2024-03-01", -2.0, None),
+        ]
+    )
+
+    summary = summarize(frame, date_from=date(2024, 2, 1))
+
+    assert summary["EUR"]["count"] == 1
+    assert summary["EUR"]["running_balance"][0]["date"] == date(2024, 3, 1)
+
+
+def test_frames_of_least_recently_used_stores_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "FRAME_CACHE_SIZE", 2)
+    monkeypatch.setattr(analytics, "_frames", OrderedDict())
+    stores = [TransactionStore(str(tmp_path / f"{name}.db")) for name in "abc"]
+
+    first = analytics.get_frame(stores[0])
+    analytics.get_frame(stores[1])
+    assert analytics.get_frame(stores[0]) is first
+    analytics.get_frame(stores[2])  # Drops b, the least recently used
+
+    assert list(analytics._frames) == [stores[0].path, stores[2].path]
@@ -0,0 +1,165 @@
+import time
+from datetime import date, timedelta
+from app.services.budgets import BudgetIndex, crossing, period_bounds, spent_per_budget
+from app.services.transaction_store import TransactionStore, parse_transaction
+
+
+def budget(id, category=None, period="month", limit_cents=10000, account_id=None):
+    return {
+        "id": id,
+        "name": f"Budget {id}",
+        "category": category,
+        "period": period,
+        "limit_cents": limit_cents,
+        "currency": "EUR",
+        "account_id": account_id,
+        "warn_at": 0.8,
+    }
+
+
+def spend(tx_id, amount, day=None, description="Coffee"):
+    day = day or date.today().isoformat()
+    return parse_transaction(
+        "acc",
+        {
+            "internalTransactionId": tx_id,
+            "bookingDate": day,
+            "valueDate": day,
+            "transactionAmount": {"amount": amount, "currency": "EUR"},
+            "remittanceInformationUnstructured": description,
+        },
+    )
+
+
+def test_period_bounds():
+    day = date(2024, 2, 14)  # A Wednesday
+    assert period_bounds("week", day) == (date(2024, 2, 12), date(2024, 2, 18))
+    assert period_bounds("month", day) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert period_bounds("year", day) == (date(2024, 1, 1), date(2024, 12, 31))
+
+
+def test_crossing_reports_the_highest_threshold():
+    limit = budget(1)
+    assert crossing(limit, 0, 7000) is None
+    assert crossing(limit, 7000, 8000) == "warning"
+    assert crossing(limit, 7000, 12000) == "exceeded"
+    assert crossing(limit, 12000, 13000) is None
+    assert crossing(limit, 12000, 5000) is None
+
+
+def test_index_only_reports_matching_budgets():
+    index = BudgetIndex(
+        [
+            budget(1, "Food"),
+            budget(2),
+            budget(3, "Rent"),
+            budget(4, "Food", account_id="other"),
+            budget(5, "Food", period="week"),
+        ]
+    )
+    changes = index.changes(
+        "acc",
+        [
+            ("Food", "2024-02-14", "EUR", 500),
+            ("Food", "2024-03-01", "EUR", 200),
+            # Moved from one category to another, so "all spending" is unchanged
+            ("Food", "2024-02-15", "EUR", 300),
+            ("Rent", "2024-02-15", "EUR", -300),
+            ("Food", "2024-02-14", "USD", 900),
+        ],
+    )
+    assert changes == {
+        (1, "2024-02-01", "2024-02-29"): 800,
+        (1, "2024-03-01", "2024-03-31"): 200,
+        (2, "2024-02-01", "2024-02-29"): 500,
+        (2, "2024-03-01", "2024-03-31"): 200,
+        (3, "2024-02-01", "2024-02-29"): -300,
+        (5, "2024-02-12", "2024-02-18"): 800,
+        (5, "2024-02-26", "2024-03-03"): 200,
+    }
+
+
+def test_spent_per_budget_keeps_uncategorised_apart():
+    groups = [(None, "acc", "EUR", 100), ("Food", "acc", "EUR", 250)]
+    spent = spent_per_budget([budget(1), budget(2, "Food")], groups)
+    assert spent == {1: 350, 2: 250}
+
+
+def test_sync_updates_totals_and_records_crossings(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.add_transactions("acc", [spend("a", "-50.00")])
+    added = store.add_budget(
+        {"name": "Coffee", "limit_cents": 10000, "currency": "EUR", "warn_at": 0.8}
+    )
+    assert (added["spent"], added["state"]) == (50.0, "ok")
+
+    store.add_transactions("acc", [spend("b", "-35.00"), spend("c", "100.00")])
+    store.add_transactions("acc", [spend("d", "-20.00")])
+    # Syncing the same transactions again changes nothing
+    store.add_transactions("acc", [spend("d", "-20.00")])
+
+    [status] = store.list_budgets()
+    assert (status["spent"], status["remaining"]) == (105.0, -5.0)
+    assert status["state"] == "exceeded"
+    events = store.budget_events()
+    assert [(e["kind"], e["spent"]) for e in events] == [
+        ("warning", 85.0),
+        ("exceeded", 105.0),
+    ]
+    assert store.budget_events(after_id=events[0]["id"]) == events[1:]
+
+    # A changed amount moves the running total by the difference
+    store.add_transactions("acc", [spend("d", "-5.00")])
+    assert store.list_budgets()[0]["spent"] == 90.0
+    assert len(store.budget_events()) == 2
+
+
+def test_recategorizing_moves_spending_between_budgets(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.add_transactions("acc", [spend("a", "-40.00", description="Cinema")])
+    food = store.add_budget(
+        {"name": "Food", "category": "Food", "limit_cents": 5000, "currency": "EUR"}
+    )
+    store.add_rule({"category": "Food", "kind": "substring", "pattern": "cinema"})
+    assert store.get_budget(food["id"])["spent"] == 40.0
+
+    store.add_rule(
+        {"category": "Fun", "kind": "substring", "pattern": "cinema", "priority": 1}
+    )
+    assert store.get_budget(food["id"])["spent"] == 0.0
+
+
+def test_past_periods_are_added_up_without_events(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.add_budget({"name": "All", "limit_cents": 1000, "currency": "EUR"})
+    last_year = (date.today() - timedelta(days=400)).isoformat()
+    store.add_transactions("acc", [spend("old", "-30.00", day=last_year)])
+
+    assert store.budget_events() == []
+    assert store.list_budgets(today=date.fromisoformat(last_year))[0]["spent"] == 30.0
+
+
+def test_checking_many_budgets_after_a_sync_is_fast(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    for i in range(1000):
+        store.add_budget(
+            {
+                "name": f"Budget {i}",
+                "category": None if i % 10 == 0 else f"Category {i % 50}",
+                "period": ("week", "month", "year")[i % 3],
+                "limit_cents": 10000 + i,
+                "currency": "EUR",
+            }
+        )
+    with store._connect() as conn:
+        store._get_budget_index(conn)  # Load the budgets once, like a warm worker
+        deltas = [
+            (f"Category {i % 50}", date.today().isoformat(), "EUR", 100)
+            for i in range(500)
+        ]
+
+        start = time.perf_counter()
+        store._refresh_budgets(conn, "acc", deltas)
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.1
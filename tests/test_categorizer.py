@@ -0,0 +1,81 @@
+from app.services.categorizer import AhoCorasick, Categorizer
+
+
+def rule(rule_id, category, kind, pattern=None, priority=100, **amounts):
+    return {
+        "id": rule_id,
+        "category": category,
+        "kind": kind,
+        "pattern": pattern,
+        "priority": priority,
+        "min_amount": amounts.get("min_amount"),
+        "max_amount": amounts.get("max_amount"),
+    }
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick({"he": [1], "she": [2], "hers": [3], "x": [4]})
+    assert automaton.search("ushers") == {1, 2, 3}
+
+
+def test_categorizer_picks_highest_precedence_match():
+    categorizer = Categorizer(
+        [
+            rule(1, "Shopping", "substring", "amazon"),
+            rule(2, "Books", "regex", r"amazon\s+books", priority=10),
+            rule(3, "Rent", "counterparty", "Landlord Ltd"),
+            rule(4, "Big spend", "amount", max_amount=-500, priority=200),
+            rule(5, "Refunds", "substring", "amazon", min_amount=0, priority=50),
+        ]
+    )
+
+    assert categorizer.categorize(
+        {"description": "AMAZON Books order", "amount": -20}
+    ) == ("Books", 2)
+    assert categorizer.categorize({"description": "Amazon EU", "amount": -20}) == (
+        "Shopping",
+        1,
+    )
+    assert categorizer.categorize({"description": "Amazon EU", "amount": 20}) == (
+        "Refunds",
+        5,
+    )
+    assert categorizer.categorize(
+        {"description": "March", "counterparty": "LANDLORD LTD", "amount": -900}
+    ) == ("Rent", 3)
+    assert categorizer.categorize({"description": "Car", "amount": -900}) == (
+        "Big spend",
+        4,
+    )
+    assert categorizer.categorize({"description": "Bookshop", "amount": -3}) == (
+        None,
+        None,
+    )
+
+
+def test_backreferences_are_not_merged_with_other_rules():
+    categorizer = Categorizer(
+        [
+            rule(1, "Transport", "regex", r"^(?:bus|tram)"),
+            # Doubled letters, \1 has to stay this rule's own group
+            rule(2, "Typos", "regex", r"(\w)\1", priority=200),
+            rule(3, "Fees", "regex", r"fee|charge", priority=300),
+        ]
+    )
+
+    assert categorizer.categorize({"description": "Bookshop", "amount": -3}) == (
+        "Typos",
+        2,
+    )
+    assert categorizer.categorize({"description": "Tram pass", "amount": -3}) == (
+        "Transport",
+        1,
+    )
+    assert categorizer.categorize({"description": "Card charge", "amount": -3}) == (
+        "Fees",
+        3,
+    )
+    assert categorizer.categorize({"description": "Bank charge", "amount": -3}) == (
+        "Fees",
+        3,
+    )
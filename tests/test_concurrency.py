@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from app.services import concurrency
+from app.services.concurrency import gather_concurrently, run_concurrently
+
+# Seconds each fake account call takes
+DELAY = 0.2
+
+
+class Tracker:
+    """Counts how many calls run at the same time"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+    def leave(self):
+        with self._lock:
+            self.running -= 1
+
+
+def fetch(tracker, delays):
+    def call(account_id):
+        tracker.enter()
+        try:
+            time.sleep(delays[account_id])
+            if account_id == "broken":
+                raise RuntimeError("bank down")
+            return account_id.upper()
+        finally:
+            tracker.leave()
+
+    return call
+
+
+def fetch_async(tracker, delays):
+    async def call(account_id):
+        tracker.enter()
+        try:
+            await asyncio.sleep(delays[account_id])
+            if account_id == "broken":
+                raise RuntimeError("bank down")
+            return account_id.upper()
+        finally:
+            tracker.leave()
+
+    return call
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def test_accounts_are_fetched_in_parallel():
+    delays = {"a": DELAY / 2, "b": DELAY, "c": DELAY / 2, "d": DELAY / 4}
+    for run in (
+        lambda: run_concurrently(fetch(Tracker(), delays), delays, max_workers=4),
+        lambda: asyncio.run(
+            gather_concurrently(fetch_async(Tracker(), delays), delays, 4)
+        ),
+    ):
+        results, elapsed = timed(run)
+        assert [result for _, result, _ in results] == ["A", "B", "C", "D"]
+        # Close to the slowest account, not the sum of all of them
+        assert elapsed < DELAY * 1.75
+
+
+def test_concurrency_is_capped(monkeypatch):
+    monkeypatch.setattr(concurrency, "MAX_CONCURRENCY", 2)
+    delays = {account_id: DELAY / 4 for account_id in "abcdef"}
+
+    tracker = Tracker()
+    run_concurrently(fetch(tracker, delays), delays)
+    assert tracker.peak == 2
+
+    tracker = Tracker()
+    asyncio.run(gather_concurrently(fetch_async(tracker, delays), delays))
+    assert tracker.peak == 2
+
+
+def test_one_failure_keeps_the_other_results():
+    delays = {"a": DELAY / 2, "broken": 0, "b": DELAY / 2}
+    for results in (
+        run_concurrently(fetch(Tracker(), delays), delays),
+        asyncio.run(gather_concurrently(fetch_async(Tracker(), delays), delays)),
+    ):
+        assert [(item, result) for item, result, _ in results] == [
+            ("a", "A"),
+            ("broken", None),
+            ("b", "B"),
+        ]
+        errors = [error for _, _, error in results]
+        assert errors[0] is None and errors[2] is None
+        assert isinstance(errors[1], RuntimeError)
+
+
+def test_calls_share_one_bounded_pool(monkeypatch):
+    monkeypatch.setattr(concurrency, "_executor", None)
+    monkeypatch.setattr(concurrency, "EXECUTOR_WORKERS", 2)
+    delays = {account_id: DELAY / 4 for account_id in "abcd"}
+    threads = set()
+
+    def call(account_id):
+        threads.add(threading.current_thread().name)
+        # A call made from the pool while all of its threads are busy
+        return run_concurrently(fetch(Tracker(), delays), delays)
+
+    for results in (
+        run_concurrently(call, "xyz", max_workers=3),
+        run_concurrently(call, "xyz", max_workers=3),
+    ):
+        assert [error for _, _, error in results] == [None] * 3
+    concurrency._executor.shutdown()
+
+    # The callers' thread and the 2 pooled ones, instead of new ones per call
+    assert len(threads) <= 3
+    assert threading.current_thread().name in threads
@@ -0,0 +1,41 @@
+import json
+import os
+from app.services.config_store import ConfigStore
+
+
+def test_missing_file_is_not_configured(tmp_path):
+    store = ConfigStore(str(tmp_path / "user_config.json"))
+
+    assert store.load() is None
+    assert not store.exists
+    assert store.get("selected_accounts", []) == []
+    assert not store.update(selected_accounts=["acc"])
+
+
+def test_save_writes_atomically_and_serves_from_memory(tmp_path):
+    path = tmp_path / "config" / "user_config.json"
+    store = ConfigStore(str(path), check_interval=60)
+
+    store.save({"selected_accounts": ["acc"]})
+    assert json.loads(path.read_text()) == {"selected_accounts": ["acc"]}
+    assert os.listdir(path.parent) == ["user_config.json"]
+
+    # Returned values are copies, so callers can't change the cached config
+    store.load()["selected_accounts"].append("other")
+    assert store.get("selected_accounts") == ["acc"]
+
+    assert store.update(setup_complete=True)
+    assert store.load() == {"selected_accounts": ["acc"], "setup_complete": True}
+
+    store.delete()
+    assert not path.exists()
+    assert store.load() is None
+
+
+def test_reloads_when_file_changes(tmp_path):
+    path = tmp_path / "user_config.json"
+    store = ConfigStore(str(path), check_interval=0)
+    store.save({"selected_accounts": ["acc"]})
+
+    path.write_text(json.dumps({"selected_accounts": ["acc", "other"]}))
+    assert store.get("selected_accounts") == ["acc", "other"]
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import httpx
+from app import dependencies
+from app.main import app
+from app.services.transaction_store import parse_transaction
+from app.services.user_pool import UserContext
+from tests.test_transaction_store import make_tx
+
+# More than one batch of TransactionStore.iter_transactions per account
+ROWS = 2500
+
+
+def test_concurrent_exports_stream_every_batch(tmp_path, monkeypatch):
+    context = UserContext(
+        None, str(tmp_path / "user_config.json"), str(tmp_path / "transactions.db")
+    )
+    context.config.save({"selected_accounts": ["acc"]})
+    context.store.add_transactions(
+        "acc",
+        [
+            parse_transaction("acc", make_tx(str(i), f"2024-{i % 12 + 1:02d}-01"))
+            for i in range(ROWS)
+        ],
+    )
+    monkeypatch.setattr(dependencies, "_default_context", context)
+
+    async def export(client):
+        response = await client.get("/transactions/export")
+        assert response.status_code == 200
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(*(export(client) for _ in range(10)))
+
+    try:
+        exports = asyncio.run(main())
+    finally:
+        context.close()
+
+    for rows in exports:
+        assert len(rows) == ROWS
+        assert len({row["id"] for row in rows}) == ROWS
+        dates = [row["booking_date"] for row in rows]
+        assert dates == sorted(dates, reverse=True)
@@ -0,0 +1,48 @@
+from app.services import gc_bank_data
+from app.services.gc_bank_data import GoCardlessBankDataClient, TTLCache
+from app.services.resilience import CircuitBreaker, RetryPolicy
+from app.services.transaction_store import TransactionStore
+from benchmarks.fake_gocardless import FakeGoCardless
+from benchmarks.load import compare
+
+
+def test_client_syncs_from_fake_api_despite_rate_limits(tmp_path, monkeypatch):
+    fake = FakeGoCardless(accounts=2, transactions=250, latency_ms=0, throttle_rate=0.5)
+    monkeypatch.setattr(gc_bank_data, "BASE_URL", fake.start())
+    try:
+        client = GoCardlessBankDataClient(
+            secret_id="id",
+            secret_key="key",
+            cache=TTLCache(),
+            retry=RetryPolicy(max_retries=10, base_delay=0),
+            breaker=CircuitBreaker(),
+        )
+        store = TransactionStore(str(tmp_path / "tx.db"), batch_size=50)
+
+        requisition = client.create_requisition("http://localhost/", "FAKE_BANK_0")
+        account_ids = client.get_requisition(requisition["id"])["accounts"]
+        assert account_ids == fake.account_ids
+
+        # Five pages of booked transactions, plus the pending ones
+        assert store.sync_account(client, account_ids[0]) == 252
+        assert len(store.list_transactions([account_ids[0]], "2000-01-01")) == 252
+        assert fake.stats()["throttled"]
+    finally:
+        fake.stop()
+
+
+def test_compare_reports_regressions():
+    def run(p99, throughput, errors=0):
+        return {
+            "scenarios": [
+                {
+                    "scenario": "accounts",
+                    "latency_ms": {"p99": p99},
+                    "throughput": throughput,
+                    "errors": errors,
+                }
+            ]
+        }
+
+    assert compare(run(110, 95), run(100, 100), tolerance=0.2) == []
+    assert len(compare(run(150, 50, errors=1), run(100, 100), tolerance=0.2)) == 3
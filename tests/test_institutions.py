@@ -0,0 +1,131 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app import dependencies
+from app.main import app
+from app.services.gc_bank_data import TTLCache
+from app.services.institutions import InstitutionCatalogue, InstitutionIndex
+
+BANKS = [
+    {"id": "BARCLAYS", "name": "Barclays", "bic": "BUKBGB22"},
+    {"id": "HSBC", "name": "HSBC UK Bank", "bic": "HBUKGB4B"},
+    {"id": "MONZO", "name": "Monzo Bank", "bic": "MONZGB2L"},
+    {"id": "SOCGEN", "name": "Société Générale", "bic": "SOGEFRPP"},
+    {"id": "BANKOFSCOTLAND", "name": "Bank of Scotland", "bic": "BOFSGBS1"},
+]
+
+
+class InstitutionsClient:
+    def __init__(self, institutions, fail=()):
+        self.institutions = institutions
+        self.fail = fail
+        self.cache = TTLCache()
+        self.calls = []
+
+    def get_institutions(self, country_code):
+        self.calls.append(country_code)
+        if country_code in self.fail:
+            raise RuntimeError("upstream down")
+        return self.institutions
+
+
+def names(found):
+    return [institution["name"] for institution in found[1]]
+
+
+def test_search_matches_name_and_bic_prefixes():
+    index = InstitutionIndex(BANKS)
+    # Names starting with the query come before other word matches
+    assert names(index.search("bank")) == [
+        "Bank of Scotland",
+        "HSBC UK Bank",
+        "Monzo Bank",
+    ]
+    assert names(index.search("monzgb")) == ["Monzo Bank"]
+    assert names(index.search("societe gen")) == ["Société Générale"]
+    assert names(index.search("uk ba")) == ["HSBC UK Bank"]
+    assert index.search("credit agricole") == (0, [])
+
+
+def test_search_forgives_typos():
+    index = InstitutionIndex(BANKS)
+    assert names(index.search("barclys")) == ["Barclays"]
+    assert names(index.search("scotlnd bank")) == ["Bank of Scotland"]
+
+
+def test_search_pages():
+    index = InstitutionIndex(BANKS)
+    total, page = index.search("", offset=2, limit=2)
+    assert total == 5
+    assert [institution["id"] for institution in page] == ["HSBC", "MONZO"]
+
+
+def test_refresh_stores_due_countries(tmp_path):
+    catalogue = InstitutionCatalogue(
+        str(tmp_path / "institutions.db"), countries=["GB", "FR"], interval=60
+    )
+    client = InstitutionsClient(BANKS, fail=("FR",))
+    assert catalogue.search("GB") is None
+
+    assert catalogue.refresh(client) == ["GB"]
+    assert catalogue.search("gb", "monzo")[0] == 1
+    assert catalogue.search("FR") is None
+
+    # Only the failed country is retried until the interval has passed
+    client.fail = ()
+    assert catalogue.refresh(client) == ["FR"]
+    assert catalogue.refresh(client) == []
+    assert catalogue.refresh(client, now=time.time() + 61) == ["GB", "FR"]
+
+
+def test_workers_see_each_others_refreshes(tmp_path):
+    path = str(tmp_path / "institutions.db")
+    first = InstitutionCatalogue(path, check_interval=0)
+    second = InstitutionCatalogue(path, check_interval=0)
+    first.save("GB", BANKS[:1])
+    assert second.search("GB")[0] == 1
+
+    first.save("GB", BANKS)
+    assert second.search("GB")[0] == 5
+
+
+def test_search_is_fast_on_large_catalogues():
+    index = InstitutionIndex(
+        [
+            {"id": f"BANK_{i}", "name": f"Bank {i} Savings Cooperative", "bic": ""}
+            for i in range(5000)
+        ]
+    )
+    start = time.perf_counter()
+    for query in ("bank 42", "savings", "cooprative", "b"):
+        index.search(query)
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.fixture
+def catalogue_app(tmp_path, monkeypatch):
+    """The app with its institution catalogue in tmp_path"""
+    catalogue = InstitutionCatalogue(str(tmp_path / "institutions.db"))
+    monkeypatch.setattr(dependencies, "_institutions", catalogue)
+    # Without running the lifespan, so no refresh is started
+    return TestClient(app), catalogue
+
+
+def test_picker_is_served_from_the_catalogue(catalogue_app):
+    client, catalogue = catalogue_app
+    catalogue.save("GB", BANKS)
+
+    response = client.get("/setup/institutions/GB")
+    assert response.status_code == 200
+    assert "Barclays" in response.text
+
+    response = client.get(
+        "/setup/institutions/GB/search", params={"q": "bank", "limit": 2}
+    )
+    assert response.status_code == 200
+    assert "Bank of Scotland" in response.text
+    assert "Monzo Bank" not in response.text
+    assert "1 more" in response.text
+
+    response = client.get("/setup/institutions/XX/search", params={"q": "bank"})
+    assert response.status_code == 404
@@ -0,0 +1,73 @@
+import logging
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.services.concurrency import run_concurrently
+from app.services.metrics import MetricsMiddleware, Registry, record_upstream, span
+from app.services.structured_logging import StructuredFormatter
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: str):
+        with span("parse"):
+            time.sleep(0.01)
+        # Calls made on worker threads count towards the request too
+        run_concurrently(
+            lambda endpoint: record_upstream(endpoint, 200, 0.02),
+            ["account_details", "account_balances"],
+        )
+        return {"id": item_id}
+
+    return app
+
+
+def test_middleware_reports_spans_in_server_timing():
+    client = TestClient(make_app())
+    response = client.get("/items/a", headers={"X-Request-ID": "req-1"})
+
+    timing = dict(
+        entry.split(";", 1)[0:2]
+        for entry in response.headers["server-timing"].split(", ")
+    )
+    assert set(timing) == {"parse", "upstream", "total"}
+    assert 'desc="2x"' in timing["upstream"]
+    assert float(timing["parse"].split("dur=")[1].split(";")[0]) >= 10
+    assert response.headers["x-request-id"] == "req-1"
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    duration = registry.histogram("duration_seconds", "Duration", buckets=(0.1, 1.0))
+    requests.inc('/a"b')
+    duration.observe(0.05)
+    duration.observe(0.5)
+    duration.observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a\\"b"} 1' in lines
+    assert 'duration_seconds_bucket{le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{le="1.0"} 2' in lines
+    assert 'duration_seconds_bucket{le="+Inf"} 3' in lines
+    assert "duration_seconds_count 3" in lines
+
+
+def test_structured_formatter_includes_extra_fields():
+    record = logging.makeLogRecord(
+        {
+            "name": "app.test",
+            "levelname": "WARNING",
+            "msg": "Error syncing transactions",
+            "account_id": "acc",
+        }
+    )
+    assert (
+        StructuredFormatter(as_json=False)
+        .format(record)
+        .endswith("WARNING app.test Error syncing transactions account_id=acc")
+    )
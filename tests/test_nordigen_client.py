@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+import httpx
+from app.services.gc_bank_data import (
+    GoCardlessBankDataClient,
+    GoCardlessTokenManager,
+    TTLCache,
+)
+from app.services.gc_bank_data_async import AsyncGoCardlessBankDataClient
+
+
+def make_client(handler):
+    return AsyncGoCardlessBankDataClient(
+        secret_id="id",
+        secret_key="key",
+        cache=TTLCache(),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+def test_async_client_fetches_token_once_for_concurrent_calls():
+    token_calls = []
+
+    def handler(request):
+        if request.url.path.endswith("/token/new/"):
+            token_calls.append(request)
+            return httpx.Response(
+                200,
+                json={
+                    "access": "access-token",
+                    "refresh": "refresh-token",
+                    "access_expires": 3600,
+                    "refresh_expires": 7200,
+                },
+            )
+        assert request.headers["Authorization"] == "Bearer access-token"
+        return httpx.Response(200, json={"id": request.url.path.split("/")[-2]})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            return await asyncio.gather(
+                client.get_account_details("a"), client.get_account_details("b")
+            )
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()) == [{"id": "a"}, {"id": "b"}]
+    assert len(token_calls) == 1
+
+
+def test_async_client_refreshes_expired_access_token():
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path.endswith("/token/refresh/"):
+            return httpx.Response(200, json={"access": "new", "access_expires": 60})
+        return httpx.Response(200, json={"balances": []})
+
+    async def run():
+        client = make_client(handler)
+        now = int(time.time())
+        await client.load_tokens_from_dict(
+            {
+                "access_token": "old",
+                "refresh_token": "refresh",
+                "token_expires": now - 1,
+                "refresh_expires": now + 3600,
+            }
+        )
+        await client.get_account_balances("a")
+        await client.close()
+        return client.access_token
+
+    assert asyncio.run(run()) == "new"
+    assert paths[0].endswith("/token/refresh/")
+
+
+def test_response_cache_counts_hits_and_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttls={"account_details": 60})
+    calls = []
+
+    def fetch(account_id):
+        calls.append(account_id)
+        return {"id": account_id}
+
+    cache.get_or_fetch("account_details", "a", lambda: fetch("a"))
+    cache.get_or_fetch("account_details", "b", lambda: fetch("b"))
+    cache.get_or_fetch("account_details", "a", lambda: fetch("a"))
+    # "b" is now least recently used and gets evicted
+    cache.get_or_fetch("account_details", "c", lambda: fetch("c"))
+    cache.get_or_fetch("account_details", "b", lambda: fetch("b"))
+
+    assert calls == ["a", "b", "c", "b"]
+    stats = cache.stats()
+    assert stats["endpoints"]["account_details"]["hits"] == 1
+    assert stats["endpoints"]["account_details"]["misses"] == 4
+    assert stats["evictions"] == 2
+
+
+def test_response_cache_invalidates_endpoint():
+    cache = TTLCache(ttls={"account_balances": 60, "institutions": 60})
+    cache.set("account_balances", "a", {"balances": []})
+    cache.set("institutions", "gb", [])
+
+    cache.invalidate("account_balances")
+
+    assert cache.get("account_balances", "a") == (False, None)
+    assert cache.get("institutions", "gb") == (True, [])
+
+
+class TokenResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, access):
+        self.access = access
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {
+            "access": self.access,
+            "refresh": "refresh",
+            "access_expires": 3600,
+            "refresh_expires": 7200,
+        }
+
+
+def test_token_manager_refreshes_once_for_concurrent_threads():
+    saved = []
+    calls = []
+    tokens = GoCardlessTokenManager("id", "key", on_update=saved.append)
+
+    def post(url, payload):
+        calls.append(url)
+        time.sleep(0.05)
+        return TokenResponse(f"token-{len(calls)}")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(tokens.get_token(post)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and calls[0].endswith("/token/new/")
+    assert results == ["token-1"] * 8
+    assert saved == [tokens.to_dict()]
+
+
+def test_token_manager_is_shared_between_clients():
+    tokens = GoCardlessTokenManager("id", "key")
+    tokens.load(
+        {
+            "access_token": "saved",
+            "refresh_token": "refresh",
+            "token_expires": int(time.time()) + 3600,
+            "refresh_expires": int(time.time()) + 7200,
+        }
+    )
+
+    def handler(request):
+        assert not request.url.path.startswith("/api/v2/token/")
+        assert request.headers["Authorization"] == "Bearer saved"
+        return httpx.Response(200, json={"balances": []})
+
+    async def run():
+        client = AsyncGoCardlessBankDataClient(
+            cache=TTLCache(), transport=httpx.MockTransport(handler), tokens=tokens
+        )
+        try:
+            return await client.get_account_balances("a")
+        finally:
+            await client.close()
+
+    # A restart with saved tokens doesn't need a token call
+    assert asyncio.run(run()) == {"balances": []}
+
+
+def page(count):
+    return {"transactions": {"booked": [{}] * count, "pending": []}}
+
+
+def test_next_page_is_requested_before_the_current_one_is_handed_over():
+    requested = {offset: threading.Event() for offset in (0, 2, 4)}
+
+    class PagedClient(GoCardlessBankDataClient):
+        def get_account_transactions_paginated(
+            self, account_id, date_from=None, date_to=None, limit=100, offset=0
+        ):
+            requested[offset].set()
+            return page(2 if offset < 4 else 1)
+
+    pages = PagedClient(cache=TTLCache()).iter_account_transaction_pages(
+        "acc", batch_size=2
+    )
+    assert len(next(pages)["booked"]) == 2
+    # The caller still holds page 0, and page 1 is already on its way
+    assert requested[2].wait(1)
+    next(pages)
+    assert requested[4].wait(1)
+    assert len(next(pages)["booked"]) == 1
+    assert next(pages, None) is None
+
+
+def test_async_next_page_is_requested_before_the_current_one_is_handed_over():
+    async def main():
+        requested = {offset: asyncio.Event() for offset in (0, 2, 4)}
+
+        class PagedClient(AsyncGoCardlessBankDataClient):
+            async def get_account_transactions_paginated(
+                self, account_id, date_from=None, date_to=None, limit=100, offset=0
+            ):
+                requested[offset].set()
+                return page(2 if offset < 4 else 1)
+
+        pages = PagedClient(cache=TTLCache()).iter_account_transaction_pages(
+            "acc", batch_size=2
+        )
+        assert len((await pages.__anext__())["booked"]) == 2
+        # The caller still holds page 0, and page 1 is already on its way
+        await asyncio.wait_for(requested[2].wait(), 1)
+        await pages.__anext__()
+        await asyncio.wait_for(requested[4].wait(), 1)
+        assert len((await pages.__anext__())["booked"]) == 1
+        assert [rest async for rest in pages] == []
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.services.gc_bank_data import GoCardlessTokenManager, TTLCache
+from app.services.gc_bank_data_async import AsyncGoCardlessBankDataClient
+from app.services.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def make_client(handler, breaker, cache=None):
+    tokens = GoCardlessTokenManager("id", "key")
+    tokens.load({"access_token": "token", "token_expires": int(time.time()) + 3600})
+    return AsyncGoCardlessBankDataClient(
+        cache=cache or TTLCache(),
+        transport=httpx.MockTransport(handler),
+        tokens=tokens,
+        retry=RetryPolicy(max_retries=2, base_delay=0, max_retry_after=1),
+        breaker=breaker,
+    )
+
+
+def run(client, call):
+    async def main():
+        try:
+            return await call(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(main())
+
+
+def test_retries_server_errors_and_rate_limits():
+    statuses = [503, 429]
+
+    def handler(request):
+        if statuses:
+            return httpx.Response(statuses.pop(0), headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"balances": []})
+
+    client = make_client(handler, CircuitBreaker())
+    assert run(client, lambda c: c.get_account_balances("a")) == {"balances": []}
+    assert statuses == []
+
+
+def test_long_retry_after_fails_without_waiting():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"Retry-After": "3600"})
+
+    client = make_client(handler, CircuitBreaker())
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client, lambda c: c.get_account_balances("a"))
+    assert len(calls) == 1
+
+
+def test_open_circuit_fails_fast_and_serves_stale_cache():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    cache = TTLCache(ttls={"account_balances": 60})
+    cache.set("account_balances", "a", {"balances": ["stale"]})
+    # Expire the entry without removing it
+    cache._entries[("account_balances", "a")] = (0, {"balances": ["stale"]})
+
+    client = make_client(handler, breaker, cache)
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client, lambda c: c.get_account_transactions("a"))
+    assert len(calls) == 3
+    assert breaker.status()["gocardless"]["open"]
+
+    client = make_client(handler, breaker, cache)
+    with pytest.raises(CircuitOpenError):
+        run(client, lambda c: c.get_account_transactions("a"))
+    client = make_client(handler, breaker, cache)
+    assert run(client, lambda c: c.get_account_balances("a")) == {"balances": ["stale"]}
+    assert len(calls) == 3
+
+
+def test_circuit_breaker_lets_one_trial_through_after_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure("bank")
+
+    breaker.before_call("bank")
+    breaker.record_success("bank")
+    breaker.before_call("bank")
+    assert breaker.status() == {}
@@ -0,0 +1,84 @@
+import time
+from app.services.gc_bank_data import RateLimitTracker
+from app.services.scheduler import SyncScheduler
+from app.services.transaction_store import TransactionStore
+from tests.test_transaction_store import FakeClient, make_tx
+
+
+class SnapshotClient(FakeClient):
+    details_calls = 0
+
+    def get_account_details(self, account_id):
+        self.details_calls += 1
+        return {"account": {"name": "Current"}}
+
+    def get_account_balances(self, account_id):
+        return {"balances": []}
+
+
+def make_scheduler(tmp_path, tracker, interval=3600):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    client = SnapshotClient([make_tx("a", "2024-01-01")])
+    return SyncScheduler(
+        client, store, lambda: ["acc"], interval=interval, tracker=tracker
+    )
+
+
+def test_run_once_refreshes_new_accounts_then_waits(tmp_path):
+    scheduler = make_scheduler(tmp_path, RateLimitTracker())
+
+    assert sorted(scheduler.run_once()) == [
+        ("acc", "balances"),
+        ("acc", "transactions"),
+    ]
+    assert scheduler.store.get_account_snapshots(["acc"])["acc"]["details"] == {
+        "account": {"name": "Current"}
+    }
+    assert scheduler.run_once() == []
+
+
+def test_remaining_quota_is_spread_until_reset(tmp_path):
+    tracker = RateLimitTracker()
+    scheduler = make_scheduler(tmp_path, tracker, interval=60)
+    scheduler.run_once()
+    synced_at = scheduler.last_success("acc", "transactions")
+
+    # 3 calls left, one kept in reserve, quota resets in 8 hours
+    tracker.record(
+        "https://bank/api/v2/accounts/acc/transactions/",
+        200,
+        {
+            "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_REMAINING": "3",
+            "HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET": str(8 * 3600),
+        },
+    )
+    next_run = scheduler.next_run_at("acc", "transactions")
+    assert abs(next_run - (synced_at + 4 * 3600)) < 5
+
+    # Only the reserve left: wait for the reset
+    tracker.record(
+        "https://bank/api/v2/accounts/acc/transactions/",
+        429,
+        {"HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET": "600"},
+    )
+    assert abs(scheduler.next_run_at("acc", "transactions") - (time.time() + 600)) < 5
+
+
+def test_balances_refresh_keeps_details_when_their_quota_is_spent(tmp_path):
+    tracker = RateLimitTracker()
+    scheduler = make_scheduler(tmp_path, tracker, interval=60)
+    scheduler.run_once()
+    assert scheduler.client.details_calls == 1
+    synced_at = scheduler.last_success("acc", "balances")
+
+    # Balances still have quota, details have none to spare
+    tracker.record(
+        "https://bank/api/v2/accounts/acc/",
+        429,
+        {"HTTP_X_RATELIMIT_ACCOUNT_SUCCESS_RESET": "600"},
+    )
+    assert ("acc", "balances") in scheduler.run_once(now=time.time() + 61)
+    assert scheduler.client.details_calls == 1
+    snapshot = scheduler.store.get_account_snapshots(["acc"])["acc"]
+    assert snapshot["synced_at"] > synced_at
+    assert snapshot["details"] == {"account": {"name": "Current"}}
@@ -0,0 +1,21 @@
+import json
+from app.models.transaction import TransactionRecord
+from app.routers.transactions import TransactionResponse
+from app.services.serialization import fast_json_response
+
+
+def test_fast_json_matches_response_model_encoding():
+    records = [
+        TransactionRecord("a", "acc", -1234, "EUR", "Coffee", 19723, None, None),
+        TransactionRecord("b", "acc", 250000, "EUR", "Salary", 19724, 19725, "Income"),
+    ]
+
+    response = fast_json_response(
+        [record.to_dict() for record in records], {"X-Snapshot-Age": "5"}
+    )
+
+    assert json.loads(response.body) == [
+        TransactionResponse(**record.to_dict()).model_dump(mode="json")
+        for record in records
+    ]
+    assert response.headers["X-Snapshot-Age"] == "5"
@@ -0,0 +1,111 @@
+import time
+from fastapi.testclient import TestClient
+from app import dependencies, main
+from app.main import app
+from app.services import gc_bank_data, gc_bank_data_async
+from app.services.sessions import SessionStore, load_secret, sign, unsign
+from app.services.users import UserStore
+from benchmarks.fake_gocardless import FakeGoCardless
+
+
+def test_signed_values_cannot_be_altered():
+    signed = sign("session", b"key")
+    assert unsign(signed, b"key") == "session"
+    assert unsign(signed, b"other key") is None
+    assert unsign("other" + signed[7:], b"key") is None
+    assert unsign("session", b"key") is None
+
+
+def test_workers_share_the_secret_and_sessions(tmp_path, monkeypatch):
+    monkeypatch.delenv("SESSION_SECRET", raising=False)
+    secret = load_secret(str(tmp_path / "secret"))
+    assert load_secret(str(tmp_path / "secret")) == secret
+
+    first = SessionStore(str(tmp_path / "sessions.db"), secret)
+    second = SessionStore(str(tmp_path / "sessions.db"), secret)
+    session_id = first.create({"requisition_id": "req"})
+    assert second.session_id(first.cookie_value(session_id)) == session_id
+    assert second.get(session_id) == {"requisition_id": "req"}
+
+    assert second.save(session_id, {"requisition_id": "req", "accounts": ["a"]})
+    assert first.get(session_id)["accounts"] == ["a"]
+    first.delete(session_id)
+    assert second.get(session_id) is None
+
+
+def test_sessions_expire(tmp_path):
+    sessions = SessionStore(str(tmp_path / "sessions.db"), b"key", ttl=0.05)
+    session_id = sessions.create({})
+    time.sleep(0.1)
+
+    assert sessions.get(session_id) is None
+    assert not sessions.save(session_id, {})
+    # Expired sessions are removed when the next one is created
+    sessions.create({})
+    with sessions._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+
+
+def test_setup_continues_on_another_worker(tmp_path, monkeypatch):
+    fake = FakeGoCardless(accounts=2, transactions=0, latency_ms=0, jitter_ms=0)
+    base_url = fake.start()
+    monkeypatch.setattr(gc_bank_data, "BASE_URL", base_url)
+    monkeypatch.setattr(gc_bank_data_async, "BASE_URL", base_url)
+    monkeypatch.setattr(main, "BACKGROUND_SYNC", False)
+    monkeypatch.setattr(dependencies, "SESSIONS_DB", str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(dependencies, "SESSION_SECRET_FILE", str(tmp_path / "secret"))
+    monkeypatch.setattr(dependencies, "USERS_DIR", str(tmp_path / "users"))
+    monkeypatch.setattr(
+        dependencies, "_users", UserStore(str(tmp_path / "users.db"), iterations=1000)
+    )
+    for name in ("_sessions", "_user_pool", "_session", "_http"):
+        monkeypatch.setattr(dependencies, name, None)
+
+    try:
+        with TestClient(app) as client:
+            token = client.post(
+                "/auth/register",
+                json={"email": "ann@example.com", "password": "correct horse"},
+            ).json()["token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            response = client.post(
+                "/setup/start-bank-link/FAKE_BANK_0", headers=headers
+            )
+            assert response.status_code == 200
+
+            # The callback lands on a worker that has never seen the session
+            monkeypatch.setattr(dependencies, "_sessions", None)
+            response = client.get("/setup/bank-callback", headers=headers)
+            assert response.status_code == 200
+            assert "Fake account 0" in response.text
+
+            # Accounts outside this bank link can't be selected
+            response = client.post(
+                "/setup/complete-setup",
+                data={"account_ids": [fake.account_ids[0], "someone-elses-account"]},
+                headers=headers,
+            )
+            assert response.status_code == 400
+            user_id = client.get("/auth/me", headers=headers).json()["id"]
+            assert not dependencies.get_user_pool().get(user_id).config.exists
+
+            response = client.post(
+                "/setup/complete-setup",
+                data={"account_ids": fake.account_ids},
+                headers=headers,
+            )
+            assert response.status_code == 200
+            config = dependencies.get_user_pool().get(user_id).config
+            assert config.get("selected_accounts") == fake.account_ids
+
+            # The session ended with the setup
+            response = client.get("/setup/bank-callback", headers=headers)
+            assert response.status_code == 400
+
+            response = client.delete("/setup/reset", headers=headers)
+            assert response.status_code == 200
+            assert not config.exists
+    finally:
+        dependencies.get_user_pool().close()
+        fake.stop()
@@ -0,0 +1,358 @@
+from datetime import date
+import time
+from app.services.concurrency import run_concurrently
+from app.services.gc_bank_data import GoCardlessBankDataClient
+from app.services.transaction_store import TransactionStore, parse_transaction
+
+
+def make_tx(tx_id, booking_date, amount="-10.00", description="Coffee"):
+    return {
+        "internalTransactionId": tx_id,
+        "bookingDate": booking_date,
+        "valueDate": booking_date,
+        "transactionAmount": {"amount": amount, "currency": "EUR"},
+        "remittanceInformationUnstructured": description,
+    }
+
+
+class FakeClient(GoCardlessBankDataClient):
+    """Serves fixed lists of transactions, honouring date_from and pagination."""
+
+    def __init__(self, booked, pending=None):
+        super().__init__()
+        self.booked = booked
+        self.pending = pending or []
+        self.calls = []
+
+    def get_account_transactions_paginated(
+        self, account_id, date_from=None, date_to=None, limit=100, offset=0
+    ):
+        self.calls.append({"date_from": date_from, "offset": offset})
+        booked = [
+            tx for tx in self.booked if not date_from or tx["bookingDate"] >= date_from
+        ]
+        pending = self.pending if offset == 0 else []
+        return {
+            "transactions": {
+                "booked": booked[offset : offset + limit],
+                "pending": pending,
+            }
+        }
+
+
+def test_sync_reads_all_pages(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"), batch_size=2)
+    client = FakeClient(
+        [make_tx(str(i), f"2024-01-0{i}") for i in range(1, 6)],
+    )
+
+    assert store.sync_account(client, "acc") == 5
+    assert [c["offset"] for c in client.calls] == [0, 2, 4]
+
+    rows = store.list_transactions(["acc"])
+    assert [row["id"] for row in rows] == ["5", "4", "3", "2", "1"]
+    assert rows[0]["amount"] == -10.0
+
+
+def test_incremental_sync_starts_at_last_booking_date(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    client = FakeClient([make_tx("a", "2024-01-01"), make_tx("b", "2024-01-03")])
+    store.sync_account(client, "acc")
+
+    client.booked.append(make_tx("c", "2024-01-03"))
+    client.calls.clear()
+
+    assert store.sync_account(client, "acc") == 2
+    assert client.calls[0]["date_from"] == "2024-01-03"
+    assert len(store.list_transactions(["acc"])) == 3
+    assert not store.needs_sync("acc", max_age=60)
+
+
+def test_list_transactions_filters_dates(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.sync_account(
+        FakeClient([make_tx("a", "2024-01-01"), make_tx("b", "2024-02-01")]), "acc"
+    )
+
+    rows = store.list_transactions(["acc"], date_from="2024-01-15")
+    assert [row["id"] for row in rows] == ["b"]
+
+
+def test_iter_transactions_yields_batches(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.sync_account(
+        FakeClient([make_tx(str(i), f"2024-01-0{i}") for i in range(1, 6)]), "acc"
+    )
+
+    batches = list(store.iter_transactions(["acc"], batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0]["id"] == "5"
+
+
+def test_monthly_rollups_follow_syncs(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    client = FakeClient(
+        [
+            make_tx("a", "2024-01-05", amount="-10.10"),
+            make_tx("b", "2024-01-20", amount="2500.00", description="Salary"),
+            make_tx("c", "2024-02-01", amount="-0.20"),
+        ]
+    )
+    store.sync_account(client, "acc")
+
+    rollups = store.monthly_rollups(["acc"])
+    assert [(r["month"], r["income"], r["expenses"], r["count"]) for r in rollups] == [
+        ("2024-01", 2500.0, -10.1, 2),
+        ("2024-02", 0.0, -0.2, 1),
+    ]
+
+    # A corrected booking date moves the transaction to another month
+    client.booked = [make_tx("c", "2024-03-01", amount="-0.20")]
+    store.sync_account(client, "acc")
+
+    months = [r["month"] for r in store.monthly_rollups(["acc"])]
+    assert months == ["2024-01", "2024-03"]
+    assert store.monthly_rollups(["acc"], month_from="2024-02")[0]["net"] == -0.2
+
+
+def test_rule_changes_only_recategorize_affected_transactions(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.sync_account(
+        FakeClient(
+            [
+                make_tx("a", "2024-01-01", description="TESCO STORES"),
+                make_tx("b", "2024-01-02", description="Shell fuel"),
+            ]
+        ),
+        "acc",
+    )
+
+    groceries, changed = store.add_rule(
+        {"category": "Groceries", "kind": "substring", "pattern": "tesco"}
+    )
+    assert changed == 1
+    categories = {
+        row["id"]: row["category"] for row in store.list_transactions(["acc"])
+    }
+    assert categories == {"a": "Groceries", "b": None}
+    assert {r["category"] for r in store.monthly_rollups(["acc"])} == {
+        "Groceries",
+        None,
+    }
+
+    # A lower-precedence rule can't take over "a"
+    _, changed = store.add_rule(
+        {"category": "Other", "kind": "regex", "pattern": ".", "priority": 200}
+    )
+    assert changed == 1
+
+    assert store.delete_rule(groceries["id"]) == 1
+    categories = {
+        row["id"]: row["category"] for row in store.list_transactions(["acc"])
+    }
+    assert categories == {"a": "Other", "b": "Other"}
+
+
+def test_list_records_matches_list_transactions(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    store.sync_account(
+        FakeClient([make_tx("a", "2024-01-01", "-0.29"), make_tx("b", "2024-02-29")]),
+        "acc",
+    )
+
+    records = store.list_records(["acc"])
+    assert [record.to_dict() for record in records] == [
+        {
+            **row,
+            "booking_date": date.fromisoformat(row["booking_date"]),
+            "value_date": date.fromisoformat(row["value_date"]),
+        }
+        for row in store.list_transactions(["acc"])
+    ]
+    assert records[1].amount_minor == -29
+    assert records[0].currency is records[1].currency
+
+
+def test_keyset_pages_cover_all_filtered_transactions(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    booked = [
+        make_tx(f"{i:02d}", f"2024-01-0{1 + i % 3}", f"-{i}.00", f"Shop {i % 2}")
+        for i in range(10)
+    ]
+    store.sync_account(FakeClient(booked), "acc")
+
+    pages, after = [], None
+    while True:
+        page = store.list_records(["acc"], text="shop 1", after=after, limit=2)
+        if not page:
+            break
+        pages.append([record.id for record in page])
+        last = page[-1]
+        after = (last.booking_date.isoformat(), last.id, last.account_id)
+
+    everything = [row["id"] for row in store.list_transactions(["acc"], text="shop 1")]
+    assert [tx_id for page in pages for tx_id in page] == everything
+    assert sorted(everything) == ["01", "03", "05", "07", "09"]
+    assert [
+        row["id"]
+        for row in store.list_transactions(["acc"], min_amount=-3, max_amount=-2)
+    ] == ["02", "03"]
+    assert store.list_transactions(["acc"], status="pending") == []
+
+
+def test_search_matches_prefixes_and_labels(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    client = FakeClient(
+        [
+            make_tx("a", "2024-01-01", description="Coffee Shop Central"),
+            make_tx("b", "2024-01-02", description="Café Nero"),
+            make_tx("c", "2024-01-03", description="Train ticket"),
+        ]
+    )
+    store.sync_account(client, "acc")
+
+    assert [r.id for r in store.search(["acc"], "coff sho")] == ["a"]
+    assert [r.id for r in store.search(["acc"], "cafe")] == ["b"]
+    assert store.search(["other"], "coffee") == []
+
+    assert store.set_labels("acc", "c", ["work", " work ", "travel"]) == [
+        "work",
+        "travel",
+    ]
+    assert store.set_labels("acc", "missing", ["work"]) is None
+    assert [r.labels for r in store.search(["acc"], "work")] == [("work", "travel")]
+
+    # Labels survive a re-sync and the index follows description changes
+    client.booked[2] = make_tx("c", "2024-01-03", description="Bus ticket")
+    store.sync_account(client, "acc")
+    assert [r.id for r in store.search(["acc"], "bus work")] == ["c"]
+    assert store.search(["acc"], "train") == []
+
+
+def test_pages_walk_the_list_order_index(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    for account_id in ("a", "b"):
+        store.add_transactions(
+            account_id,
+            [
+                parse_transaction(account_id, make_tx(str(i), f"2024-01-{i:02d}"))
+                for i in range(1, 29)
+            ],
+        )
+
+    accounts = ["a", "b"]
+    pages = [
+        {"text": "coffee"},
+        {"category": "Uncategorized"},
+        {"min_amount": -20, "after": ("2024-01-15", "15", "a")},
+    ]
+    for filters in [{}, *pages]:
+        query, params = store._select_transactions(
+            accounts, "2000-01-01", "2099-12-31", limit=10, **filters
+        )
+        with store._connect() as conn:
+            plan = " ".join(
+                row["detail"]
+                for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            )
+        assert "TEMP B-TREE" not in plan, (filters, plan)
+
+    # The text filter goes through the full-text index
+    store.set_labels("a", "3", ["holiday"])
+    records = store.list_records(accounts, text="coff holi")
+    assert [(r.account_id, r.id) for r in records] == [("a", "3")]
+
+
+def make_pending(value_date, amount="-10.00", description="CARD PAYMENT Cafe"):
+    # Pending transactions often come without ids or booking date
+    return {
+        "valueDate": value_date,
+        "transactionAmount": {"amount": amount, "currency": "EUR"},
+        "creditorName": "Cafe Central",
+        "remittanceInformationUnstructured": description,
+    }
+
+
+def test_pending_transaction_is_booked_in_place(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    client = FakeClient([make_tx("a", "2024-01-01")], [make_pending("2024-01-02")])
+    store.sync_account(client, "acc")
+
+    (pending,) = store.list_transactions(["acc"], status="pending")
+    store.set_labels("acc", pending["id"], ["trip"])
+    assert [r["count"] for r in store.monthly_rollups(["acc"])] == [1]
+
+    # The bank books it two days later, with an id and a new description
+    booked = make_tx("b", "2024-01-04", description="Cafe Central Vienna")
+    booked["creditorName"] = "Cafe Central"
+    client.booked.append(booked)
+    client.pending = []
+    store.sync_account(client, "acc")
+
+    rows = store.list_transactions(["acc"])
+    assert [(r["id"], r["status"], r["labels"]) for r in rows] == [
+        ("b", "booked", ["trip"]),
+        ("a", "booked", []),
+    ]
+    assert [r["count"] for r in store.monthly_rollups(["acc"])] == [2]
+
+
+def test_repeated_syncs_are_idempotent(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"))
+    tx = make_tx("a", "2024-01-01")
+    client = FakeClient([tx, tx], [make_pending("2024-01-02")])
+    store.sync_account(client, "acc")
+    revision = store.get_revision()
+    rows = store.list_transactions(["acc"])
+    assert len(rows) == 2
+
+    # Nothing changed at the bank, so nothing is written
+    store.sync_account(client, "acc")
+    assert store.get_revision() == revision
+    assert store.list_transactions(["acc"]) == rows
+
+    # A pending transaction the bank no longer lists was cancelled
+    client.pending = []
+    store.sync_account(client, "acc")
+    assert [r["id"] for r in store.list_transactions(["acc"])] == ["a"]
+    assert store.get_revision() > revision
+
+
+def test_stores_opened_at_once_migrate_once(tmp_path):
+    path = str(tmp_path / "tx.db")
+    stores = run_concurrently(lambda _: TransactionStore(path), range(8))
+    assert [error for _, _, error in stores if error is not None] == []
+
+    store = TransactionStore(path)
+    store.sync_account(FakeClient([make_tx("a", "2024-01-01")]), "acc")
+    assert store.search(["acc"], "coffee")[0].id == "a"
+
+
+class SlowClient(FakeClient):
+    """Takes a while to serve each page, like a real bank."""
+
+    def __init__(self, booked, delay):
+        super().__init__(booked)
+        self.delay = delay
+
+    def get_account_transactions_paginated(self, account_id, *args, **kwargs):
+        time.sleep(self.delay)
+        return super().get_account_transactions_paginated(account_id, *args, **kwargs)
+
+
+def test_concurrent_syncs_do_not_wait_for_each_others_bank_calls(tmp_path):
+    store = TransactionStore(str(tmp_path / "tx.db"), batch_size=2)
+    client = SlowClient(
+        [make_tx(str(i), f"2024-01-0{i + 1}") for i in range(5)], delay=0.1
+    )
+    accounts = ["a", "b", "c", "d"]
+
+    start = time.perf_counter()
+    results = run_concurrently(lambda acc: store.sync_account(client, acc), accounts)
+    elapsed = time.perf_counter() - start
+
+    assert [error for _, _, error in results] == [None] * 4
+    assert len(store.list_transactions(accounts)) == 20
+    # 3 pages per account. Holding the write lock across bank calls would
+    # take 4 x 3 x 0.1s.
+    assert elapsed < 0.8
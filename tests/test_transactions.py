@@ -0,0 +1,38 @@
+import asyncio
+import httpx
+from app import dependencies
+from app.main import app
+from app.services import gc_bank_data
+from app.services.user_pool import UserContext
+from benchmarks.fake_gocardless import FakeGoCardless
+
+
+def test_concurrent_requests_share_each_accounts_sync(tmp_path, monkeypatch):
+    # One page of transactions per account
+    fake = FakeGoCardless(accounts=3, transactions=10, latency_ms=50, jitter_ms=0)
+    monkeypatch.setattr(gc_bank_data, "BASE_URL", fake.start())
+    context = UserContext(
+        None, str(tmp_path / "user_config.json"), str(tmp_path / "transactions.db")
+    )
+    context.config.save({"selected_accounts": fake.account_ids})
+    monkeypatch.setattr(dependencies, "_default_context", context)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                *(client.get("/transactions/") for _ in range(10))
+            )
+
+    try:
+        responses = asyncio.run(main())
+    finally:
+        context.close()
+        fake.stop()
+
+    for response in responses:
+        assert response.status_code == 200
+        assert len(response.json()) == 3 * 12
+    assert fake.calls["account_transactions"] == 3
@@ -0,0 +1,139 @@
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from app import dependencies
+from app.main import app
+from app.services.user_pool import UserContext, UserPool
+from app.services.users import UserStore, hash_password, verify_password
+
+
+@pytest.fixture
+def users_app(tmp_path, monkeypatch):
+    """The app with its users and their files in tmp_path"""
+    monkeypatch.setattr(dependencies, "USERS_DIR", str(tmp_path / "users"))
+    monkeypatch.setattr(
+        dependencies, "_users", UserStore(str(tmp_path / "users.db"), iterations=1000)
+    )
+    monkeypatch.setattr(dependencies, "_user_pool", None)
+    # Without running the lifespan, so no background sync is started
+    yield TestClient(app)
+    dependencies.get_user_pool().close()
+
+
+def register(client, email):
+    response = client.post(
+        "/auth/register", json={"email": email, "password": "correct horse"}
+    )
+    assert response.status_code == 201
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def test_password_hashes_are_salted():
+    first, second = hash_password("secret", 1000), hash_password("secret", 1000)
+    assert first != second
+    assert verify_password("secret", first)
+    assert not verify_password("Secret", first)
+    assert not verify_password("secret", "not a hash")
+
+
+def test_tokens_identify_users_until_revoked(tmp_path):
+    users = UserStore(str(tmp_path / "users.db"), iterations=1000)
+    user = users.create_user("ann@example.com", "correct horse")
+    assert users.create_user("ANN@example.com", "other password") is None
+
+    assert users.authenticate("ann@example.com", "wrong") is None
+    assert users.authenticate("Ann@Example.com", "correct horse") == user
+
+    token = users.create_token(user["id"])
+    assert users.user_for_token(token) == user
+    users.revoke_token(token)
+    assert users.user_for_token(token) is None
+
+
+def test_pool_evicts_least_recently_used_users(tmp_path):
+    built = []
+
+    def build(user_id):
+        built.append(user_id)
+        return UserContext(
+            user_id,
+            str(tmp_path / user_id / "user_config.json"),
+            str(tmp_path / user_id / "transactions.db"),
+        )
+
+    pool = UserPool(build, max_size=2)
+    a = pool.get("a")
+    pool.get("b")
+    assert pool.get("a") is a
+    pool.get("c")  # Evicts b, the least recently used
+
+    assert pool.get("a") is a
+    pool.get("b")
+    assert built == ["a", "b", "c", "b"]
+    assert pool.stats()["evictions"] == 2
+    pool.close()
+
+
+def test_building_a_context_only_holds_up_that_user(tmp_path):
+    built = []
+    started, release = threading.Event(), threading.Event()
+
+    def build(user_id):
+        built.append(user_id)
+        if user_id == "slow":
+            # Like opening and migrating a big store
+            started.set()
+            assert release.wait(5)
+        return UserContext(
+            user_id,
+            str(tmp_path / user_id / "user_config.json"),
+            str(tmp_path / user_id / "transactions.db"),
+        )
+
+    pool = UserPool(build)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        slow = [executor.submit(pool.get, "slow") for _ in range(2)]
+        assert started.wait(5)
+        assert pool.get("fast").user_id == "fast"
+        release.set()
+        assert slow[0].result() is slow[1].result()
+
+    assert sorted(built) == ["fast", "slow"]
+    pool.close()
+
+
+def test_users_have_their_own_setup(users_app):
+    ann = register(users_app, "ann@example.com")
+    bob = register(users_app, "bob@example.com")
+    assert users_app.get("/auth/me", headers=ann).json()["email"] == "ann@example.com"
+
+    # Only Ann has completed setup
+    pool = dependencies.get_user_pool()
+    ann_id = users_app.get("/auth/me", headers=ann).json()["id"]
+    pool.get(ann_id).config.save({"selected_accounts": []})
+
+    assert users_app.get("/accounts/", headers=ann).json() == []
+    assert users_app.get("/accounts/", headers=bob).status_code == 400
+
+    # The clients share one connection pool
+    bob_id = users_app.get("/auth/me", headers=bob).json()["id"]
+    assert pool.get(ann_id).client.session is pool.get(bob_id).client.session
+
+    # Accounts of other users are not served
+    pool.get(ann_id).config.save({"selected_accounts": ["ann-account"]})
+    response = users_app.get(
+        "/transactions/", params={"account_id": "bob-account"}, headers=ann
+    )
+    assert response.status_code == 404
+
+
+def test_invalid_logins_are_rejected(users_app):
+    register(users_app, "ann@example.com")
+    response = users_app.post(
+        "/auth/login", json={"email": "ann@example.com", "password": "wrong password"}
+    )
+    assert response.status_code == 401
+
+    response = users_app.get("/budgets/", headers={"Authorization": "Bearer nope"})
+    assert response.status_code == 401
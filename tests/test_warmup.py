@@ -0,0 +1,82 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import analytics, gc_bank_data
+from app.services.user_pool import UserContext
+from app.services.warmup import Warmup
+from benchmarks.fake_gocardless import FakeGoCardless
+
+
+def make_context(tmp_path, account_ids):
+    context = UserContext(
+        None, str(tmp_path / "user_config.json"), str(tmp_path / "transactions.db")
+    )
+    context.config.save({"selected_accounts": account_ids})
+    return context
+
+
+def test_warmup_syncs_accounts_then_starts(tmp_path, monkeypatch):
+    fake = FakeGoCardless(accounts=2, transactions=20, latency_ms=0, jitter_ms=0)
+    monkeypatch.setattr(gc_bank_data, "BASE_URL", fake.start())
+    context = make_context(tmp_path, fake.account_ids)
+    started = []
+    warmup = Warmup(context, then=lambda: started.append(True))
+
+    try:
+        assert not warmup.ready
+        warmup.start()
+        assert warmup.wait(10)
+        warmup.stop()
+    finally:
+        context.close()
+        fake.stop()
+
+    assert warmup.status()["errors"] == {}
+    assert context.tokens.access_token
+    assert set(context.store.get_account_snapshots(fake.account_ids)) == set(
+        fake.account_ids
+    )
+    assert not context.store.needs_sync(fake.account_ids[0])
+    assert context.store.path in analytics._frames
+    assert started == [True]
+
+
+def test_failed_steps_do_not_block_readiness(tmp_path, monkeypatch):
+    # Nothing listens here, so every call to the bank fails
+    monkeypatch.setattr(gc_bank_data, "BASE_URL", "http://127.0.0.1:9")
+    context = make_context(tmp_path, [])
+    warmup = Warmup(context)
+    warmup.run()
+    context.close()
+
+    status = warmup.status()
+    assert status["ready"]
+    assert set(status["errors"]) == {"tokens"}
+    assert set(status["steps"]) == {"tokens", "accounts", "analytics"}
+
+
+def test_ready_waits_for_warmup(tmp_path, monkeypatch):
+    context = make_context(tmp_path, [])
+    warmup = Warmup(context)
+    monkeypatch.setattr(app.state, "warmup", warmup, raising=False)
+    client = TestClient(app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+    # Nothing to warm without tokens or accounts
+    monkeypatch.setattr(warmup, "_tokens", lambda: None)
+    warmup.run()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    context.close()
+
+
+def test_not_ready_before_startup(monkeypatch):
+    monkeypatch.delattr(app.state, "warmup", raising=False)
+    monkeypatch.delattr(app.state, "started", raising=False)
+    # Without running the lifespan
+    response = TestClient(app).get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"ready": False}